@@ -0,0 +1,399 @@
+"""
+Bulk User import and export.
+
+    python -m app.bulk import users.csv [--format csv|ndjson] [--batch-size 1000] [--workers N] [--rounds N]
+    python -m app.bulk export users.ndjson [--format csv|ndjson] [--batch-size 1000]
+
+Files are streamed ("-" reads stdin/writes stdout), so memory use doesn't grow with their size. Import
+records have a username and either a plain `password`, hashed on a process pool with the app's hash
+settings, or an already hashed `hashed_password` (any scheme of the app's context) that is stored as-is.
+`id`, `token_version`, `created_at` and `updated_at` are optional, so an export can be imported back.
+Rows are inserted in batches with one executemany per batch, rows whose username or id already exists
+are skipped on SQLite and PostgreSQL. Invalid records are reported with their line number and skipped.
+Running workers may keep answering "unknown username" for an imported user until their negative
+cache entry expires (USER_CACHE_NEGATIVE_TTL_SECONDS).
+"""
+from argparse import ArgumentParser
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, Future
+from datetime import datetime, timezone
+from math import ceil
+from time import perf_counter
+from typing import Callable, Iterable, Iterator, TextIO, TYPE_CHECKING
+from uuid import uuid4
+import csv
+import json
+import multiprocessing
+import os
+import sys
+
+from sqlalchemy import Engine, insert, select
+
+from app.models.user import User
+from app.utils.pwd_crypt import get_pwd_context, resolve_rounds
+
+if TYPE_CHECKING:
+    from passlib.context import CryptContext
+
+FORMATS = ("csv", "ndjson")
+EXPORT_FIELDS = ("id", "username", "hashed_password", "token_version", "created_at", "updated_at")
+# Batches hashed ahead of the one being inserted, bounds memory use
+MAX_BATCHES_IN_FLIGHT = 2
+
+
+class InvalidRecord(ValueError):
+    """Raised for an import record that can't become a User."""
+
+
+class BulkStats:
+    """Counters of an import or export, with its throughput."""
+
+    def __init__(self):
+        self.read = 0
+        self.written = 0
+        self.skipped = 0
+        self.rejected = 0
+        self.hashed = 0
+        self.started = perf_counter()
+
+    @property
+    def elapsed(self) -> float:
+        return perf_counter() - self.started
+
+    @property
+    def rows_per_sec(self) -> float:
+        return self.read / self.elapsed if self.elapsed else 0.0
+
+    def snapshot(self) -> dict:
+        return {
+            "read": self.read, 
+            "written": self.written, 
+            "skipped": self.skipped, 
+            "rejected": self.rejected, 
+            "hashed": self.hashed, 
+            "elapsed_seconds": self.elapsed, 
+            "rows_per_sec": self.rows_per_sec, 
+        }
+
+
+def detect_format(path: str, fmt: str | None = None) -> str:
+    """The given format, else the one of the file extension (.csv, .ndjson/.jsonl). stdin/stdout ("-") default to ndjson."""
+    if fmt is None and path == "-":
+        fmt = "ndjson"
+    elif fmt is None:
+        extension = os.path.splitext(path)[1].lower()
+        fmt = {".csv": "csv", ".ndjson": "ndjson", ".jsonl": "ndjson"}.get(extension)
+
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format for {path}, pass one of {', '.join(FORMATS)}!")
+    return fmt
+
+
+def read_records(source: TextIO, fmt: str) -> Iterator[tuple[int, dict | InvalidRecord]]:
+    """
+    Yield (line number, record) from a CSV file with a header row or from NDJSON, one at a time.  
+    Unparsable NDJSON lines yield an InvalidRecord as record, rejected by `to_row`.
+    """
+    if fmt == "csv":
+        reader = csv.DictReader(source)
+        for record in reader:
+            yield reader.line_num, record
+        return
+
+    for line_num, line in enumerate(source, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            record = InvalidRecord(f"Invalid JSON: {e}")
+        yield line_num, record
+
+
+def to_row(record: dict | InvalidRecord, context: "CryptContext") -> dict:
+    """
+    Validate an import record into a User row.  
+    Rows with a plain password keep it under "password" until it's hashed.
+    """
+    if isinstance(record, InvalidRecord):
+        raise record
+    if not isinstance(record, dict):
+        raise InvalidRecord("Record must be an object!")
+
+    username = record.get("username") or ""
+    if not isinstance(username, str) or not 3 <= len(username) <= 128:
+        raise InvalidRecord("username must have 3 to 128 characters!")
+
+    password = record.get("password") or None
+    hashed_password = record.get("hashed_password") or None
+    if (password is None) == (hashed_password is None):
+        raise InvalidRecord("Give either password or hashed_password!")
+    if password is not None and not (isinstance(password, str) and 6 <= len(password) <= 64):
+        raise InvalidRecord("password must have 6 to 64 characters!")
+    if hashed_password is not None and not (isinstance(hashed_password, str) and context.identify(hashed_password)):
+        raise InvalidRecord("hashed_password isn't a hash of a supported scheme!")
+
+    try:
+        created_at = _parse_datetime(record.get("created_at")) or datetime.now(timezone.utc)
+        updated_at = _parse_datetime(record.get("updated_at")) or created_at
+        token_version = int(record.get("token_version") or 0)
+    except (TypeError, ValueError) as e:
+        raise InvalidRecord(str(e))
+
+    row = {
+        "id": record.get("id") or str(uuid4()), 
+        "username": username, 
+        "hashed_password": hashed_password, 
+        "token_version": token_version, 
+        "created_at": created_at, 
+        "updated_at": updated_at, 
+    }
+    if password is not None:
+        row["password"] = password
+    return row
+
+
+def _parse_datetime(value) -> datetime | None:
+    if not value:
+        return None
+    if isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(value)
+
+
+# Hash context of a hashing process, set by _init_hasher
+_context: "CryptContext | None" = None
+
+
+def _init_hasher(rounds: int | None):
+    global _context
+    _context = get_pwd_context(rounds=rounds)
+
+
+def _hash_passwords(passwords: list[str]) -> list[str]:
+    return [_context.hash(password) for password in passwords]
+
+
+class _Hasher:
+    """Hashes batches of passwords on `workers` processes, or in this process when workers is 0."""
+
+    def __init__(self, workers: int, rounds: int | None):
+        self.workers = workers
+        self.executor = None
+
+        if workers > 0:
+            # Spawned so workers don't inherit this process' engine connections and threads
+            self.executor = ProcessPoolExecutor(
+                max_workers=workers, 
+                mp_context=multiprocessing.get_context("spawn"), 
+                initializer=_init_hasher, 
+                initargs=(rounds,), 
+            )
+        else:
+            _init_hasher(rounds)
+
+    def submit(self, passwords: list[str]) -> list[Future]:
+        """Split passwords in one chunk per worker, so a single batch uses every process."""
+        if self.executor is None:
+            future = Future()
+            future.set_result(_hash_passwords(passwords))
+            return [future]
+
+        size = max(1, ceil(len(passwords) / self.workers))
+        return [
+            self.executor.submit(_hash_passwords, passwords[start:start + size])
+            for start in range(0, len(passwords), size)
+        ]
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+
+
+def _insert_statement(engine: Engine):
+    """INSERT of User rows, skipping rows that conflict with an existing username or id where the dialect supports it."""
+    table = User.__table__
+    dialect = engine.dialect.name
+
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    elif dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        return insert(table)
+
+    # No conflict target: covers the primary key as well as the unique username index
+    return dialect_insert(table).on_conflict_do_nothing()
+
+
+def import_users(
+    records: Iterable[tuple[int, dict | InvalidRecord]], 
+    engine: Engine, 
+    batch_size: int = 1000, 
+    workers: int = os.cpu_count() or 1, 
+    rounds: int | None = None, 
+    on_reject: Callable[[int, str], None] | None = None, 
+    on_progress: Callable[[BulkStats], None] | None = None, 
+) -> BulkStats:
+    """
+    Insert (line number, record) pairs as Users, see `read_records`.  
+    Passwords of a batch are hashed while the previous batch is inserted. `rounds` defaults to the
+    app's PASSWD_HASH_ROUNDS/PASSWD_HASH_TARGET_MS, resolved once here instead of in every process.
+    """
+    stats = BulkStats()
+    if rounds is None:
+        rounds = resolve_rounds()
+    context = get_pwd_context(rounds=rounds)
+    statement = _insert_statement(engine)
+    hasher = _Hasher(workers, rounds)
+    in_flight: deque[tuple[list[dict], list[Future]]] = deque()
+
+    def submit(batch: list[dict]):
+        to_hash = [row for row in batch if "password" in row]
+        in_flight.append((batch, hasher.submit([row.pop("password") for row in to_hash])))
+
+    def insert_next(connection):
+        batch, futures = in_flight.popleft()
+        hashes = [hashed for future in futures for hashed in future.result()]
+        for row, hashed in zip((row for row in batch if row["hashed_password"] is None), hashes):
+            row["hashed_password"] = hashed
+        stats.hashed += len(hashes)
+
+        with connection.begin():
+            inserted = connection.execute(statement, batch).rowcount
+        stats.written += inserted
+        stats.skipped += len(batch) - inserted
+
+        if on_progress is not None:
+            on_progress(stats)
+
+    try:
+        with engine.connect() as connection:
+            batch = []
+            for line_num, record in records:
+                stats.read += 1
+                try:
+                    batch.append(to_row(record, context))
+                except InvalidRecord as e:
+                    stats.rejected += 1
+                    if on_reject is not None:
+                        on_reject(line_num, str(e))
+                    continue
+
+                if len(batch) >= batch_size:
+                    submit(batch)
+                    batch = []
+                    if len(in_flight) > MAX_BATCHES_IN_FLIGHT:
+                        insert_next(connection)
+
+            if batch:
+                submit(batch)
+            while in_flight:
+                insert_next(connection)
+    finally:
+        hasher.shutdown()
+
+    return stats
+
+
+def export_users(
+    target: TextIO, 
+    fmt: str, 
+    engine: Engine, 
+    batch_size: int = 1000, 
+    on_progress: Callable[[BulkStats], None] | None = None, 
+) -> BulkStats:
+    """Write every User to target, fetching `batch_size` rows at a time with a server-side cursor."""
+    stats = BulkStats()
+    columns = [User.__table__.c[field] for field in EXPORT_FIELDS]
+
+    writer = None
+    if fmt == "csv":
+        writer = csv.DictWriter(target, fieldnames=EXPORT_FIELDS)
+        writer.writeheader()
+
+    with engine.connect() as connection:
+        result = connection.execution_options(yield_per=batch_size).execute(select(*columns))
+        for partition in result.partitions():
+            for row in partition:
+                record = {field: _export_value(value) for field, value in zip(EXPORT_FIELDS, row)}
+                if writer is None:
+                    target.write(json.dumps(record) + "\n")
+                else:
+                    writer.writerow(record)
+
+            stats.read += len(partition)
+            stats.written += len(partition)
+            if on_progress is not None:
+                on_progress(stats)
+
+    return stats
+
+
+def _export_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def print_progress(stats: BulkStats):
+    print(
+        f"\r{stats.read} read, {stats.written} written, {stats.skipped} skipped, "
+        f"{stats.rejected} rejected, {stats.rows_per_sec:.0f} rows/s", 
+        end="", file=sys.stderr, flush=True, 
+    )
+
+
+def print_reject(line_num: int, reason: str):
+    print(f"\nLine {line_num}: {reason}", file=sys.stderr)
+
+
+def _open(path: str, mode: str) -> TextIO:
+    if path == "-":
+        return sys.stdin if mode == "r" else sys.stdout
+    return open(path, mode, newline="", encoding="utf-8")
+
+
+def main() -> int:
+    parser = ArgumentParser(description="Bulk User import and export")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    import_parser = commands.add_parser("import", help="Create Users from a CSV or NDJSON file")
+    import_parser.add_argument("path", help='File to read, "-" for stdin')
+    import_parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Hashing processes, 0 hashes in this one")
+    import_parser.add_argument("--rounds", type=int, help="Hash cost, defaults to the app's")
+
+    export_parser = commands.add_parser("export", help="Write every User to a CSV or NDJSON file")
+    export_parser.add_argument("path", help='File to write, "-" for stdout')
+
+    for command_parser in (import_parser, export_parser):
+        command_parser.add_argument("--format", choices=FORMATS, help="Defaults to the file extension")
+        command_parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    from app.db import engine
+
+    try:
+        fmt = detect_format(args.path, args.format)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.command == "import":
+        with _open(args.path, "r") as source:
+            stats = import_users(
+                read_records(source, fmt), 
+                engine, 
+                batch_size=args.batch_size, 
+                workers=args.workers, 
+                rounds=args.rounds, 
+                on_reject=print_reject, 
+                on_progress=print_progress, 
+            )
+    else:
+        with _open(args.path, "w") as target:
+            stats = export_users(target, fmt, engine, batch_size=args.batch_size, on_progress=print_progress)
+
+    print_progress(stats)
+    print(f"\nDone in {stats.elapsed:.1f}s", file=sys.stderr)
+    return 1 if stats.rejected else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
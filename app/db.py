@@ -1,22 +1,393 @@
-from sqlmodel import Session, create_engine, SQLModel 
-from typing import Generator
+from sqlmodel import Session, create_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy import event, make_url, text, Engine, Connection
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine
+from contextlib import contextmanager, asynccontextmanager
+from itertools import count
+from typing import Generator, AsyncGenerator
+from time import perf_counter, monotonic
+import asyncio
+import threading
 
-from app.env import DB_HOST, DEBUG
+from app.env import (
+    DB_HOST, 
+    DB_ASYNC_HOST, 
+    DB_POOL_SIZE, 
+    DB_MAX_OVERFLOW, 
+    DB_POOL_TIMEOUT, 
+    DB_POOL_RECYCLE, 
+    DB_POOL_PRE_PING, 
+    DB_SQLITE_TUNED, 
+    DB_SQLITE_SYNCHRONOUS, 
+    DB_SQLITE_BUSY_TIMEOUT_MS, 
+    DB_SQLITE_MMAP_SIZE, 
+    DB_SQLITE_CACHE_SIZE_KIB, 
+    DB_SQLITE_READ_POOL_SIZE, 
+    DB_REPLICA_HOSTS, 
+    DB_REPLICA_RETRY_SECONDS, 
+    DEBUG, 
+)
 
 
-# Create database engine once and reuse it! Echo set to True for SQL query logging
-engine = create_engine(DB_HOST, echo=DEBUG)
+def to_async_url(url: str) -> str:
+    """Map a sync database URL to the async driver of the same database."""
+    scheme, sep, rest = url.partition("://")
+    dialect = scheme.split("+")[0]
+
+    async_drivers = {
+        "sqlite": "sqlite+aiosqlite", 
+        "postgresql": "postgresql+asyncpg", 
+        "postgres": "postgresql+asyncpg", 
+    }
+    if dialect not in async_drivers:
+        return url
+
+    return async_drivers[dialect] + sep + rest
+
+
+def is_sqlite_file(url: str) -> bool:
+    """Whether url is a SQLite database stored in a file, not in memory."""
+    db_url = make_url(url)
+    return db_url.get_backend_name() == "sqlite" and db_url.database not in (None, "", ":memory:")
+
+
+def engine_options(url: str) -> dict:
+    """Pool settings from env for the given URL. In-memory SQLite uses single connection pools without sizing."""
+    db_url = make_url(url)
+    options = {"pool_pre_ping": DB_POOL_PRE_PING, "pool_recycle": DB_POOL_RECYCLE}
+
+    in_memory = db_url.get_backend_name() == "sqlite" and not is_sqlite_file(url)
+    if not in_memory:
+        options.update(
+            pool_size=DB_POOL_SIZE, 
+            max_overflow=DB_MAX_OVERFLOW, 
+            pool_timeout=DB_POOL_TIMEOUT, 
+        )
+
+    return options
+
+
+class PoolMetrics:
+    """
+    Connection pool checkout/checkin counters of an engine.  
+    `peak_checked_out` and `avg_hold_seconds` are the numbers to look at when sizing pool_size/max_overflow.
+    """
+
+    def __init__(self):
+        self.connects = 0
+        self.checkouts = 0
+        self.checkins = 0
+        self.invalidations = 0
+        self.checked_out = 0
+        self.peak_checked_out = 0
+        self.total_hold_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def attach(self, engine: Engine) -> "PoolMetrics":
+        """Listen to pool events of a sync engine (use `async_engine.sync_engine` for async ones)."""
+        event.listen(engine, "connect", self._on_connect)
+        event.listen(engine, "checkout", self._on_checkout)
+        event.listen(engine, "checkin", self._on_checkin)
+        event.listen(engine, "invalidate", self._on_invalidate)
+        return self
+
+    @property
+    def avg_hold_seconds(self) -> float:
+        """Average time a connection stays checked out."""
+        return self.total_hold_seconds / self.checkins if self.checkins else 0.0
+
+    def snapshot(self) -> dict:
+        return {
+            "connects": self.connects, 
+            "checkouts": self.checkouts, 
+            "checkins": self.checkins, 
+            "invalidations": self.invalidations, 
+            "checked_out": self.checked_out, 
+            "peak_checked_out": self.peak_checked_out, 
+            "avg_hold_seconds": self.avg_hold_seconds, 
+        }
+
+    def _on_connect(self, dbapi_conn, conn_record):
+        with self._lock:
+            self.connects += 1
+
+    def _on_checkout(self, dbapi_conn, conn_record, conn_proxy):
+        conn_record.info["checkout_at"] = perf_counter()
+        with self._lock:
+            self.checkouts += 1
+            self.checked_out += 1
+            self.peak_checked_out = max(self.peak_checked_out, self.checked_out)
+
+    def _on_checkin(self, dbapi_conn, conn_record):
+        checkout_at = conn_record.info.pop("checkout_at", None)
+        # Checkin also fires for connections dropped before ever being checked out
+        if checkout_at is None:
+            return
+
+        with self._lock:
+            self.checkins += 1
+            self.checked_out -= 1
+            self.total_hold_seconds += perf_counter() - checkout_at
+
+    def _on_invalidate(self, dbapi_conn, conn_record, exception):
+        with self._lock:
+            self.invalidations += 1
+
+
+def sqlite_pragmas(read_only: bool = False) -> list[str]:
+    """PRAGMAs run on every SQLite connection. WAL lets readers run while a write is in progress."""
+    pragmas = [
+        # First, so setting the journal mode waits for locks held by other processes
+        f"PRAGMA busy_timeout = {DB_SQLITE_BUSY_TIMEOUT_MS}", 
+        "PRAGMA journal_mode = WAL", 
+        f"PRAGMA synchronous = {DB_SQLITE_SYNCHRONOUS}", 
+        f"PRAGMA mmap_size = {DB_SQLITE_MMAP_SIZE}", 
+        # Negative sizes are in KiB
+        f"PRAGMA cache_size = -{DB_SQLITE_CACHE_SIZE_KIB}", 
+    ]
+    if read_only:
+        pragmas.append("PRAGMA query_only = ON")
+    return pragmas
+
+
+def tune_sqlite(engine: Engine, read_only: bool = False) -> Engine:
+    """Run `sqlite_pragmas` on every new connection of a sync engine (use `async_engine.sync_engine` for async ones)."""
+    pragmas = sqlite_pragmas(read_only)
+
+    def on_connect(dbapi_conn, conn_record):
+        cursor = dbapi_conn.cursor()
+        try:
+            for pragma in pragmas:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+
+    event.listen(engine, "connect", on_connect)
+    return engine
+
+
+def create_engines(url: str = DB_HOST, async_url: str = DB_ASYNC_HOST) -> tuple[Engine, AsyncEngine, AsyncEngine | None]:
+    """
+    Create the sync engine, the async engine and, for SQLite files, an async read-only engine.  
+    SQLite allows one writer at a time, so with DB_SQLITE_READ_POOL_SIZE the async engine keeps a single 
+    connection: async writes queue on the pool instead of contending for the file lock, while lookups 
+    run on the read pool in parallel. Otherwise the read engine is None and reads share the async engine. 
+    The sync engine keeps its own pool, its writes (session_scope, migrations) still wait on busy_timeout.
+    """
+    async_url = async_url or to_async_url(url)
+    sync_engine = create_engine(url, echo=DEBUG, **engine_options(url))
+    split = is_sqlite_file(url) and DB_SQLITE_READ_POOL_SIZE > 0
+
+    write_options = engine_options(async_url)
+    if split:
+        write_options.update(pool_size=1, max_overflow=0)
+    write_engine = create_async_engine(async_url, echo=DEBUG, **write_options)
+
+    read_engine = None
+    if split:
+        read_options = {**engine_options(async_url), "pool_size": DB_SQLITE_READ_POOL_SIZE}
+        read_engine = create_async_engine(async_url, echo=DEBUG, **read_options)
+
+    if is_sqlite_file(url) and DB_SQLITE_TUNED:
+        tune_sqlite(sync_engine)
+        tune_sqlite(write_engine.sync_engine)
+        if read_engine is not None:
+            tune_sqlite(read_engine.sync_engine, read_only=True)
+
+    return sync_engine, write_engine, read_engine
+
+
+def create_replica_engine(url: str) -> AsyncEngine:
+    """Async engine of a read replica, with the same pool settings as the primary."""
+    async_url = to_async_url(url)
+    replica_engine = create_async_engine(async_url, echo=DEBUG, **engine_options(async_url))
+
+    if is_sqlite_file(url) and DB_SQLITE_TUNED:
+        tune_sqlite(replica_engine.sync_engine, read_only=True)
+    return replica_engine
+
+
+class ReplicaRouter:
+    """
+    Spread reads over replica engines round-robin, skipping the ones that failed.  
+    A replica that can't give a connection is marked down for `retry_after` seconds and the next one 
+    is tried. When none is left, reads go to the fallback engine (the primary). `check` probes every 
+    replica, so a recovered one rejoins early and a dead one is skipped before a request hits it. 
+    With DB_POOL_PRE_PING, pooled connections to a replica that went away fail over on checkout too.
+    """
+
+    def __init__(self, engines: list[AsyncEngine], retry_after: float = DB_REPLICA_RETRY_SECONDS):
+        self.engines = engines
+        self.retry_after = retry_after
+        self.failovers = 0
+        # Index of the replica -> monotonic time it may be tried again
+        self._down_until: dict[int, float] = {}
+        self._turn = count()
+
+    def is_up(self, index: int) -> bool:
+        return self._down_until.get(index, 0.0) <= monotonic()
+
+    def candidates(self) -> list[int]:
+        """Indexes of the replicas that are up, in round-robin order."""
+        if not self.engines:
+            return []
+
+        start = next(self._turn) % len(self.engines)
+        ordered = [(start + offset) % len(self.engines) for offset in range(len(self.engines))]
+        return [index for index in ordered if self.is_up(index)]
+
+    def mark_down(self, index: int):
+        self._down_until[index] = monotonic() + self.retry_after
+
+    def mark_up(self, index: int):
+        self._down_until.pop(index, None)
+
+    def connect(self, fallback: AsyncEngine) -> tuple[int | None, Connection]:
+        """
+        Connection of the next healthy replica, or of fallback (index None) when none is left.  
+        A sync Connection of the async engine, so only callable from the session's greenlet (see ReadSession).
+        """
+        for index in self.candidates():
+            try:
+                return index, self.engines[index].sync_engine.connect()
+            except (DBAPIError, OSError):
+                self.mark_down(index)
+                self.failovers += 1
+
+        return None, fallback.sync_engine.connect()
+
+    async def check(self) -> dict[int, bool]:
+        """Probe every replica with a SELECT 1, marking it up or down. Return whether each one is up."""
+        for index, replica in enumerate(self.engines):
+            try:
+                async with replica.connect() as connection:
+                    await connection.execute(text("SELECT 1"))
+                self.mark_up(index)
+            except (DBAPIError, OSError):
+                self.mark_down(index)
+
+        return self.status()
+
+    async def run_checks(self, interval: float):
+        """Run `check` every interval seconds, until cancelled."""
+        while True:
+            await self.check()
+            await asyncio.sleep(interval)
+
+    def status(self) -> dict[int, bool]:
+        return {index: self.is_up(index) for index in range(len(self.engines))}
+
+    async def dispose(self):
+        for replica in self.engines:
+            await replica.dispose()
+
+
+# Create database engines once and reuse them! Echo set to True for SQL query logging
+engine, async_engine, async_read_engine = create_engines()
+replicas = ReplicaRouter([create_replica_engine(url) for url in DB_REPLICA_HOSTS])
+
+pool_metrics = PoolMetrics().attach(engine)
+async_pool_metrics = PoolMetrics().attach(async_engine.sync_engine)
+async_read_pool_metrics = PoolMetrics()
+if async_read_engine is not None:
+    async_read_pool_metrics.attach(async_read_engine.sync_engine)
+
+@contextmanager
+def session_scope() -> Generator[Session, None, None]:
+    """
+    Unit of work: yield a Session and always close it on exit, giving its connection back to the pool.  
+    Commit explicitly, uncommitted changes are rolled back on close.
+    """
+    with Session(engine) as session:
+        yield session
 
 def get_session() -> Generator[Session, any, None]: 
     """Create DB Session Automanaging it.""" 
-    with Session(engine) as session:
+    with session_scope() as session:
+        yield session
+
+@asynccontextmanager
+async def async_session_scope() -> AsyncGenerator[AsyncSession, None]:
+    """Create async DB Session closing it on exit."""
+    # Objects are kept loaded after commit, lazy refreshes aren't possible on async sessions
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
+        yield session
+
+async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
+    """Create async DB Session Automanaging it. Use as a FastAPI dependency."""
+    async with async_session_scope() as session:
+        yield session
+
+class ReadSession(Session):
+    """
+    Sync session behind `async_read_session_scope`, bound on its first statement rather than when opened.  
+    Requests that end before querying (throttled, answered from a cache) never take a pooled connection.
+    """
+
+    def __init__(self, *args, fallback: AsyncEngine, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fallback = fallback
+        self.replica: int | None = None
+        self.read_connection: Connection | None = None
+
+    def get_bind(self, *args, **kwargs) -> Connection:
+        # Runs on the greenlet of the awaited statement, where the sync side of async engines can connect
+        if self.read_connection is None:
+            self.replica, self.read_connection = replicas.connect(self.fallback)
+        return self.read_connection
+
+    def close(self):
+        super().close()
+        if self.read_connection is not None:
+            self.read_connection.close()
+            self.read_connection = None
+
+@asynccontextmanager
+async def async_read_session_scope() -> AsyncGenerator[AsyncSession, None]:
+    """
+    Async DB Session for lookups, don't write with it.  
+    Served by a read replica (see `replicas`) when there are any, else by the SQLite read-only pool when 
+    there's one, else by the primary. Replicas lag behind the primary, read your own writes with `async_session_scope`.
+    """
+    session = AsyncSession(
+        sync_session_class=ReadSession, 
+        fallback=async_read_engine or async_engine, 
+        expire_on_commit=False, 
+    )
+    try:
+        async with session:
+            yield session
+    except DBAPIError as e:
+        # The replica went away mid-request, skip it until it's back
+        replica = session.sync_session.replica
+        if replica is not None and e.connection_invalidated:
+            replicas.mark_down(replica)
+        raise
+
+def reads_replica(session: AsyncSession) -> bool:
+    """Whether a session from `async_read_session_scope` ran its statements on a replica, which may lag behind."""
+    return getattr(session.sync_session, "replica", None) is not None
+
+async def get_async_read_session() -> AsyncGenerator[AsyncSession, None]:
+    """`async_read_session_scope` as a FastAPI dependency, for routes that only read."""
+    async with async_read_session_scope() as session:
         yield session
 
 def init_db():
-    """Init Database Structure! Import models to register them."""
-    from app.models import user
+    """Init Database Structure by applying pending migrations (see `app.migrations`)."""
+    from app.migrations import upgrade
+
+    with engine.connect() as connection:
+        upgrade(connection)
+
+async def init_db_async():
+    """Async version of `init_db`, on the async engine so startup doesn't open a sync connection."""
+    from app.migrations import upgrade
 
-    SQLModel.metadata.create_all(engine)
+    async with async_engine.connect() as connection:
+        await connection.run_sync(upgrade)
 
 # For testing purposes, we can create an in-memory SQLite database engine
-test_engine = create_engine("sqlite:///:memory:", echo=False, connect_args={"check_same_thread": False})
\ No newline at end of file
+test_engine = create_engine("sqlite:///:memory:", echo=False, connect_args={"check_same_thread": False})
+test_async_engine = create_async_engine("sqlite+aiosqlite:///:memory:", echo=False)
@@ -1,19 +1,109 @@
 from dotenv import load_dotenv
-from os import environ
+from os import environ, cpu_count
 
 load_dotenv()
 
 DEBUG = bool(environ.get("DEBUG", False))
 PORT = int(environ.get("PORT", 8000))
+# Production server (python -m app.server)
+SERVER_HOST = environ.get("SERVER_HOST", "0.0.0.0")
+SERVER_WORKERS = int(environ.get("SERVER_WORKERS", cpu_count() or 1))
+SERVER_LOOP = environ.get("SERVER_LOOP", "uvloop") # "uvloop", "asyncio" or "auto"
+SERVER_HTTP = environ.get("SERVER_HTTP", "httptools") # "httptools", "h11" or "auto"
+SERVER_KEEP_ALIVE_SECONDS = int(environ.get("SERVER_KEEP_ALIVE_SECONDS", 5))
+SERVER_BACKLOG = int(environ.get("SERVER_BACKLOG", 2048))
+# How long in-flight requests may run after a shutdown signal before they're cut
+SERVER_GRACEFUL_SHUTDOWN_SECONDS = int(environ.get("SERVER_GRACEFUL_SHUTDOWN_SECONDS", 30))
+# Proxies trusted to set X-Forwarded-For, which the login rate limiter keys on
+SERVER_FORWARDED_ALLOW_IPS = environ.get("SERVER_FORWARDED_ALLOW_IPS", "127.0.0.1")
+# Threads running sync endpoints/dependencies in each worker (anyio's default limiter)
+THREADPOOL_SIZE = int(environ.get("THREADPOOL_SIZE", 40))
+# Latency histograms and the /metrics endpoint, off by default
+METRICS_ENABLED = environ.get("METRICS_ENABLED", "False").lower() in ("1", "true", "yes")
 
 DB_HOST = environ.get("DB_HOST", default="sqlite:///db.sqlite3")
+# Apply schema migrations on startup (development), off by default since deploys run `python -m app.migrations upgrade`
+DB_MIGRATE_ON_STARTUP = environ.get("DB_MIGRATE_ON_STARTUP", "False").lower() in ("1", "true", "yes")
+# PostgreSQL lock_timeout of transactional migrations, 0 waits forever
+DB_MIGRATION_LOCK_TIMEOUT_MS = int(environ.get("DB_MIGRATION_LOCK_TIMEOUT_MS", 5000))
+# Async driver URL, derived from DB_HOST when not set (sqlite -> aiosqlite, postgresql -> asyncpg)
+DB_ASYNC_HOST = environ.get("DB_ASYNC_HOST", "")
+DB_POOL_SIZE = int(environ.get("DB_POOL_SIZE", 5))
+DB_MAX_OVERFLOW = int(environ.get("DB_MAX_OVERFLOW", 10))
+DB_POOL_TIMEOUT = float(environ.get("DB_POOL_TIMEOUT", 30))
+DB_POOL_RECYCLE = int(environ.get("DB_POOL_RECYCLE", -1)) # Seconds, -1 never recycles
+DB_POOL_PRE_PING = environ.get("DB_POOL_PRE_PING", "False").lower() in ("1", "true", "yes")
+# SQLite file databases: WAL and the pragmas below on every connection
+DB_SQLITE_TUNED = environ.get("DB_SQLITE_TUNED", "True").lower() in ("1", "true", "yes")
+DB_SQLITE_SYNCHRONOUS = environ.get("DB_SQLITE_SYNCHRONOUS", "NORMAL") # NORMAL is durable on crashes in WAL mode, not on power loss
+DB_SQLITE_BUSY_TIMEOUT_MS = int(environ.get("DB_SQLITE_BUSY_TIMEOUT_MS", 5000))
+DB_SQLITE_MMAP_SIZE = int(environ.get("DB_SQLITE_MMAP_SIZE", 256 * 1024 * 1024)) # Bytes
+DB_SQLITE_CACHE_SIZE_KIB = int(environ.get("DB_SQLITE_CACHE_SIZE_KIB", 64 * 1024)) # Per connection
+# Read-only connections of the async read pool, beside a one connection async write pool. 0 shares one pool.
+DB_SQLITE_READ_POOL_SIZE = int(environ.get("DB_SQLITE_READ_POOL_SIZE", 4))
+# Comma separated read replica URLs (sync drivers, like DB_HOST). Lookups go round-robin to them, writes to DB_HOST
+DB_REPLICA_HOSTS = [
+    host.strip() for host in environ.get("DB_REPLICA_HOSTS", "").split(",") if host.strip()
+]
+DB_REPLICA_RETRY_SECONDS = float(environ.get("DB_REPLICA_RETRY_SECONDS", 30)) # A failed replica is skipped this long
+DB_REPLICA_CHECK_SECONDS = float(environ.get("DB_REPLICA_CHECK_SECONDS", 5)) # Interval of the health checks, 0 disables them
 
+# "bcrypt", "argon2" (argon2id, needs argon2-cffi) or "scrypt"
 PASSWD_HASH_ALGO = environ.get("PASSWD_HASH_ALGO", "bcrypt")
+# Schemes still accepted on verify, their hashes are upgraded to PASSWD_HASH_ALGO on login
+PASSWD_HASH_LEGACY_SCHEMES = [
+    scheme.strip() for scheme in environ.get("PASSWD_HASH_LEGACY_SCHEMES", "bcrypt").split(",") if scheme.strip()
+]
+# argon2id cost, every running hash holds PASSWD_ARGON2_MEMORY_KIB of memory
+PASSWD_ARGON2_TIME_COST = int(environ.get("PASSWD_ARGON2_TIME_COST", 2))
+PASSWD_ARGON2_MEMORY_KIB = int(environ.get("PASSWD_ARGON2_MEMORY_KIB", 19456))
+PASSWD_ARGON2_PARALLELISM = int(environ.get("PASSWD_ARGON2_PARALLELISM", 1))
+# scrypt cost, every running hash holds 128 * 2^LOG2_N * BLOCK_SIZE bytes
+PASSWD_SCRYPT_LOG2_N = int(environ.get("PASSWD_SCRYPT_LOG2_N", 16))
+PASSWD_SCRYPT_BLOCK_SIZE = int(environ.get("PASSWD_SCRYPT_BLOCK_SIZE", 8))
+PASSWD_SCRYPT_PARALLELISM = int(environ.get("PASSWD_SCRYPT_PARALLELISM", 1))
+PASSWD_HASH_POOL_SIZE = int(environ.get("PASSWD_HASH_POOL_SIZE", min(4, cpu_count() or 1)))
+PASSWD_HASH_MAX_PENDING = int(environ.get("PASSWD_HASH_MAX_PENDING", PASSWD_HASH_POOL_SIZE * 8))
+# Fixed cost (bcrypt log2 rounds, argon2 time cost, scrypt log2 N), 0 calibrates bcrypt or keeps the scheme default
+PASSWD_HASH_ROUNDS = int(environ.get("PASSWD_HASH_ROUNDS", 0))
+# Target verify latency for the startup calibration, 0 disables it
+PASSWD_HASH_TARGET_MS = float(environ.get("PASSWD_HASH_TARGET_MS", 0))
 
 JWT_PUB_KEY_PATH = environ.get("JWT_PUB_KEY_PATH", "JWT_EC_PUBKEY.pem")
 JWT_PRIV_KEY_PATH = environ.get("JWT_PRIV_KEY_PATH", "JWT_EC_PRIVKEY.pem")
 JWT_ACCESS_EXPIRES_MINUTES = int(environ.get("JWT_ACCESS_EXPIRES_MINUTES", 15))
 JWT_REFRESH_EXPIRES_MINUTES = int(environ.get("JWT_REFRESH_EXPIRES_MINUTES", 2880)) 
-JWT_ALGO = environ.get("JWT_ALGO", "ES256")
+JWT_ALGO = environ.get("JWT_ALGO", "ES256") # ES256/ES384/ES512, or EdDSA with Ed25519 keys
+# "cryptography" (fast path, supports EdDSA) or "jose"
+JWT_BACKEND = environ.get("JWT_BACKEND", "cryptography")
+JWT_KEY_CHECK_INTERVAL_SECONDS = float(environ.get("JWT_KEY_CHECK_INTERVAL_SECONDS", 1.0))
+# Max verified tokens kept to skip repeated signature checks, 0 disables the cache
+JWT_VERIFY_CACHE_SIZE = int(environ.get("JWT_VERIFY_CACHE_SIZE", 10000))
+# "db" reads the User row on every refresh, bypassing the user cache, "stateless" only checks the cached token version
+JWT_REFRESH_MODE = environ.get("JWT_REFRESH_MODE", "db")
+# Server-side refresh sessions (rotation, reuse detection, logout revocation): "sql" (refresh_token table), 
+# "memory" (per process, single worker only), "kv" (shared store stand-in) or "off" (stateless refresh tokens)
+REFRESH_STORE_BACKEND = environ.get("REFRESH_STORE_BACKEND", "sql")
+REFRESH_STORE_SWEEP_SECONDS = float(environ.get("REFRESH_STORE_SWEEP_SECONDS", 300)) # 0 disables the sweeps
+REFRESH_STORE_SWEEP_BATCH = int(environ.get("REFRESH_STORE_SWEEP_BATCH", 1000)) # Expired sessions deleted per statement
+# Access token revocation denylist: "sql" (revoked_token table), 
+# "memory" (per process, single worker only) or "off"
+REVOCATION_BACKEND = environ.get("REVOCATION_BACKEND", "sql")
+REVOCATION_SYNC_SECONDS = float(environ.get("REVOCATION_SYNC_SECONDS", 5)) # 0 disables the syncs
+REVOCATION_REBUILD_SECONDS = float(environ.get("REVOCATION_REBUILD_SECONDS", 600))
+TOKEN_VERSION_CACHE_SIZE = int(environ.get("TOKEN_VERSION_CACHE_SIZE", 10000))
+TOKEN_VERSION_CACHE_TTL_SECONDS = float(environ.get("TOKEN_VERSION_CACHE_TTL_SECONDS", 30))
 
+# "memory" (per process), "kv" (shared store stand-in) or "off"
+USER_CACHE_BACKEND = environ.get("USER_CACHE_BACKEND", "memory")
+USER_CACHE_SIZE = int(environ.get("USER_CACHE_SIZE", 10000))
+USER_CACHE_TTL_SECONDS = float(environ.get("USER_CACHE_TTL_SECONDS", 60))
+USER_CACHE_NEGATIVE_TTL_SECONDS = float(environ.get("USER_CACHE_NEGATIVE_TTL_SECONDS", 10))
 
+# Login throttling: "memory" (per process), "kv" (shared store stand-in) or "off"
+RATE_LIMIT_BACKEND = environ.get("RATE_LIMIT_BACKEND", "memory")
+RATE_LIMIT_MAX_KEYS = int(environ.get("RATE_LIMIT_MAX_KEYS", 100000)) # Least recently hit keys are evicted
+# Login attempts allowed per window, 0 disables the check
+LOGIN_RATE_LIMIT_PER_USERNAME = int(environ.get("LOGIN_RATE_LIMIT_PER_USERNAME", 10))
+LOGIN_RATE_LIMIT_PER_IP = int(environ.get("LOGIN_RATE_LIMIT_PER_IP", 100))
+LOGIN_RATE_LIMIT_WINDOW_SECONDS = float(environ.get("LOGIN_RATE_LIMIT_WINDOW_SECONDS", 60))
@@ -0,0 +1,146 @@
+"""
+Versioned schema migrations, the schema owner since `init_db` stopped calling create_all.
+
+Every `mNNNN_*` module defines VERSION, NAME, TRANSACTIONAL and `upgrade(connection)`, and is listed
+in MIGRATIONS. Applied versions are recorded in the schema_migrations table. Migrations that build or
+drop indexes CONCURRENTLY on PostgreSQL set TRANSACTIONAL = False and run in autocommit, so they must
+be safe to re-run (see `app.migrations.ops`). Run them with `python -m app.migrations`.
+"""
+from sqlalchemy import Connection, MetaData, Table, Column, Integer, String, DateTime, select, text
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from types import ModuleType
+from typing import Callable, Iterator, NamedTuple
+
+from app.env import DB_MIGRATION_LOCK_TIMEOUT_MS
+from app.migrations import (
+    m0001_baseline, 
+    m0002_user_token_version, 
+    m0003_drop_user_id_index, 
+    m0004_user_username_lower_index, 
+    m0005_refresh_token, 
+    m0006_revoked_token, 
+)
+
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    upgrade: Callable[[Connection], None]
+    transactional: bool = True
+
+    @classmethod
+    def from_module(cls, module: ModuleType) -> "Migration":
+        return cls(module.VERSION, module.NAME, module.upgrade, module.TRANSACTIONAL)
+
+
+MIGRATIONS = [
+    Migration.from_module(module)
+    for module in (
+        m0001_baseline, 
+        m0002_user_token_version, 
+        m0003_drop_user_id_index, 
+        m0004_user_username_lower_index, 
+        m0005_refresh_token, 
+        m0006_revoked_token, 
+    )
+]
+
+versions_table = Table(
+    "schema_migrations", 
+    MetaData(), 
+    Column("version", Integer, primary_key=True), 
+    Column("name", String(128), nullable=False), 
+    Column("applied_at", DateTime(timezone=True), nullable=False), 
+)
+
+# pg_advisory_lock key, so concurrent deploys don't run migrations twice
+_LOCK_KEY = 727_651_409
+
+
+def applied_versions(connection: Connection) -> set[int]:
+    """Versions recorded in schema_migrations, empty when migrations never ran."""
+    with connection.begin():
+        if not connection.dialect.has_table(connection, versions_table.name):
+            return set()
+        return set(connection.execute(select(versions_table.c.version)).scalars())
+
+
+def pending(connection: Connection) -> list[Migration]:
+    """Migrations not applied yet, in order."""
+    applied = applied_versions(connection)
+    return [migration for migration in MIGRATIONS if migration.version not in applied]
+
+
+def upgrade(connection: Connection, target: int | None = None) -> list[Migration]:
+    """
+    Apply pending migrations up to `target` (all by default), in order. Return the applied ones.  
+    Give a Connection outside of any transaction, e.g. `engine.connect()` or `AsyncConnection.run_sync`.
+    """
+    applied = []
+
+    with _migration_lock(connection):
+        with connection.begin():
+            versions_table.create(connection, checkfirst=True)
+
+        for migration in pending(connection):
+            if target is not None and migration.version > target:
+                break
+
+            if migration.transactional:
+                with connection.begin():
+                    _set_lock_timeout(connection)
+                    migration.upgrade(connection)
+                    _record(connection, migration)
+            else:
+                with _autocommit(connection):
+                    migration.upgrade(connection)
+                with connection.begin():
+                    _record(connection, migration)
+
+            applied.append(migration)
+
+    return applied
+
+
+def _record(connection: Connection, migration: Migration):
+    connection.execute(
+        versions_table.insert().values(
+            version=migration.version, 
+            name=migration.name, 
+            applied_at=datetime.now(timezone.utc), 
+        )
+    )
+
+
+def _set_lock_timeout(connection: Connection):
+    # Fail fast instead of queueing every query on the table behind a blocked ALTER TABLE
+    if connection.dialect.name == "postgresql" and DB_MIGRATION_LOCK_TIMEOUT_MS > 0:
+        connection.execute(text(f"SET LOCAL lock_timeout = {int(DB_MIGRATION_LOCK_TIMEOUT_MS)}"))
+
+
+@contextmanager
+def _autocommit(connection: Connection) -> Iterator[None]:
+    isolation_level = connection.get_isolation_level()
+    connection.execution_options(isolation_level="AUTOCOMMIT")
+    try:
+        yield
+        connection.commit()
+    finally:
+        connection.rollback()
+        connection.execution_options(isolation_level=isolation_level)
+
+
+@contextmanager
+def _migration_lock(connection: Connection) -> Iterator[None]:
+    if connection.dialect.name != "postgresql":
+        yield
+        return
+
+    with connection.begin():
+        connection.execute(text("SELECT pg_advisory_lock(:key)"), {"key": _LOCK_KEY})
+    try:
+        yield
+    finally:
+        with connection.begin():
+            connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": _LOCK_KEY})
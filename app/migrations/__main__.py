@@ -0,0 +1,38 @@
+"""
+    python -m app.migrations [status | upgrade [--to VERSION]]
+
+Runs against DB_HOST. Run `upgrade` once per deploy, before starting the new workers.
+"""
+from argparse import ArgumentParser
+import sys
+
+from app.db import engine
+from app.migrations import MIGRATIONS, applied_versions, upgrade
+
+
+def main() -> int:
+    parser = ArgumentParser(description="Versioned schema migrations")
+    commands = parser.add_subparsers(dest="command")
+    commands.add_parser("status", help="List migrations and whether they're applied")
+    upgrade_parser = commands.add_parser("upgrade", help="Apply pending migrations")
+    upgrade_parser.add_argument("--to", type=int, help="Stop after this version")
+    args = parser.parse_args()
+
+    with engine.connect() as connection:
+        if args.command == "upgrade":
+            applied = upgrade(connection, args.to)
+            for migration in applied:
+                print(f"Applied {migration.version:04d} {migration.name}")
+            if not applied:
+                print("Schema is up to date")
+        else:
+            applied = applied_versions(connection)
+            for migration in MIGRATIONS:
+                state = "applied" if migration.version in applied else "pending"
+                print(f"{migration.version:04d} {migration.name:<32} {state}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
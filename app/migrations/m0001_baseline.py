@@ -0,0 +1,26 @@
+"""
+Schema created by `init_db` before migrations existed, so existing databases and new ones start alike.
+"""
+from sqlalchemy import Connection, MetaData, Table, Column, Index, String, DateTime
+
+VERSION = 1
+NAME = "baseline"
+TRANSACTIONAL = True
+
+# Frozen copy of the User table of the time, later model changes belong to later migrations
+metadata = MetaData()
+user = Table(
+    "user", 
+    metadata, 
+    Column("id", String, primary_key=True), 
+    Column("username", String(128), nullable=False), 
+    Column("hashed_password", String, nullable=False), 
+    Column("created_at", DateTime(timezone=True), nullable=False), 
+    Column("updated_at", DateTime(timezone=True), nullable=False), 
+    Index("ix_user_id", "id"), 
+    Index("ix_user_username", "username", unique=True), 
+)
+
+
+def upgrade(connection: Connection):
+    metadata.create_all(connection, checkfirst=True)
@@ -0,0 +1,15 @@
+"""
+Token revocation epoch of every User, see `revoke_user_tokens_async`.
+"""
+from sqlalchemy import Connection
+
+from app.migrations.ops import add_column
+
+VERSION = 2
+NAME = "user_token_version"
+TRANSACTIONAL = True
+
+
+def upgrade(connection: Connection):
+    # Constant default: existing rows get 0 without rewriting the table on PostgreSQL
+    add_column(connection, "user", "token_version", "INTEGER NOT NULL DEFAULT 0")
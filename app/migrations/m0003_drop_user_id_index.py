@@ -0,0 +1,14 @@
+"""
+Drop ix_user_id, a duplicate of the primary key index that only slowed down writes.
+"""
+from sqlalchemy import Connection
+
+from app.migrations.ops import drop_index
+
+VERSION = 3
+NAME = "drop_user_id_index"
+TRANSACTIONAL = False
+
+
+def upgrade(connection: Connection):
+    drop_index(connection, "ix_user_id")
@@ -0,0 +1,14 @@
+"""
+Expression index on lower(username), for case-insensitive username lookups.
+"""
+from sqlalchemy import Connection
+
+from app.migrations.ops import create_index
+
+VERSION = 4
+NAME = "user_username_lower_index"
+TRANSACTIONAL = False
+
+
+def upgrade(connection: Connection):
+    create_index(connection, "ix_user_username_lower", "user", "lower(username)")
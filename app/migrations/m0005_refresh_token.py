@@ -0,0 +1,25 @@
+"""
+Server-side refresh token sessions, see `app.utils.refresh_sessions`.
+"""
+from sqlalchemy import Connection, MetaData, Table, Column, Index, String, Float
+
+VERSION = 5
+NAME = "refresh_token"
+TRANSACTIONAL = True
+
+# New table, nothing to lock. Frozen copy of the RefreshToken model of the time.
+metadata = MetaData()
+refresh_token = Table(
+    "refresh_token", 
+    metadata, 
+    Column("jti", String(64), primary_key=True), 
+    Column("family", String(64), nullable=False), 
+    Column("user_id", String, nullable=False), 
+    Column("expires_at", Float, nullable=False), 
+    Index("ix_refresh_token_family", "family", unique=True), 
+    Index("ix_refresh_token_expires_at", "expires_at"), 
+)
+
+
+def upgrade(connection: Connection):
+    metadata.create_all(connection, checkfirst=True)
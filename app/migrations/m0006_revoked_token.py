@@ -0,0 +1,24 @@
+"""
+Access token revocation denylist, see `app.utils.revocation`.
+"""
+from sqlalchemy import Connection, MetaData, Table, Column, Index, String, Float
+
+VERSION = 6
+NAME = "revoked_token"
+TRANSACTIONAL = True
+
+# New table, nothing to lock. Frozen copy of the RevokedToken model of the time.
+metadata = MetaData()
+revoked_token = Table(
+    "revoked_token", 
+    metadata, 
+    Column("jti", String(64), primary_key=True), 
+    Column("expires_at", Float, nullable=False), 
+    Column("revoked_at", Float, nullable=False), 
+    Index("ix_revoked_token_expires_at", "expires_at"), 
+    Index("ix_revoked_token_revoked_at", "revoked_at"), 
+)
+
+
+def upgrade(connection: Connection):
+    metadata.create_all(connection, checkfirst=True)
@@ -0,0 +1,56 @@
+"""
+Schema operations shared by migrations, written to run online on PostgreSQL and to be re-runnable.
+"""
+from sqlalchemy import Connection, inspect, text
+
+
+def is_postgres(connection: Connection) -> bool:
+    return connection.dialect.name == "postgresql"
+
+
+def has_table(connection: Connection, table: str) -> bool:
+    return inspect(connection).has_table(table)
+
+
+def has_column(connection: Connection, table: str, column: str) -> bool:
+    return any(info["name"] == column for info in inspect(connection).get_columns(table))
+
+
+def add_column(connection: Connection, table: str, column: str, definition: str):
+    """
+    ADD COLUMN unless it exists.  
+    Give NOT NULL columns a constant DEFAULT: PostgreSQL 11+ then only updates the catalog, no table rewrite.
+    """
+    if not has_column(connection, table, column):
+        connection.execute(text(f'ALTER TABLE "{table}" ADD COLUMN {column} {definition}'))
+
+
+def create_index(connection: Connection, name: str, table: str, expressions: str, unique: bool = False):
+    """
+    CREATE INDEX unless it exists.  
+    On PostgreSQL the index is built CONCURRENTLY, so writes
+    aren't blocked while it builds: the migration must not be TRANSACTIONAL.
+    """
+    unique_sql = "UNIQUE " if unique else ""
+
+    if is_postgres(connection):
+        # A failed CONCURRENTLY build leaves an INVALID index behind, which IF NOT EXISTS would keep
+        invalid = connection.execute(
+            text(
+                "SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+                "WHERE c.relname = :name AND NOT i.indisvalid"
+            ), 
+            {"name": name}, 
+        ).first()
+        if invalid:
+            connection.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS "{name}"'))
+
+        connection.execute(text(f'CREATE {unique_sql}INDEX CONCURRENTLY IF NOT EXISTS "{name}" ON "{table}" ({expressions})'))
+    else:
+        connection.execute(text(f'CREATE {unique_sql}INDEX IF NOT EXISTS "{name}" ON "{table}" ({expressions})'))
+
+
+def drop_index(connection: Connection, name: str):
+    """DROP INDEX if it exists, CONCURRENTLY on PostgreSQL: the migration must not be TRANSACTIONAL."""
+    concurrently = "CONCURRENTLY " if is_postgres(connection) else ""
+    connection.execute(text(f'DROP INDEX {concurrently}IF EXISTS "{name}"'))
@@ -0,0 +1,15 @@
+from sqlmodel import SQLModel, Field
+
+
+class RefreshToken(SQLModel, table=True):
+    """Live refresh token of a login session family, see `app.utils.refresh_sessions`."""
+
+    __tablename__ = "refresh_token"
+
+    # jti claim of the token
+    jti: str = Field(primary_key=True, max_length=64)
+    # fam claim, shared by every token rotated from the same login. One live token per family.
+    family: str = Field(max_length=64, unique=True, index=True)
+    user_id: str
+    # Unix time, like the token's exp claim
+    expires_at: float = Field(index=True)
@@ -0,0 +1,14 @@
+from sqlmodel import SQLModel, Field
+
+
+class RevokedToken(SQLModel, table=True):
+    """Access token revoked before its expiry, see `app.utils.revocation`."""
+
+    __tablename__ = "revoked_token"
+
+    # jti claim of the token
+    jti: str = Field(primary_key=True, max_length=64)
+    # Unix time, like the token's exp claim. The row is useless afterwards and gets swept.
+    expires_at: float = Field(index=True)
+    # Unix time of the revocation, cursor of the incremental denylist syncs
+    revoked_at: float = Field(index=True)
@@ -1,12 +1,24 @@
-from sqlmodel import SQLModel, Field, select
+from sqlmodel import SQLModel, Field, Session, select, update
+from sqlalchemy import Index, func, text
+from sqlmodel.ext.asyncio.session import AsyncSession
 from uuid import uuid4
 from datetime import datetime, timezone
-from passlib.context import CryptContext
 
-from app.db import get_session
-from app.env import PASSWD_HASH_ALGO
+from app.db import session_scope, async_session_scope, async_read_session_scope, reads_replica
+from app.utils.pwd_crypt import hashing_pool
+from app.utils.cache import TTLCache, KVCache, LocalKVStore, CacheBackend
+from app.env import (
+    TOKEN_VERSION_CACHE_SIZE, 
+    TOKEN_VERSION_CACHE_TTL_SECONDS, 
+    USER_CACHE_BACKEND, 
+    USER_CACHE_SIZE, 
+    USER_CACHE_TTL_SECONDS, 
+    USER_CACHE_NEGATIVE_TTL_SECONDS, 
+)
 
-pwd_context = CryptContext([PASSWD_HASH_ALGO], deprecated="auto")
+
+# User id -> token version. Lets refresh check revocation without querying the User row every time.
+token_versions = TTLCache(max_size=TOKEN_VERSION_CACHE_SIZE, ttl=TOKEN_VERSION_CACHE_TTL_SECONDS)
 
 
 class BaseUser(SQLModel):
@@ -14,25 +26,67 @@ class BaseUser(SQLModel):
 
 
 class User(SQLModel, table=True):
-    id: str = Field(primary_key=True, index=True, default_factory=lambda: str(uuid4()))
+    # The primary key is indexed already, a second index on it only slowed down writes
+    id: str = Field(primary_key=True, default_factory=lambda: str(uuid4()))
     username: str = Field(min_length=3, max_length=128, unique=True, index=True)
     hashed_password: str = Field(min_length=6)
+    # Revocation epoch embedded in issued tokens as the "ver" claim, bump it to invalidate them
+    token_version: int = Field(default=0, sa_column_kwargs={"server_default": text("0")})
     created_at: datetime
     updated_at: datetime
 
 
+# Case-insensitive lookups (`func.lower(User.username) == username.lower()`) use this index,
+# the unique one only serves exact matches. Schema changes go through app.migrations.
+Index("ix_user_username_lower", func.lower(User.__table__.c.username))
+
+
 class UserCreate(BaseUser):
     password: str = Field(min_length=6, max_length=64)
 
-    def save(self):
-        """Create User on Database."""
+    def save(self, session: Session | None = None, hashed_password: str | None = None):
+        """
+        Create User on Database. Uses the given session or opens a short-lived one.  
+        Pass `hashed_password` when the password was already hashed (e.g. with `hashing_pool.hash_async`).
+        """
+
+        user = self._to_user(hashed_password or hashing_pool.hash(self.password))
+
+        if session is None:
+            with session_scope() as session:
+                session.add(user)
+                session.commit()
+        else:
+            session.add(user)
+            session.commit()
+
+        # Drop a cached "unknown username" entry
+        user_cache.invalidate(username=self.username)
+
+    async def save_async(self, session: AsyncSession | None = None, hashed_password: str | None = None):
+        """Async version of `save`. Uses the given session or opens a new one."""
+
+        if hashed_password is None:
+            hashed_password = await hashing_pool.hash_async(self.password)
+        user = self._to_user(hashed_password)
 
-        hashed_pwd = pwd_context.hash(self.password)
+        if session is None:
+            async with async_session_scope() as session:
+                session.add(user)
+                await session.commit()
+        else:
+            session.add(user)
+            await session.commit()
+
+        # Drop a cached "unknown username" entry
+        user_cache.invalidate(username=self.username)
+
+    def _to_user(self, hashed_pwd: str) -> User:
         created_at = datetime.now(timezone.utc)
         updated_at = datetime.now(timezone.utc)
 
         try:
-            user = User(
+            return User(
                 username=self.username, 
                 hashed_password=hashed_pwd, 
                 created_at=created_at, 
@@ -41,29 +95,258 @@ class UserCreate(BaseUser):
         except Exception as e: 
             raise Exception(f"Error while creating User model!\nError: {e}")
 
-        session = next(get_session())
-        session.add(user)
-        session.commit()
 
+class UserNotFound(Exception):
+    """Raised when there's no User for the given id or username."""
+
+
+class UserCache:
+    """
+    Cache of User rows in front of `get_user`, keyed by both id and username.  
+    Unknown usernames are cached as misses for `negative_ttl` seconds to absorb enumeration floods. 
+    A shared backend (KVCache) only gets those misses: User rows carry the password hash, which stays 
+    in the process. The memory backend keeps the User itself and hands the same one to every hit, don't mutate it. 
+    Every path that changes a User must call `invalidate`. A None backend disables the cache.
+    """
+
+    def __init__(
+        self, 
+        backend: CacheBackend | None, 
+        ttl: float = USER_CACHE_TTL_SECONDS, 
+        negative_ttl: float = USER_CACHE_NEGATIVE_TTL_SECONDS, 
+    ):
+        self.backend = backend
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+
+    def lookup(self, id: str = "", username: str = "") -> tuple[bool, User | None]:
+        """Return (found, user). found is False on cache miss, user is None for known unknown usernames."""
+        if self.backend is None:
+            return False, None
+
+        key = self._id_key(id) if id else self._username_key(username)
+        value = self.backend.get(key)
+
+        if value is None:
+            return False, None
+        if value is False:
+            return True, None
+        return True, value
+
+    def store(self, user: User | None, id: str = "", username: str = ""):
+        """Cache a lookup result. A None user is cached as an unknown username."""
+        if self.backend is None:
+            return
+
+        if user is None:
+            if username and not id:
+                self.backend.set(self._username_key(username), False, self.negative_ttl)
+            return
+        if self.shared:
+            return
+
+        # A copy outside any session: the caller's session could expire or change the row it loaded
+        row = User.model_construct(**user.model_dump())
+        self.backend.set(self._id_key(user.id), row, self.ttl)
+        self.backend.set(self._username_key(user.username), row, self.ttl)
+
+    def invalidate(self, id: str = "", username: str = ""):
+        """Drop cached entries of a User. With only an id, the cached row tells which username to drop."""
+        if self.backend is None:
+            return
+
+        if id and not username:
+            row = self.backend.get(self._id_key(id))
+            username = row.username if row else ""
+
+        if id:
+            self.backend.delete(self._id_key(id))
+        if username:
+            self.backend.delete(self._username_key(username))
+
+    @property
+    def shared(self) -> bool:
+        """Whether the backend is a store shared between workers rather than process memory."""
+        return isinstance(self.backend, KVCache)
+
+    def clear(self):
+        if self.backend is not None:
+            self.backend.clear()
+
+    def stats(self) -> dict:
+        """Hit/miss/eviction counters of the backend."""
+        if self.backend is None:
+            return {}
+        return self.backend.stats.snapshot()
+
+    @staticmethod
+    def _id_key(id: str) -> str:
+        return f"user:id:{id}"
+
+    @staticmethod
+    def _username_key(username: str) -> str:
+        return f"user:username:{username}"
+
+
+def build_user_cache_backend(kind: str = USER_CACHE_BACKEND) -> CacheBackend | None:
+    """
+    Build the user cache backend named by USER_CACHE_BACKEND.  
+    "memory" is a per-process cache, "kv" a KVCache on a LocalKVStore standing in for a shared store 
+    (unknown usernames only), "off" disables caching. To share a real store, set `user_cache.backend = KVCache(client)`.
+    """
+    if kind == "memory":
+        return TTLCache(max_size=USER_CACHE_SIZE, ttl=USER_CACHE_TTL_SECONDS)
+    if kind == "kv":
+        return KVCache(LocalKVStore(), ttl=USER_CACHE_TTL_SECONDS)
+    if kind == "off":
+        return None
 
-def get_user(id: str = "", username: str = "") -> User:
+    raise ValueError(f"Unknown user cache backend {kind}!")
+
+
+user_cache = UserCache(build_user_cache_backend())
+
+
+def user_statement(id: str = "", username: str = ""):
+    """Build the SELECT used to look up a User by id or username."""
     statement = select(User)
 
     if id:
-        statement = statement.where(User.id == id)
+        return statement.where(User.id == id)
     elif username:
-        statement = statement.where(User.username == username)
+        return statement.where(User.username == username)
     else:
         raise Exception("This function should receive an id or username!")
+
+
+def get_user(id: str = "", username: str = "", session: Session | None = None, use_cache: bool = True) -> User:
+    """
+    Get User by id or username, served from `user_cache` when possible.  
+    Uses the given session or opens a short-lived one. Cached Users aren't attached to any session. 
+    `use_cache=False` always reads the row, for callers that can't act on a stale User.
+    """
+    statement = user_statement(id, username)
+    found, user = user_cache.lookup(id, username) if use_cache else (False, None)
+    
+    if not found:
+        if session is None:
+            with session_scope() as session:
+                user = session.exec(statement).first()
+        else:
+            results = session.exec(statement)
+            user = results.first()
+
+        user_cache.store(user, id, username)
+
+    if not user:
+        raise UserNotFound("Couldn't find a User for the given id or username.")
     
-    session = next(get_session())
-    results = session.exec(statement)
-    user = results.first()
+    return user
+
+
+async def get_user_async(
+    id: str = "", 
+    username: str = "", 
+    session: AsyncSession | None = None, 
+    use_cache: bool = True, 
+) -> User:
+    """Async version of `get_user`. Uses the given session or opens a new one."""
+    statement = user_statement(id, username)
+    found, user = user_cache.lookup(id, username) if use_cache else (False, None)
+
+    if not found:
+        if session is None:
+            async with async_read_session_scope() as session:
+                results = await session.exec(statement)
+                user = results.first()
+        else:
+            results = await session.exec(statement)
+            user = results.first()
+
+        # A replica may not have a fresh join yet, confirm misses on the primary before caching them
+        if user is None and reads_replica(session):
+            async with async_session_scope() as primary:
+                results = await primary.exec(statement)
+                user = results.first()
+
+        user_cache.store(user, id, username)
 
     if not user:
-        raise Exception("Couldn't find a User for the given id or username.")
+        raise UserNotFound("Couldn't find a User for the given id or username.")
     
     return user
 
 
+async def get_token_version_async(user_id: str, session: AsyncSession | None = None) -> int | None:
+    """
+    Get the token version of a User, served from the `token_versions` cache when possible.  
+    Return None if there's no User with the given id.
+    """
+    version = token_versions.get(user_id)
+    if version is not None:
+        return version
+
+    statement = select(User.token_version).where(User.id == user_id)
+
+    if session is None:
+        async with async_read_session_scope() as session:
+            results = await session.exec(statement)
+            version = results.first()
+    else:
+        results = await session.exec(statement)
+        version = results.first()
+
+    if version is not None:
+        token_versions.set(user_id, version)
+
+    return version
+
+
+async def revoke_user_tokens_async(user_id: str, session: AsyncSession | None = None) -> int | None:
+    """
+    Invalidate every token issued to a User by bumping its token version.  
+    Return the new version, or None if there's no User with the given id. 
+    Other workers notice the new version once their cached entry expires.
+    """
+    if session is None:
+        async with async_session_scope() as session:
+            return await revoke_user_tokens_async(user_id, session)
+
+    statement = (
+        update(User)
+        .where(User.id == user_id)
+        .values(token_version=User.token_version + 1, updated_at=datetime.now(timezone.utc))
+    )
+    await session.exec(statement)
+    await session.commit()
+
+    user_cache.invalidate(id=user_id)
+    token_versions.delete(user_id)
+    return await get_token_version_async(user_id, session)
+
+
+async def update_password_hash_async(
+    user_id: str, 
+    old_hash: str, 
+    new_hash: str, 
+    session: AsyncSession | None = None, 
+) -> bool:
+    """
+    Replace the password hash of a User, e.g. with one re-hashed at the current cost on login.  
+    Only applies while the stored hash is still `old_hash`, so a concurrent password change wins. 
+    Return whether the hash was replaced.
+    """
+    if session is None:
+        async with async_session_scope() as session:
+            return await update_password_hash_async(user_id, old_hash, new_hash, session)
+
+    statement = (
+        update(User)
+        .where(User.id == user_id, User.hashed_password == old_hash)
+        .values(hashed_password=new_hash, updated_at=datetime.now(timezone.utc))
+    )
+    result = await session.exec(statement)
+    await session.commit()
 
+    user_cache.invalidate(id=user_id)
+    return result.rowcount > 0
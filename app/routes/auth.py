@@ -1,43 +1,102 @@
-from fastapi import APIRouter, HTTPException, Request, Response, Depends
-from sqlmodel import select, Session
+from fastapi import APIRouter, HTTPException, Request, Response, Depends, BackgroundTasks
+from sqlalchemy.exc import IntegrityError
+from sqlmodel.ext.asyncio.session import AsyncSession
 from datetime import datetime, timezone, timedelta
+from math import ceil
+from time import time
+
+from app.models.user import (
+    UserCreate, 
+    UserNotFound, 
+    get_user_async, 
+    get_token_version_async, 
+    update_password_hash_async, 
+)
+from app.env import JWT_REFRESH_MODE, JWT_REFRESH_EXPIRES_MINUTES
+from app.db import get_async_session, get_async_read_session
+from app.utils.pwd_crypt import hashing_pool, HashingPoolSaturated
+from app.utils.rate_limit import login_rate_limiter, RateLimitExceeded
+from app.utils.jwt import create_tokens, validate_token, validate_refresh_token, get_current_user, Principal, JWTError
+from app.utils.refresh_sessions import refresh_sessions, RefreshTokenRejected
+from app.utils.revocation import denylist
+from app.utils.metrics import stage
 
-from app.models.user import User, UserCreate, get_user
-from app.db import get_session
-from app.utils.pwd_crypt import get_pwd_context
-from app.utils.jwt import create_tokens, validate_refresh_token, JWTError
-
-
-pwd_context = get_pwd_context()
 
 router = APIRouter(
     prefix="/users/auth", 
     tags=["auth"]
 )
 
+def busy_response(res: Response, retry_after: int = 1) -> dict:
+    """Fill response for requests rejected because the hashing pool is saturated."""
+    res.status_code = 503
+    res.headers["Retry-After"] = str(retry_after)
+    return {"detail": "Server is busy, try again later!", "success": False}
+
+def rate_limited_response(res: Response, retry_after: int) -> dict:
+    """Fill response for requests rejected by a rate limiter."""
+    res.status_code = 429
+    res.headers["Retry-After"] = str(retry_after)
+    return {"detail": "Too many login attempts, try again later!", "success": False}
+
 @router.post("/login")
-def login(body: UserCreate, req: Request, res: Response, session: Session = Depends(get_session)):
+async def login(
+    body: UserCreate, 
+    req: Request, 
+    res: Response, 
+    background: BackgroundTasks, 
+    session: AsyncSession = Depends(get_async_read_session), 
+):
+    # Throttle before any DB query or hash verification
+    try:
+        client_ip = req.client.host if req.client else "unknown"
+        login_rate_limiter.hit(body.username, client_ip)
+    except RateLimitExceeded as e:
+        return rate_limited_response(res, e.retry_after)
+
     try: 
-        statement = select(User).where(User.username == body.username)
-        results = session.exec(statement)
-        user = results.first()
+        with stage("login.user_lookup"):
+            user = await get_user_async(username=body.username, session=session)
+    except UserNotFound as _:
+        user = None
     except Exception as e:
         res.status_code = 500
         return {"detail": "Database Error!", "success": False}
-    
-    if not user:
-        res.status_code = 404
-        return {"detail": f"Couldn't found User with Username {body.username}!", "success": False}
 
-    equal_pwd = pwd_context.verify(body.password, user.hashed_password)
+    # Unknown usernames pay for a verify too and get the same answer as a wrong password, 
+    # so neither latency nor response tells whether a username exists
+    try:
+        with stage("login.pwd_verify"):
+            if user is None:
+                equal_pwd, new_hash = await hashing_pool.dummy_verify_async(body.password), None
+            else:
+                equal_pwd, new_hash = await hashing_pool.verify_and_update_async(body.password, user.hashed_password)
+    except HashingPoolSaturated as _:
+        return busy_response(res)
+
     if not equal_pwd:
         res.status_code = 400
-        return {"detail": f"Wrong Password for User {body.username}!", "success": False}
+        return {"detail": "Invalid username or password!", "success": False}
+
+    # Stored hash uses an outdated cost, persist the re-hashed one after the response is sent
+    if new_hash is not None:
+        background.add_task(update_password_hash_async, user.id, user.hashed_password, new_hash)
+
+    # Server-side session of this login, so its refresh token can be rotated and revoked
+    session_claims = None
+    if refresh_sessions.enabled:
+        try:
+            with stage("login.refresh_session"):
+                session_claims = (await refresh_sessions.start(user.id)).claims()
+        except Exception as e:
+            res.status_code = 500
+            return {"detail": "Database Error!", "success": False}
     
     # Generate JWT Tokens
     try: 
-        token_data = {"id": user.id}
-        tokens = create_tokens(token_data)
+        token_data = {"id": user.id, "ver": user.token_version}
+        with stage("login.create_tokens"):
+            tokens = create_tokens(token_data, session_claims=session_claims)
     except JWTError as _:
         res.status_code = 400
         return {"detail": f"Got JWTError when creating tokens for User {body.username}!", "success": False}
@@ -57,21 +116,26 @@ def login(body: UserCreate, req: Request, res: Response, session: Session = Depe
     return tokens
 
 @router.post("/join")
-def join(
+async def join(
     body: UserCreate, 
     req: Request, 
     res: Response, 
-    session: Session = Depends(get_session)
+    session: AsyncSession = Depends(get_async_session)
 ): 
-    statement = select(User).where(User.username == body.username)
-    results = session.exec(statement)
-    
-    if results.first():
+    try:
+        with stage("join.pwd_hash"):
+            hashed_password = await hashing_pool.hash_async(body.password)
+    except HashingPoolSaturated as _:
+        return busy_response(res)
+
+    # Single INSERT, the unique index on User.username rejects duplicates without a prior SELECT
+    try: 
+        with stage("join.insert"):
+            await body.save_async(session, hashed_password)
+    except IntegrityError as _:
+        await session.rollback()
         res.status_code = 400
         return {"detail": f"There's already an User with username {body.username}!", "success": False}
-    
-    try: 
-        body.save()
     except: 
         res.status_code = 500 
         return {"detail": f"Got unknow database error while creating User {body.username}!", "success": False}
@@ -80,28 +144,66 @@ def join(
     return {"detail": f"User {body.username} created Successfully!", "success": True}
 
 @router.get("/refresh")
-def refresh(req: Request, res: Response):
-    payload = validate_refresh_token(req, res)
+async def refresh(req: Request, res: Response, session: AsyncSession = Depends(get_async_read_session)):
+    with stage("refresh.validate_refresh_token"):
+        payload = validate_refresh_token(req, res)
     user_id = payload.get("id")
 
     if not user_id:
         raise HTTPException(400, "Request doesn't contain an User id!")
     
-    try:
-        user = get_user(user_id)
-    except: 
+    # Tokens issued before token versions existed carry no "ver" claim
+    token_version = payload.get("ver", 0)
+
+    with stage("refresh.user_lookup"):
+        if JWT_REFRESH_MODE == "stateless":
+            current_version = await get_token_version_async(user_id, session)
+        else:
+            # Uncached, so a token version bump is seen at once
+            try:
+                user = await get_user_async(user_id, session=session, use_cache=False)
+            except: 
+                raise HTTPException(400, "Error while validanting the User. Given user credentials are invalid!")
+            current_version = user.token_version
+
+    if current_version is None or token_version != current_version:
         raise HTTPException(400, "Error while validanting the User. Given user credentials are invalid!")
 
+    # Single use refresh tokens: swap this one for a new one of the same session
+    session_claims = None
+    refresh_expires_minutes = JWT_REFRESH_EXPIRES_MINUTES
+    if refresh_sessions.enabled:
+        try:
+            with stage("refresh.rotate_session"):
+                rotated = await refresh_sessions.rotate(payload)
+        except RefreshTokenRejected as e:
+            raise HTTPException(400, str(e))
+        session_claims = rotated.claims()
+        # The new token expires with its session, not a full lifetime from now
+        refresh_expires_minutes = max(1, ceil((rotated.expires_at - time()) / 60))
 
     try: 
-        token_data = {"id": user.id}
-        tokens = create_tokens(token_data)
+        token_data = {"id": user_id, "ver": current_version}
+        with stage("refresh.create_tokens"):
+            tokens = create_tokens(
+                token_data, 
+                refresh_expires_minutes=refresh_expires_minutes, 
+                session_claims=session_claims, 
+            )
     except JWTError as _:
         res.status_code = 400
-        return {"detail": f"Got JWTError when creating tokens for User {user.username}!", "success": False}
+        return {"detail": f"Got JWTError when creating tokens for User {user_id}!", "success": False}
     except:
         res.status_code = 500
-        return {"detail": f"Got Error while creating JWT tokens for User {user.username}!", "success": False}
+        return {"detail": f"Got Error while creating JWT tokens for User {user_id}!", "success": False}
+
+    if session_claims is not None:
+        res.set_cookie(
+            "refresh_token", 
+            tokens["refresh_token"], 
+            expires=tokens["refresh_expires_at"], 
+            httponly=True, 
+        )
     
     del tokens["refresh_token"]
     del tokens["refresh_expires_at"] 
@@ -109,7 +211,26 @@ def refresh(req: Request, res: Response):
     return tokens
 
 @router.get("/logout")
-def logout(req: Request, res: Response):
+async def logout(req: Request, res: Response):
+    # Revoke the session too, or a copy of the cookie would keep working until it expires
+    token = req.cookies.get("refresh_token")
+    if token and refresh_sessions.enabled:
+        try:
+            await refresh_sessions.revoke(validate_token(token))
+        # A rotated token revokes its family as a reuse, a gone session has nothing left to revoke
+        except (JWTError, RefreshTokenRejected) as _:
+            pass
+
+    # Revoke the access token as well, it would otherwise keep working until it expires
+    scheme, _, access_token = req.headers.get("authorization", "").partition(" ")
+    if scheme.lower() == "bearer" and access_token and denylist.enabled:
+        try:
+            payload = validate_token(access_token.strip())
+            if payload.get("type") == "access" and payload.get("jti"):
+                await denylist.revoke(payload["jti"], payload["exp"])
+        except JWTError as _:
+            pass
+
     hour_ago = datetime.now(timezone.utc) - timedelta(hours=1)
 
     res.set_cookie(
@@ -119,4 +240,8 @@ def logout(req: Request, res: Response):
         httponly=True,  
     )
 
-    return {"detail": "Logout Successfully!", "success": True}
\ No newline at end of file
+    return {"detail": "Logout Successfully!", "success": True}
+
+@router.get("/me")
+async def me(principal: Principal = Depends(get_current_user)) -> Principal:
+    return principal
@@ -0,0 +1,106 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from app.db import pool_metrics, async_pool_metrics, async_read_pool_metrics, replicas
+from app.models.user import user_cache, token_versions
+from app.utils.jwt import verified_tokens
+from app.utils.pwd_crypt import hashing_pool
+from app.utils.rate_limit import login_rate_limiter
+from app.utils.refresh_sessions import refresh_sessions
+from app.utils.revocation import denylist
+from app.utils.metrics import registry
+
+
+router = APIRouter(tags=["metrics"])
+
+
+def _cache_counters() -> dict[tuple[str, str], float]:
+    caches = {
+        "user": user_cache.stats(), 
+        "token_version": token_versions.stats.snapshot(), 
+        "verified_token": verified_tokens.stats.snapshot() if verified_tokens is not None else {}, 
+    }
+    return {
+        (cache, counter): value 
+        for cache, stats in caches.items() 
+        for counter, value in stats.items()
+    }
+
+registry.gauge(
+    "db_pool_checked_out_connections", 
+    "Connections currently checked out of the DB pools.", 
+    lambda: {
+        ("sync",): pool_metrics.checked_out, 
+        ("async",): async_pool_metrics.checked_out, 
+        ("async_read",): async_read_pool_metrics.checked_out, 
+    }, 
+    ("engine",), 
+)
+registry.gauge(
+    "db_pool_peak_checked_out_connections", 
+    "Most connections checked out at once from the DB pools.", 
+    lambda: {
+        ("sync",): pool_metrics.peak_checked_out, 
+        ("async",): async_pool_metrics.peak_checked_out, 
+        ("async_read",): async_read_pool_metrics.peak_checked_out, 
+    },  
+    ("engine",), 
+)
+registry.gauge(
+    "db_replica_up", 
+    "Whether each read replica (by its position in DB_REPLICA_HOSTS) is used, 0 after a failure.", 
+    lambda: {(str(index),): int(up) for index, up in replicas.status().items()}, 
+    ("replica",), 
+)
+registry.counter(
+    "db_replica_failovers", 
+    "Reads moved to another replica or to the primary because a replica failed.", 
+    lambda: replicas.failovers, 
+)
+registry.counter(
+    "refresh_token_reuses", 
+    "Rotated refresh tokens presented again, each one revoked its session.", 
+    lambda: refresh_sessions.reuses, 
+)
+registry.counter(
+    "refresh_session_sweep_errors", 
+    "Sweeps of expired refresh sessions that failed, retried on the next interval.", 
+    lambda: refresh_sessions.sweep_errors, 
+)
+registry.gauge(
+    "revocation_denylist_entries", 
+    "Unexpired revoked access tokens in the in-process denylist.", 
+    lambda: len(denylist), 
+)
+registry.gauge(
+    "revocation_denylist_bytes", 
+    "Memory held by the revocation denylist entries.", 
+    lambda: denylist.footprint(), 
+)
+registry.counter(
+    "revocation_sync_errors", 
+    "Denylist syncs and rebuilds that failed, the denylist is stale until one succeeds.", 
+    lambda: denylist.sync_errors, 
+)
+registry.gauge(
+    "password_hashing_pending_jobs", 
+    "Password hashing jobs queued or running.", 
+    lambda: hashing_pool.pending, 
+)
+registry.counter(
+    "login_rate_limited_attempts", 
+    "Login attempts rejected by the rate limiter.", 
+    lambda: {(limiter,): count for limiter, count in login_rate_limiter.rejected().items()}, 
+    ("limiter",), 
+)
+registry.counter(
+    "cache_events", 
+    "Hit/miss/eviction/expiration counters of in-process caches.", 
+    _cache_counters, 
+    ("cache", "event"), 
+)
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
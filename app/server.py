@@ -0,0 +1,87 @@
+"""
+Production entry point.
+
+    python -m app.server
+
+Migrates the schema once (with DB_MIGRATE_ON_STARTUP), calibrates the password hash cost once for
+every worker (with PASSWD_HASH_TARGET_MS), then serves main:app from SERVER_WORKERS uvicorn worker processes
+(uvloop + httptools by default). On SIGTERM/SIGINT workers stop accepting connections and give
+in-flight requests up to SERVER_GRACEFUL_SHUTDOWN_SECONDS to finish.
+"""
+from importlib.util import find_spec
+import os
+import sys
+
+from app import env
+
+
+# Server setting -> module it needs
+_IMPLEMENTATIONS = {"uvloop": "uvloop", "httptools": "httptools"}
+
+
+def _implementation(name: str) -> str:
+    """Fall back to uvicorn's "auto" pick when the requested loop/parser isn't installed."""
+    module = _IMPLEMENTATIONS.get(name)
+    if module is not None and find_spec(module) is None:
+        print(f"{module} isn't installed, falling back to auto", file=sys.stderr)
+        return "auto"
+    return name
+
+
+def server_options(workers: int = env.SERVER_WORKERS) -> dict:
+    """uvicorn.run keyword arguments built from app.env."""
+    return {
+        "host": env.SERVER_HOST, 
+        "port": env.PORT, 
+        "workers": workers, 
+        "loop": _implementation(env.SERVER_LOOP), 
+        "http": _implementation(env.SERVER_HTTP), 
+        "timeout_keep_alive": env.SERVER_KEEP_ALIVE_SECONDS, 
+        "backlog": env.SERVER_BACKLOG, 
+        "timeout_graceful_shutdown": env.SERVER_GRACEFUL_SHUTDOWN_SECONDS, 
+        "proxy_headers": True, 
+        "forwarded_allow_ips": env.SERVER_FORWARDED_ALLOW_IPS, 
+        "access_log": env.DEBUG, 
+    }
+
+
+def prepare_workers(workers: int):
+    """
+    Environment inherited by the worker processes.  
+    Workers skip the migrations run by the parent, and without an explicit PASSWD_HASH_POOL_SIZE
+    the hashing threads are split between workers, so N workers don't each start a pool per core.
+    With several workers, a PASSWD_HASH_TARGET_MS calibration runs once here and reaches them as PASSWD_HASH_ROUNDS:
+    workers calibrating on their own could pick different costs and re-hash each other's hashes on every login.
+    """
+    os.environ["DB_MIGRATE_ON_STARTUP"] = "False"
+    # A single worker runs in this process, where app.env was already loaded
+    env.DB_MIGRATE_ON_STARTUP = False
+
+    if workers > 1 and "PASSWD_HASH_POOL_SIZE" not in os.environ:
+        os.environ["PASSWD_HASH_POOL_SIZE"] = str(max(1, (os.cpu_count() or 1) // workers))
+
+    if workers > 1 and env.PASSWD_HASH_ROUNDS <= 0 and env.PASSWD_HASH_TARGET_MS > 0:
+        from app.utils.pwd_crypt import calibrate_rounds
+
+        # Before any worker starts, so the timing isn't skewed by requests
+        os.environ["PASSWD_HASH_ROUNDS"] = str(calibrate_rounds(env.PASSWD_HASH_ALGO, env.PASSWD_HASH_TARGET_MS))
+
+
+def main() -> int:
+    import uvicorn
+    from app.db import init_db, engine
+
+    workers = max(1, env.SERVER_WORKERS)
+
+    # Once, before any worker starts, so they don't race on the schema
+    if env.DB_MIGRATE_ON_STARTUP:
+        init_db()
+        engine.dispose()
+
+    prepare_workers(workers)
+    uvicorn.run("main:app", **server_options(workers))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
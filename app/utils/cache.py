@@ -0,0 +1,234 @@
+"""
+In-process caches.
+"""
+from collections import OrderedDict
+from fnmatch import fnmatchcase
+from time import monotonic
+from typing import Any, Hashable, Iterator, Protocol
+import threading
+import json
+
+
+class CacheStats:
+    """Counters of a cache. Read them with `snapshot`."""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def snapshot(self) -> dict:
+        return {
+            "hits": self.hits, 
+            "misses": self.misses, 
+            "evictions": self.evictions, 
+            "expirations": self.expirations, 
+        }
+
+
+class CacheBackend(Protocol):
+    """Interface shared by cache backends, so callers can swap an in-process cache for a shared one."""
+
+    stats: CacheStats
+
+    def get(self, key: str, default: Any = None) -> Any: ...
+
+    def set(self, key: str, value: Any, ttl: float | None = None): ...
+
+    def delete(self, key: str): ...
+
+    def clear(self): ...
+
+
+class TTLCache:
+    """
+    Thread-safe bounded cache with per-entry expiry and LRU eviction.  
+    Entries expire `ttl` seconds after being set (or at the `ttl` given to `set`). Once `max_size` 
+    entries are stored, the least recently used one is evicted to make room.
+    """
+
+    _MISSING = object()
+
+    def __init__(self, max_size: int = 1024, ttl: float = 60.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.stats = CacheStats()
+        self._data: OrderedDict[Hashable, tuple[Any, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key, self._MISSING) is not self._MISSING
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Get value stored for key, or default if it is missing or expired."""
+        with self._lock:
+            item = self._data.get(key)
+
+            if item is None:
+                self.stats.misses += 1
+                return default
+
+            value, expires_at = item
+            if expires_at <= monotonic():
+                del self._data[key]
+                self.stats.expirations += 1
+                self.stats.misses += 1
+                return default
+
+            self._data.move_to_end(key)
+            self.stats.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: float | None = None):
+        """Store value for key during ttl seconds (cache default when not given)."""
+        expires_at = monotonic() + (self.ttl if ttl is None else ttl)
+
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.stats.evictions += 1
+
+    def delete(self, key: Hashable):
+        """Remove key if present."""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class KVClient(Protocol):
+    """Subset of a shared key-value store client (e.g. redis.Redis) used by KVCache."""
+
+    def get(self, key: str) -> bytes | str | None: ...
+
+    def set(self, key: str, value: str, ex: int | None = None): ...
+
+    def delete(self, *keys: str): ...
+
+    def scan_iter(self, match: str) -> Iterator[bytes | str]: ...
+
+
+class LocalKVStore:
+    """
+    In-process stand-in for a shared key-value store, for tests and single node setups.  
+    Mimics the KVClient calls of a redis client, values are kept as strings and expire after `ex` seconds.
+    """
+
+    def __init__(self):
+        self._data: dict[str, tuple[str, float | None]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> str | None:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+
+            value, expires_at = item
+            if expires_at is not None and expires_at <= monotonic():
+                del self._data[key]
+                return None
+
+            return value
+
+    def set(self, key: str, value: str, ex: int | None = None):
+        with self._lock:
+            self._data[key] = (value, monotonic() + ex if ex else None)
+
+    def delete(self, *keys: str):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def incr(self, key: str, amount: int = 1) -> int:
+        """Add amount to the integer at key, missing or expired keys count as 0. Keeps the key's expiry."""
+        with self._lock:
+            value, expires_at = self._data.get(key, ("0", None))
+            if expires_at is not None and expires_at <= monotonic():
+                value, expires_at = "0", None
+
+            value = int(value) + amount
+            self._data[key] = (str(value), expires_at)
+            return value
+
+    def expire(self, key: str, ex: int):
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None:
+                self._data[key] = (item[0], monotonic() + ex)
+
+    def scan_iter(self, match: str) -> Iterator[str]:
+        """Unexpired keys matching the glob pattern `match`, like redis SCAN MATCH."""
+        now = monotonic()
+        with self._lock:
+            keys = [
+                key for key, (_, expires_at) in self._data.items()
+                if (expires_at is None or expires_at > now) and fnmatchcase(key, match)
+            ]
+        return iter(keys)
+
+
+# Keys deleted per DEL call by `delete_prefix`
+DELETE_BATCH = 500
+
+def delete_prefix(client: KVClient, prefix: str) -> int:
+    """
+    Delete every key under `prefix`, for the `clear` of stores built on a KVClient. Return how many were deleted.  
+    Walks the keyspace with SCAN, so it's for maintenance and tests, not request paths. Other keys are left alone.
+    """
+    deleted = 0
+    batch = []
+    for key in client.scan_iter(match=f"{prefix}*"):
+        batch.append(key)
+        if len(batch) == DELETE_BATCH:
+            client.delete(*batch)
+            deleted += len(batch)
+            batch = []
+
+    if batch:
+        client.delete(*batch)
+        deleted += len(batch)
+    return deleted
+
+
+class KVCache:
+    """
+    Cache backend on top of a shared key-value store, so every worker sees the same entries.  
+    Values are stored as JSON under `prefix`. Expiry and eviction are left to the store.
+    """
+
+    def __init__(self, client: KVClient, prefix: str = "cache:", ttl: float = 60.0):
+        self.client = client
+        self.prefix = prefix
+        self.ttl = ttl
+        self.stats = CacheStats()
+
+    def get(self, key: str, default: Any = None) -> Any:
+        raw = self.client.get(self.prefix + key)
+
+        if raw is None:
+            self.stats.misses += 1
+            return default
+
+        self.stats.hits += 1
+        return json.loads(raw)
+
+    def set(self, key: str, value: Any, ttl: float | None = None):
+        # Stores expire on whole seconds, never round a short TTL down to "no expiry"
+        ex = max(1, int(self.ttl if ttl is None else ttl))
+        self.client.set(self.prefix + key, json.dumps(value), ex=ex)
+
+    def delete(self, key: str):
+        self.client.delete(self.prefix + key)
+
+    def clear(self):
+        delete_prefix(self.client, self.prefix)
@@ -0,0 +1,200 @@
+"""
+JWT signing/verification backends.
+Every backend takes parsed cryptography key objects (see KeyStore) and raises jose's JWTError
+family, so callers don't depend on the implementation picked by JWT_BACKEND.
+"""
+from jose.exceptions import JWTError, JWTClaimsError, ExpiredSignatureError
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519
+from cryptography.hazmat.primitives.asymmetric.utils import decode_dss_signature, encode_dss_signature
+from base64 import urlsafe_b64encode, urlsafe_b64decode
+from calendar import timegm
+from datetime import datetime
+from time import time
+from typing import Protocol
+import json
+
+
+class JWTBackend(Protocol):
+    name: str
+    algorithms: frozenset[str]
+
+    def encode(self, claims: dict, private_key, algorithm: str) -> str: ...
+
+    def decode(self, token: str, public_key, algorithm: str) -> dict: ...
+
+
+class JoseBackend:
+    """python-jose implementation. Supports every jose algorithm but EdDSA."""
+
+    name = "jose"
+    algorithms = frozenset({"ES256", "ES384", "ES512", "RS256", "RS384", "RS512", "PS256", "PS384", "PS512"})
+
+    def __init__(self):
+        # Imported only when this backend is picked, jose.jwt is slow to import
+        from jose import jwt
+
+        self._jwt = jwt
+
+    def encode(self, claims: dict, private_key, algorithm: str) -> str:
+        self._check_algorithm(algorithm)
+        return self._jwt.encode(claims, private_key, algorithm)
+
+    def decode(self, token: str, public_key, algorithm: str) -> dict:
+        self._check_algorithm(algorithm)
+        return self._jwt.decode(token, public_key, algorithms=[algorithm])
+
+    def _check_algorithm(self, algorithm: str):
+        if algorithm not in self.algorithms:
+            raise JWTError(f"Algorithm {algorithm} isn't supported by the {self.name} JWT backend!")
+
+
+def _b64encode(data: bytes) -> str:
+    return urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+def _b64decode(data: str) -> bytes:
+    return urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+def _json_dumps(data: dict) -> bytes:
+    return json.dumps(data, separators=(",", ":"), sort_keys=True).encode()
+
+
+class CryptographyBackend:
+    """
+    Direct JWS (compact serialization) implementation on top of `cryptography`.
+    Works on the pre-loaded key objects without any per-call key wrapping and adds EdDSA (Ed25519).
+    Validates exp/nbf/iat like jose does. Compare costs on the target host with `python -m bench.jwt_backends`.
+    """
+
+    name = "cryptography"
+
+    # Algorithm -> (curve, hash, coordinate size in bytes)
+    EC_ALGORITHMS = {
+        "ES256": (ec.SECP256R1, hashes.SHA256, 32),
+        "ES384": (ec.SECP384R1, hashes.SHA384, 48),
+        "ES512": (ec.SECP521R1, hashes.SHA512, 66),
+    }
+    algorithms = frozenset(EC_ALGORITHMS) | {"EdDSA"}
+
+    def __init__(self):
+        # Header segment only depends on the algorithm
+        self._headers = {
+            algorithm: _b64encode(_json_dumps({"alg": algorithm, "typ": "JWT"}))
+            for algorithm in self.algorithms
+        }
+
+    def encode(self, claims: dict, private_key, algorithm: str) -> str:
+        header = self._header(algorithm)
+        payload = _b64encode(_json_dumps(self._numeric_dates(claims)))
+        signing_input = f"{header}.{payload}".encode("ascii")
+
+        return f"{header}.{payload}.{_b64encode(self._sign(signing_input, private_key, algorithm))}"
+
+    def decode(self, token: str, public_key, algorithm: str) -> dict:
+        self._header(algorithm)
+
+        try:
+            header_segment, payload_segment, signature_segment = token.split(".")
+            # UnicodeEncodeError is a ValueError too, for forged non-ASCII tokens
+            signing_input = f"{header_segment}.{payload_segment}".encode("ascii")
+            header = json.loads(_b64decode(header_segment))
+            signature = _b64decode(signature_segment)
+        except ValueError:
+            raise JWTError("Invalid token format!")
+
+        if not isinstance(header, dict) or header.get("alg") != algorithm:
+            raise JWTError("The specified alg value is not allowed")
+
+        self._verify(signing_input, signature, public_key, algorithm)
+
+        try:
+            claims = json.loads(_b64decode(payload_segment))
+        except ValueError:
+            raise JWTError("Invalid payload string!")
+        if not isinstance(claims, dict):
+            raise JWTError("Invalid payload string: must be a json object")
+
+        self._validate_claims(claims)
+        return claims
+
+    def _header(self, algorithm: str) -> str:
+        header = self._headers.get(algorithm)
+        if header is None:
+            raise JWTError(f"Algorithm {algorithm} isn't supported by the {self.name} JWT backend!")
+        return header
+
+    def _sign(self, signing_input: bytes, private_key, algorithm: str) -> bytes:
+        if algorithm == "EdDSA":
+            if not isinstance(private_key, ed25519.Ed25519PrivateKey):
+                raise JWTError("EdDSA needs an Ed25519 private key!")
+            return private_key.sign(signing_input)
+
+        curve, hash_alg, size = self.EC_ALGORITHMS[algorithm]
+        if not isinstance(private_key, ec.EllipticCurvePrivateKey) or not isinstance(private_key.curve, curve):
+            raise JWTError(f"{algorithm} needs an EC private key on curve {curve.name}!")
+
+        # JWS uses the raw r || s signature instead of DER
+        r, s = decode_dss_signature(private_key.sign(signing_input, ec.ECDSA(hash_alg())))
+        return r.to_bytes(size, "big") + s.to_bytes(size, "big")
+
+    def _verify(self, signing_input: bytes, signature: bytes, public_key, algorithm: str):
+        try:
+            if algorithm == "EdDSA":
+                if not isinstance(public_key, ed25519.Ed25519PublicKey):
+                    raise JWTError("EdDSA needs an Ed25519 public key!")
+                public_key.verify(signature, signing_input)
+                return
+
+            curve, hash_alg, size = self.EC_ALGORITHMS[algorithm]
+            if not isinstance(public_key, ec.EllipticCurvePublicKey) or not isinstance(public_key.curve, curve):
+                raise JWTError(f"{algorithm} needs an EC public key on curve {curve.name}!")
+            if len(signature) != 2 * size:
+                raise JWTError("Signature verification failed.")
+
+            der_signature = encode_dss_signature(
+                int.from_bytes(signature[:size], "big"),
+                int.from_bytes(signature[size:], "big"),
+            )
+            public_key.verify(der_signature, signing_input, ec.ECDSA(hash_alg()))
+        except InvalidSignature:
+            raise JWTError("Signature verification failed.")
+
+    @staticmethod
+    def _numeric_dates(claims: dict) -> dict:
+        """Turn datetime exp/iat/nbf claims into NumericDate, like jose does."""
+        converted = dict(claims)
+        for claim in ("exp", "iat", "nbf"):
+            value = converted.get(claim)
+            if isinstance(value, datetime):
+                converted[claim] = timegm(value.utctimetuple())
+        return converted
+
+    @staticmethod
+    def _validate_claims(claims: dict):
+        now = int(time())
+
+        for claim in ("exp", "nbf", "iat"):
+            if claim in claims:
+                try:
+                    int(claims[claim])
+                except (TypeError, ValueError):
+                    raise JWTClaimsError(f"Claim {claim} must be an integer.")
+
+        if "nbf" in claims and int(claims["nbf"]) > now:
+            raise JWTClaimsError("The token is not yet valid (nbf)")
+        if "exp" in claims and int(claims["exp"]) < now:
+            raise ExpiredSignatureError("Signature has expired.")
+
+
+BACKENDS: dict[str, type] = {
+    JoseBackend.name: JoseBackend,
+    CryptographyBackend.name: CryptographyBackend,
+}
+
+def get_backend(name: str) -> JWTBackend:
+    """Build the JWT backend registered under name."""
+    try:
+        return BACKENDS[name]()
+    except KeyError:
+        raise ValueError(f"Unknown JWT backend {name}! Available: {', '.join(BACKENDS)}")
@@ -0,0 +1,277 @@
+"""
+Lightweight in-process metrics, exposed in Prometheus text format.
+"""
+from bisect import bisect_left
+from contextlib import nullcontext
+from time import perf_counter
+from typing import Callable
+import threading
+
+from app.env import METRICS_ENABLED
+
+
+# Checked at call time so metrics can be switched on in tests
+metrics_enabled = METRICS_ENABLED
+
+
+# Upper bounds in seconds, tuned for auth work: sub-millisecond token checks up to slow password hashes
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+class Histogram:
+    """
+    Cumulative histogram of observed values (Prometheus semantics).  
+    `observe` is O(log buckets) and thread-safe.
+    """
+
+    kind = "histogram"
+
+    def __init__(
+        self, 
+        name: str, 
+        description: str, 
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS, 
+        labels: dict[str, str] | None = None, 
+    ):
+        self.name = name
+        self.description = description
+        self.labels = labels or {}
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    @property
+    def count(self) -> int:
+        return sum(self._counts)
+
+    @property
+    def sum(self) -> float:
+        return self._sum
+
+    def snapshot(self) -> dict:
+        """Count, sum and cumulative count per bucket upper bound ("+Inf" included)."""
+        with self._lock:
+            counts = list(self._counts)
+            total = self._sum
+
+        cumulative = {}
+        running = 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            running += count
+            cumulative["+Inf" if bound == float("inf") else bound] = running
+
+        return {"count": running, "sum": total, "buckets": cumulative}
+
+    def render_samples(self) -> list[str]:
+        snapshot = self.snapshot()
+        lines = [
+            f"{self.name}_bucket{_format_labels({**self.labels, 'le': str(bound)})} {count}"
+            for bound, count in snapshot["buckets"].items()
+        ]
+        lines.append(f"{self.name}_sum{_format_labels(self.labels)} {snapshot['sum']}")
+        lines.append(f"{self.name}_count{_format_labels(self.labels)} {snapshot['count']}")
+        return lines
+
+
+class HistogramFamily:
+    """Histograms sharing a name, one child per set of label values."""
+
+    kind = "histogram"
+
+    def __init__(
+        self, 
+        name: str, 
+        description: str, 
+        labelnames: tuple[str, ...], 
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS, 
+    ):
+        self.name = name
+        self.description = description
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self._children: dict[tuple[str, ...], Histogram] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values: str) -> Histogram:
+        child = self._children.get(values)
+        if child is not None:
+            return child
+
+        with self._lock:
+            child = self._children.get(values)
+            if child is None:
+                child = Histogram(
+                    self.name, 
+                    self.description, 
+                    self.buckets, 
+                    dict(zip(self.labelnames, values)), 
+                )
+                self._children[values] = child
+            return child
+
+    def render_samples(self) -> list[str]:
+        lines = []
+        for child in list(self._children.values()):
+            lines.extend(child.render_samples())
+        return lines
+
+
+class Gauge:
+    """Value read from a callback at scrape time. The callback may return {label values: value}."""
+
+    kind = "gauge"
+
+    def __init__(
+        self, 
+        name: str, 
+        description: str, 
+        read: Callable[[], float | dict[tuple[str, ...], float]], 
+        labelnames: tuple[str, ...] = (), 
+    ):
+        self.name = name
+        self.description = description
+        self.read = read
+        self.labelnames = labelnames
+
+    def render_samples(self) -> list[str]:
+        value = self.read()
+        if not isinstance(value, dict):
+            return [f"{self.name} {value}"]
+
+        return [
+            f"{self.name}{_format_labels(dict(zip(self.labelnames, labels)))} {sample}"
+            for labels, sample in value.items()
+        ]
+
+
+class Counter(Gauge):
+    """Gauge of a value that only goes up (events since the process started), exported as `<name>_total`."""
+
+    kind = "counter"
+
+    def __init__(
+        self, 
+        name: str, 
+        description: str, 
+        read: Callable[[], float | dict[tuple[str, ...], float]], 
+        labelnames: tuple[str, ...] = (), 
+    ):
+        super().__init__(f"{name}_total", description, read, labelnames)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(labels: dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+class MetricsRegistry:
+    """Set of metrics rendered together by `render`."""
+
+    def __init__(self):
+        self._metrics: dict[str, Histogram | HistogramFamily | Gauge | Counter] = {}
+
+    def register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def histogram(self, name: str, description: str, labelnames: tuple[str, ...] = (), buckets=DEFAULT_BUCKETS):
+        if labelnames:
+            return self.register(HistogramFamily(name, description, labelnames, buckets))
+        return self.register(Histogram(name, description, buckets))
+
+    def gauge(self, name: str, description: str, read, labelnames: tuple[str, ...] = ()) -> Gauge:
+        return self.register(Gauge(name, description, read, labelnames))
+
+    def counter(self, name: str, description: str, read, labelnames: tuple[str, ...] = ()) -> Counter:
+        return self.register(Counter(name, description, read, labelnames))
+
+    def render(self) -> str:
+        """Every metric in Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.append(f"# HELP {metric.name} {metric.description}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render_samples())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+request_seconds = registry.histogram(
+    "http_request_duration_seconds", 
+    "Time spent handling HTTP requests.", 
+    ("method", "route", "status"), 
+)
+stage_seconds = registry.histogram(
+    "auth_stage_seconds", 
+    "Time spent in each stage of auth requests.", 
+    ("stage",), 
+)
+
+
+class _StageTimer:
+    __slots__ = ("histogram", "started")
+
+    def __init__(self, histogram: Histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.started = perf_counter()
+        return self
+
+    def __exit__(self, *_):
+        self.histogram.observe(perf_counter() - self.started)
+        return False
+
+
+_noop_timer = nullcontext()
+
+def stage(name: str):
+    """
+    Context manager timing a stage of a request into `auth_stage_seconds{stage=name}`.  
+    Returns a shared no-op context manager when metrics are disabled.
+    """
+    if not metrics_enabled:
+        return _noop_timer
+    return _StageTimer(stage_seconds.labels(name))
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording per-route latency into `http_request_duration_seconds`.  
+    Routes are labelled by their path template so label cardinality stays bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status = "500"
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+            await send(message)
+
+        started = perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            route_path = getattr(route, "path", None) or "unmatched"
+            request_seconds.labels(scope["method"], route_path, status).observe(perf_counter() - started)
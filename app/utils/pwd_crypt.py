@@ -1,13 +1,285 @@
 """
 Password cryptography.
 """
-from passlib.context import CryptContext
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Callable, TYPE_CHECKING
+from math import floor, log2
+from secrets import token_urlsafe
+from time import perf_counter
+import asyncio
+import threading
 
-from app.env import PASSWD_HASH_ALGO
+from app.env import (
+    PASSWD_HASH_ALGO, 
+    PASSWD_HASH_LEGACY_SCHEMES, 
+    PASSWD_ARGON2_TIME_COST, 
+    PASSWD_ARGON2_MEMORY_KIB, 
+    PASSWD_ARGON2_PARALLELISM, 
+    PASSWD_SCRYPT_LOG2_N, 
+    PASSWD_SCRYPT_BLOCK_SIZE, 
+    PASSWD_SCRYPT_PARALLELISM, 
+    PASSWD_HASH_POOL_SIZE, 
+    PASSWD_HASH_MAX_PENDING, 
+    PASSWD_HASH_ROUNDS, 
+    PASSWD_HASH_TARGET_MS, 
+)
 
+# passlib and the hash backends load on first use, see HashingPool.warm_up
+if TYPE_CHECKING:
+    from passlib.context import CryptContext
 
-def get_pwd_context(hash_algo: str = PASSWD_HASH_ALGO):
-    return CryptContext([hash_algo], deprecated="auto")
+# Scheme -> (lowest, highest) cost the calibration may pick. bcrypt cost is log2 rounds.
+CALIBRATION_BOUNDS = {"bcrypt": (10, 16)}
+# Cheap cost timed by the calibration, then extrapolated
+CALIBRATION_PROBE_ROUNDS = 8
 
 
+def scheme_settings(hash_algo: str) -> dict:
+    """Cost settings of hash_algo from the environment, as passlib handler settings."""
+    if hash_algo == "argon2":
+        return {
+            "type": "ID", 
+            "rounds": PASSWD_ARGON2_TIME_COST, 
+            "memory_cost": PASSWD_ARGON2_MEMORY_KIB, 
+            "parallelism": PASSWD_ARGON2_PARALLELISM, 
+        }
+    if hash_algo == "scrypt":
+        return {
+            "rounds": PASSWD_SCRYPT_LOG2_N, 
+            "block_size": PASSWD_SCRYPT_BLOCK_SIZE, 
+            "parallelism": PASSWD_SCRYPT_PARALLELISM, 
+        }
+    return {}
 
+
+def get_pwd_context(
+    hash_algo: str = PASSWD_HASH_ALGO, 
+    rounds: int | None = None, 
+    legacy_schemes: list[str] = PASSWD_HASH_LEGACY_SCHEMES, 
+    settings: dict | None = None, 
+) -> "CryptContext":
+    """
+    Build the CryptContext hashing with hash_algo.  
+    `settings` defaults to `scheme_settings(hash_algo)`, `rounds` overrides its cost. Hashes made with 
+    another cost or parameters, or with one of `legacy_schemes`, still verify but are flagged by 
+    `needs_update`/`verify_and_update`, so they get re-hashed on the next successful login.
+    """
+    from passlib.context import CryptContext
+
+    settings = dict(scheme_settings(hash_algo) if settings is None else settings)
+    if rounds is not None:
+        settings["rounds"] = rounds
+
+    options = {f"{hash_algo}__{key}": value for key, value in settings.items() if key != "rounds"}
+    if "rounds" in settings:
+        for key in ("default_rounds", "min_rounds", "max_rounds"):
+            options[f"{hash_algo}__{key}"] = settings["rounds"]
+
+    schemes = [hash_algo, *(scheme for scheme in legacy_schemes if scheme != hash_algo)]
+    context = CryptContext(schemes, default=hash_algo, deprecated="auto", **options)
+
+    # Fail at startup, not on the first login, when the backend (e.g. argon2-cffi) is missing
+    handler = context.handler(hash_algo)
+    if hasattr(handler, "get_backend"):
+        handler.get_backend()
+    return context
+
+
+def _time_hash(hash_algo: str, rounds: int, samples: int) -> float:
+    """Best of `samples` hash timings at the given cost, in milliseconds."""
+    from passlib.context import CryptContext
+
+    handler = CryptContext([hash_algo]).handler(hash_algo).using(rounds=rounds)
+    timings = []
+
+    for _ in range(samples):
+        started = perf_counter()
+        handler.hash("calibration-password")
+        timings.append(perf_counter() - started)
+
+    return min(timings) * 1000
+
+
+def calibrate_rounds(hash_algo: str = PASSWD_HASH_ALGO, target_ms: float = PASSWD_HASH_TARGET_MS, samples: int = 3) -> int:
+    """
+    Pick the highest cost whose hash (and so verify) takes at most `target_ms` on this host.  
+    Times a cheap cost and extrapolates, since every extra bcrypt round doubles the work. 
+    The result is clamped to CALIBRATION_BOUNDS.
+    """
+    if hash_algo not in CALIBRATION_BOUNDS:
+        raise ValueError(f"Can't calibrate the cost of {hash_algo}, set PASSWD_HASH_ROUNDS instead!")
+
+    lowest, highest = CALIBRATION_BOUNDS[hash_algo]
+    elapsed_ms = _time_hash(hash_algo, CALIBRATION_PROBE_ROUNDS, samples)
+    rounds = CALIBRATION_PROBE_ROUNDS + floor(log2(target_ms / elapsed_ms))
+
+    return max(lowest, min(highest, rounds))
+
+
+def resolve_rounds(
+    hash_algo: str = PASSWD_HASH_ALGO, 
+    rounds: int = PASSWD_HASH_ROUNDS, 
+    target_ms: float = PASSWD_HASH_TARGET_MS, 
+) -> int | None:
+    """Cost to hash with: PASSWD_HASH_ROUNDS, else calibrated to PASSWD_HASH_TARGET_MS, else None (library default)."""
+    if rounds > 0:
+        return rounds
+    if target_ms > 0:
+        return calibrate_rounds(hash_algo, target_ms)
+    return None
+
+
+def build_pwd_context() -> "CryptContext":
+    """CryptContext of the environment settings, calibrating the cost if asked to."""
+    return get_pwd_context(rounds=resolve_rounds())
+
+
+class HashingPoolSaturated(Exception):
+    """Raised when the hashing pool already has `max_pending` jobs queued or running."""
+
+
+class HashingPool:
+    """
+    Dedicated, bounded executor for password hashing.  
+    Keeps CPU-heavy hashing off FastAPI's shared threadpool. The bcrypt backend releases the GIL 
+    while hashing, so a thread pool scales across cores. Jobs over `max_pending` are rejected 
+    right away with HashingPoolSaturated instead of queueing up, so callers can answer 503 fast.  
+    Give either a `context` or a `context_factory`, called on a pool thread the first time it's needed.
+    """
+
+    def __init__(
+        self, 
+        context: "CryptContext | None" = None, 
+        max_workers: int = PASSWD_HASH_POOL_SIZE, 
+        max_pending: int = PASSWD_HASH_MAX_PENDING, 
+        context_factory: Callable[[], "CryptContext"] | None = None, 
+    ):
+        if context is None and context_factory is None:
+            raise ValueError("HashingPool needs a context or a context_factory!")
+
+        self._context = context
+        self._context_factory = context_factory
+        self._context_lock = threading.Lock()
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._executor: ThreadPoolExecutor | None = None
+        self._dummy_hash: str | None = None
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    @property
+    def context(self) -> "CryptContext":
+        """The CryptContext, built by `context_factory` on first access."""
+        if self._context is None:
+            with self._context_lock:
+                if self._context is None:
+                    self._context = self._context_factory()
+        return self._context
+
+    @property
+    def pending(self) -> int:
+        """Number of jobs queued or running."""
+        return self._pending
+
+    def hash(self, password: str) -> str:
+        """Hash password on the pool, blocking the calling thread until done."""
+        return self._submit(self._call, "hash", password).result()
+
+    def verify(self, password: str, hashed_password: str) -> bool:
+        """Verify password on the pool, blocking the calling thread until done."""
+        return self._submit(self._call, "verify", password, hashed_password).result()
+
+    def verify_and_update(self, password: str, hashed_password: str) -> tuple[bool, str | None]:
+        """
+        Verify password on the pool, blocking the calling thread until done.  
+        Also return a new hash when hashed_password doesn't use the current scheme/cost, None otherwise.
+        """
+        return self._submit(self._call, "verify_and_update", password, hashed_password).result()
+
+    def dummy_verify(self, password: str) -> bool:
+        """
+        Verify password against a hash of a random password, blocking the calling thread until done.  
+        Costs as much as a real verify, so unknown usernames can't be told apart by latency. Always False.
+        """
+        return self._submit(self._dummy_verify, password).result()
+
+    def warm_up(self) -> Future:
+        """
+        Build the context and precompute the dummy hash on the pool, off the request path.  
+        Afterwards the first login costs a single verify, whether the username exists or not.
+        """
+        return self._submit(self._get_dummy_hash)
+
+    async def hash_async(self, password: str) -> str:
+        """Hash password on the pool without blocking the event loop."""
+        return await asyncio.wrap_future(self._submit(self._call, "hash", password))
+
+    async def verify_async(self, password: str, hashed_password: str) -> bool:
+        """Verify password on the pool without blocking the event loop."""
+        return await asyncio.wrap_future(
+            self._submit(self._call, "verify", password, hashed_password)
+        )
+
+    async def verify_and_update_async(self, password: str, hashed_password: str) -> tuple[bool, str | None]:
+        """Async version of `verify_and_update`."""
+        return await asyncio.wrap_future(
+            self._submit(self._call, "verify_and_update", password, hashed_password)
+        )
+
+    async def dummy_verify_async(self, password: str) -> bool:
+        """Async version of `dummy_verify`."""
+        return await asyncio.wrap_future(self._submit(self._dummy_verify, password))
+
+    def shutdown(self, wait: bool = True):
+        """Stop pool workers. A new executor is started on next submit."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+
+        if executor is not None:
+            executor.shutdown(wait=wait)
+
+    def _call(self, method: str, *args):
+        # Resolves the context on the pool thread, so building it never blocks the event loop
+        return getattr(self.context, method)(*args)
+
+    def _get_dummy_hash(self) -> str:
+        # Concurrent first calls may both hash, either result works
+        if self._dummy_hash is None:
+            self._dummy_hash = self.context.hash(token_urlsafe(16))
+        return self._dummy_hash
+
+    def _dummy_verify(self, password: str) -> bool:
+        self.context.verify(password, self._get_dummy_hash())
+        return False
+
+    def _submit(self, fn, *args) -> Future:
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise HashingPoolSaturated(
+                    f"Hashing pool is saturated ({self._pending} pending jobs)!"
+                )
+            self._pending += 1
+
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers, 
+                    thread_name_prefix="pwd-hash", 
+                )
+            executor = self._executor
+
+        try:
+            future = executor.submit(fn, *args)
+        except Exception:
+            self._release()
+            raise
+
+        future.add_done_callback(self._release)
+        return future
+
+    def _release(self, _: Future | None = None):
+        with self._lock:
+            self._pending -= 1
+
+
+# Shared by every request of the process. The context (and cost calibration) is built on first use.
+hashing_pool = HashingPool(context_factory=build_pwd_context)
@@ -0,0 +1,219 @@
+"""
+Sliding-window rate limiting.
+"""
+from collections import OrderedDict
+from math import ceil
+from time import time
+from typing import Protocol
+import threading
+
+from app.utils.cache import KVClient, LocalKVStore, delete_prefix
+from app.env import (
+    RATE_LIMIT_BACKEND, 
+    RATE_LIMIT_MAX_KEYS, 
+    LOGIN_RATE_LIMIT_PER_USERNAME, 
+    LOGIN_RATE_LIMIT_PER_IP, 
+    LOGIN_RATE_LIMIT_WINDOW_SECONDS, 
+)
+
+
+class RateLimitExceeded(Exception):
+    """Raised when a key already used up its limit. `retry_after` tells how many seconds to wait."""
+
+    def __init__(self, key: str, retry_after: int):
+        super().__init__(f"Rate limit exceeded for {key}, retry after {retry_after}s!")
+        self.key = key
+        self.retry_after = retry_after
+
+
+class RateLimitStore(Protocol):
+    """Hit counters per key and fixed window, so limiters can share counters across workers."""
+
+    def counts(self, key: str, window: int) -> tuple[int, int]:
+        """Hits of key in the previous and the given window."""
+        ...
+
+    def increment(self, key: str, window: int, ttl: float): ...
+
+    def clear(self): ...
+
+
+class MemoryRateLimitStore:
+    """
+    Per-process counters, two per key (previous and current window).  
+    Memory stays bounded: once `max_keys` keys are tracked, the least recently hit one is evicted.
+    """
+
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.max_keys = max_keys
+        self.evictions = 0
+        # key -> [window, previous window hits, window hits]
+        self._data: OrderedDict[str, list[int]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def counts(self, key: str, window: int) -> tuple[int, int]:
+        with self._lock:
+            entry = self._data.get(key)
+
+        if entry is None:
+            return 0, 0
+
+        stored_window, previous, current = entry
+        if stored_window == window:
+            return previous, current
+        if stored_window == window - 1:
+            return current, 0
+        return 0, 0
+
+    def increment(self, key: str, window: int, ttl: float):
+        with self._lock:
+            entry = self._data.get(key)
+
+            if entry is None:
+                self._data[key] = [window, 0, 1]
+                if len(self._data) > self.max_keys:
+                    self._data.popitem(last=False)
+                    self.evictions += 1
+                return
+
+            self._data.move_to_end(key)
+            stored_window, _, current = entry
+            if stored_window == window:
+                entry[2] += 1
+            else:
+                entry[:] = [window, current if stored_window == window - 1 else 0, 1]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class CounterKVClient(KVClient, Protocol):
+    """KVClient plus the counter calls of a redis client, used by KVRateLimitStore."""
+
+    def incr(self, key: str, amount: int = 1) -> int: ...
+
+    def expire(self, key: str, ex: int): ...
+
+
+class KVRateLimitStore:
+    """
+    Counters on a shared key-value store (INCR/EXPIRE), so every worker enforces the same limits.  
+    One key per limited key and window, expired by the store once the next window is over.
+    """
+
+    def __init__(self, client: CounterKVClient, prefix: str = "ratelimit:"):
+        self.client = client
+        self.prefix = prefix
+
+    def counts(self, key: str, window: int) -> tuple[int, int]:
+        previous = self.client.get(self._key(key, window - 1))
+        current = self.client.get(self._key(key, window))
+        return int(previous or 0), int(current or 0)
+
+    def increment(self, key: str, window: int, ttl: float):
+        store_key = self._key(key, window)
+        if self.client.incr(store_key) == 1:
+            self.client.expire(store_key, ceil(ttl))
+
+    def clear(self):
+        delete_prefix(self.client, self.prefix)
+
+    def _key(self, key: str, window: int) -> str:
+        return f"{self.prefix}{key}:{window}"
+
+
+class RateLimiter:
+    """
+    Allows `limit` hits per key over any `window` seconds, approximated with the sliding-window counter:  
+    hits of the current fixed window plus the previous window's, weighted by how much of it still overlaps.
+    Needs two counters per key whatever the limit, unlike a log of every hit.
+    """
+
+    def __init__(self, store: RateLimitStore, limit: int, window: float, name: str = ""):
+        self.store = store
+        self.limit = limit
+        self.window = window
+        self.name = name
+        self.rejected = 0
+
+    def hit(self, key: str, now: float | None = None):
+        """Count a hit for key. Raise RateLimitExceeded, without counting it, when key is over the limit."""
+        now = time() if now is None else now
+        window, offset = divmod(now, self.window)
+        window = int(window)
+        key = f"{self.name}:{key}" if self.name else key
+
+        previous, current = self.store.counts(key, window)
+        elapsed = offset / self.window
+
+        if previous * (1 - elapsed) + current >= self.limit:
+            self.rejected += 1
+            raise RateLimitExceeded(key, self._retry_after(previous, current, elapsed))
+
+        # Counters are read until the end of the next window
+        self.store.increment(key, window, 2 * self.window)
+
+    def _retry_after(self, previous: int, current: int, elapsed: float) -> int:
+        """Seconds until the weighted count drops under the limit, if no more hits come."""
+        if current >= self.limit:
+            # Wait for the next window, until enough of this one slid out
+            wait = (1 - elapsed) + (1 - (self.limit - 1) / current)
+        else:
+            wait = (1 - (self.limit - 1 - current) / previous) - elapsed
+        return max(1, ceil(wait * self.window))
+
+
+def build_rate_limit_store(kind: str = RATE_LIMIT_BACKEND) -> RateLimitStore | None:
+    """Store of RATE_LIMIT_BACKEND, None for "off". Point a "kv" store's `client` at e.g. redis to share the counters."""
+    if kind == "memory":
+        return MemoryRateLimitStore()
+    if kind == "kv":
+        return KVRateLimitStore(LocalKVStore())
+    if kind == "off":
+        return None
+
+    raise ValueError(f"Unknown rate limit backend {kind}!")
+
+
+class LoginRateLimiter:
+    """
+    Throttles login attempts per client IP and per username, checked before any DB or hashing work.  
+    Per IP stops one client spraying many usernames, per username stops a botnet focusing one account.
+    A limit of 0, or a None store, disables that check.
+    """
+
+    def __init__(
+        self, 
+        store: RateLimitStore | None, 
+        per_username: int = LOGIN_RATE_LIMIT_PER_USERNAME, 
+        per_ip: int = LOGIN_RATE_LIMIT_PER_IP, 
+        window: float = LOGIN_RATE_LIMIT_WINDOW_SECONDS, 
+    ):
+        self.store = store
+        enabled = store is not None
+        self.by_ip = RateLimiter(store, per_ip, window, "login:ip") if enabled and per_ip else None
+        self.by_username = RateLimiter(store, per_username, window, "login:user") if enabled and per_username else None
+
+    def hit(self, username: str, ip: str):
+        """Count a login attempt. Raise RateLimitExceeded if the IP or the username is over its limit."""
+        # IP first, so a throttled client doesn't use up the username's budget
+        if self.by_ip is not None:
+            self.by_ip.hit(ip)
+        if self.by_username is not None:
+            self.by_username.hit(username)
+
+    def rejected(self) -> dict[str, int]:
+        """Rejected attempts per limiter."""
+        limiters = {"ip": self.by_ip, "username": self.by_username}
+        return {name: limiter.rejected for name, limiter in limiters.items() if limiter is not None}
+
+    def clear(self):
+        if self.store is not None:
+            self.store.clear()
+
+
+login_rate_limiter = LoginRateLimiter(build_rate_limit_store())
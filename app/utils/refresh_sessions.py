@@ -0,0 +1,385 @@
+"""
+Server-side refresh token sessions: rotation, reuse detection and revocation.
+
+Every login starts a session family. Its refresh token carries a `jti` (unique per token) and a `fam`
+claim, and the store keeps the one live token of each family. A refresh swaps the live token for a
+new one, so a token can be used once: presenting a rotated token again means it leaked, and the
+whole family is revoked. Logout revokes the family of the presented token.
+"""
+from math import ceil
+from time import time
+from typing import NamedTuple, Protocol
+from uuid import uuid4
+import asyncio
+import heapq
+import json
+import threading
+
+from sqlmodel import select, delete
+
+from app.db import async_session_scope
+from app.models.refresh_token import RefreshToken
+from app.utils.cache import KVClient, LocalKVStore, delete_prefix
+from app.env import (
+    JWT_REFRESH_EXPIRES_MINUTES, 
+    REFRESH_STORE_BACKEND, 
+    REFRESH_STORE_SWEEP_BATCH, 
+)
+
+
+class RefreshTokenRejected(Exception):
+    """Raised for a refresh token without a live session: expired, revoked, or issued before sessions existed."""
+
+
+class RefreshTokenReused(RefreshTokenRejected):
+    """Raised when an already rotated refresh token is presented again. Its family is revoked."""
+
+
+class RefreshSession(NamedTuple):
+    jti: str
+    family: str
+    user_id: str
+    # Unix time, like the token's exp claim
+    expires_at: float
+
+    def claims(self) -> dict:
+        """Claims to embed in the refresh token."""
+        return {"jti": self.jti, "fam": self.family}
+
+
+class RefreshSessionStore(Protocol):
+    """
+    Live refresh token of every session family, indexed by jti and by family.  
+    Every call costs the same however many sessions are stored, expired ones are dropped by `sweep`.
+    """
+
+    async def get(self, jti: str) -> RefreshSession | None:
+        """Live, unexpired session of the token with this jti."""
+        ...
+
+    async def has_family(self, family: str) -> bool: ...
+
+    async def add(self, session: RefreshSession): ...
+
+    async def replace(self, old_jti: str, session: RefreshSession) -> bool:
+        """Atomically make session the live token of its family, if old_jti still is. Return whether it was."""
+        ...
+
+    async def revoke(self, family: str) -> bool:
+        """Drop the live token of a family. Return whether there was one."""
+        ...
+
+    async def sweep(self, now: float, limit: int) -> int:
+        """Drop up to `limit` expired entries. Return how many were dropped."""
+        ...
+
+    async def clear(self): ...
+
+
+class MemoryRefreshSessionStore:
+    """
+    Per-process sessions: two dicts (jti -> session, family -> live jti) and a heap of expiry times.  
+    The heap lets a sweep touch only expired entries. Only for a single worker, others wouldn't know its tokens.
+    """
+
+    def __init__(self):
+        self._sessions: dict[str, RefreshSession] = {}
+        self._families: dict[str, str] = {}
+        # (expires_at, jti), entries of rotated or revoked tokens stay until they're due
+        self._expiries: list[tuple[float, str]] = []
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    async def get(self, jti: str) -> RefreshSession | None:
+        session = self._sessions.get(jti)
+        if session is None or session.expires_at <= time():
+            return None
+        return session
+
+    async def has_family(self, family: str) -> bool:
+        with self._lock:
+            jti = self._families.get(family)
+            return jti is not None and self._sessions[jti].expires_at > time()
+
+    async def add(self, session: RefreshSession):
+        with self._lock:
+            self._put(session)
+
+    async def replace(self, old_jti: str, session: RefreshSession) -> bool:
+        with self._lock:
+            if self._families.get(session.family) != old_jti:
+                return False
+
+            del self._sessions[old_jti]
+            self._put(session)
+            return True
+
+    async def revoke(self, family: str) -> bool:
+        with self._lock:
+            jti = self._families.pop(family, None)
+            if jti is None:
+                return False
+
+            del self._sessions[jti]
+            return True
+
+    async def sweep(self, now: float, limit: int) -> int:
+        dropped = 0
+        with self._lock:
+            while self._expiries and self._expiries[0][0] <= now and dropped < limit:
+                _, jti = heapq.heappop(self._expiries)
+                dropped += 1
+
+                session = self._sessions.get(jti)
+                # Rotated and revoked tokens are gone already, only their heap entry was left
+                if session is not None and session.expires_at <= now:
+                    del self._sessions[jti]
+                    del self._families[session.family]
+        return dropped
+
+    async def clear(self):
+        with self._lock:
+            self._sessions.clear()
+            self._families.clear()
+            self._expiries.clear()
+
+    def _put(self, session: RefreshSession):
+        self._sessions[session.jti] = session
+        self._families[session.family] = session.jti
+        heapq.heappush(self._expiries, (session.expires_at, session.jti))
+
+
+class SQLRefreshSessionStore:
+    """
+    Sessions in the refresh_token table, shared by every worker.  
+    Lookups go through the jti primary key and the unique family index, sweeps through the expires_at index.
+    Runs on the primary: a token rotated a moment ago must be seen by the next refresh.
+    """
+
+    async def get(self, jti: str) -> RefreshSession | None:
+        async with async_session_scope() as session:
+            statement = select(RefreshToken).where(RefreshToken.jti == jti, RefreshToken.expires_at > time())
+            row = (await session.exec(statement)).first()
+
+        if row is None:
+            return None
+        return RefreshSession(row.jti, row.family, row.user_id, row.expires_at)
+
+    async def has_family(self, family: str) -> bool:
+        async with async_session_scope() as session:
+            statement = select(RefreshToken.jti).where(RefreshToken.family == family, RefreshToken.expires_at > time())
+            return (await session.exec(statement)).first() is not None
+
+    async def add(self, session: RefreshSession):
+        async with async_session_scope() as db_session:
+            db_session.add(RefreshToken(**session._asdict()))
+            await db_session.commit()
+
+    async def replace(self, old_jti: str, session: RefreshSession) -> bool:
+        async with async_session_scope() as db_session:
+            # Of concurrent refreshes with the same token, only one deletes its row
+            statement = delete(RefreshToken).where(RefreshToken.jti == old_jti, RefreshToken.family == session.family)
+            result = await db_session.exec(statement)
+            if result.rowcount != 1:
+                await db_session.rollback()
+                return False
+
+            db_session.add(RefreshToken(**session._asdict()))
+            await db_session.commit()
+            return True
+
+    async def revoke(self, family: str) -> bool:
+        async with async_session_scope() as session:
+            result = await session.exec(delete(RefreshToken).where(RefreshToken.family == family))
+            await session.commit()
+            return result.rowcount > 0
+
+    async def sweep(self, now: float, limit: int) -> int:
+        async with async_session_scope() as session:
+            expired = select(RefreshToken.jti).where(RefreshToken.expires_at <= now).limit(limit)
+            result = await session.exec(delete(RefreshToken).where(RefreshToken.jti.in_(expired)))
+            await session.commit()
+            return result.rowcount
+
+    async def clear(self):
+        async with async_session_scope() as session:
+            await session.exec(delete(RefreshToken))
+            await session.commit()
+
+
+class KVRefreshSessionStore:
+    """
+    Sessions on a shared key-value store, expired by the store itself, so `sweep` has nothing to do.  
+    Keys are `{prefix}jti:{jti}` (the session as JSON) and `{prefix}fam:{family}` (the live jti).
+    `replace` is a check-then-set: on a real store run it atomically (e.g. a Lua script or WATCH/MULTI on redis).
+    """
+
+    def __init__(self, client: KVClient, prefix: str = "refresh:"):
+        self.client = client
+        self.prefix = prefix
+        self._lock = threading.Lock()
+
+    async def get(self, jti: str) -> RefreshSession | None:
+        raw = self.client.get(self._jti_key(jti))
+        if raw is None:
+            return None
+
+        session = RefreshSession(jti, *json.loads(raw))
+        return session if session.expires_at > time() else None
+
+    async def has_family(self, family: str) -> bool:
+        return self.client.get(self._family_key(family)) is not None
+
+    async def add(self, session: RefreshSession):
+        self._put(session)
+
+    async def replace(self, old_jti: str, session: RefreshSession) -> bool:
+        with self._lock:
+            current = self.client.get(self._family_key(session.family))
+            if current is None or self._decode(current) != old_jti:
+                return False
+
+            self._put(session)
+            self.client.delete(self._jti_key(old_jti))
+            return True
+
+    async def revoke(self, family: str) -> bool:
+        jti = self.client.get(self._family_key(family))
+        if jti is None:
+            return False
+
+        self.client.delete(self._family_key(family), self._jti_key(self._decode(jti)))
+        return True
+
+    async def sweep(self, now: float, limit: int) -> int:
+        return 0
+
+    async def clear(self):
+        delete_prefix(self.client, self.prefix)
+
+    def _put(self, session: RefreshSession):
+        ex = max(1, ceil(session.expires_at - time()))
+        value = json.dumps([session.family, session.user_id, session.expires_at])
+        self.client.set(self._jti_key(session.jti), value, ex=ex)
+        self.client.set(self._family_key(session.family), session.jti, ex=ex)
+
+    def _jti_key(self, jti: str) -> str:
+        return f"{self.prefix}jti:{jti}"
+
+    def _family_key(self, family: str) -> str:
+        return f"{self.prefix}fam:{family}"
+
+    @staticmethod
+    def _decode(value: bytes | str) -> str:
+        return value.decode() if isinstance(value, bytes) else value
+
+
+def build_refresh_session_store(kind: str = REFRESH_STORE_BACKEND) -> RefreshSessionStore | None:
+    """Store of REFRESH_STORE_BACKEND, None for "off", which leaves refresh tokens stateless."""
+    if kind == "sql":
+        return SQLRefreshSessionStore()
+    if kind == "memory":
+        return MemoryRefreshSessionStore()
+    if kind == "kv":
+        return KVRefreshSessionStore(LocalKVStore())
+    if kind == "off":
+        return None
+
+    raise ValueError(f"Unknown refresh store backend {kind}!")
+
+
+class RefreshSessions:
+    """
+    Starts, rotates and revokes refresh token sessions on a store.  
+    A None store disables them: refresh tokens are then only checked by signature, expiry and token version.
+    """
+
+    def __init__(self, store: RefreshSessionStore | None, ttl: float = JWT_REFRESH_EXPIRES_MINUTES * 60):
+        self.store = store
+        self.ttl = ttl
+        self.reuses = 0
+        self.sweep_errors = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.store is not None
+
+    async def start(self, user_id: str) -> RefreshSession:
+        """New session family on login, it expires `ttl` seconds from now however often it's rotated."""
+        session = RefreshSession(uuid4().hex, uuid4().hex, user_id, time() + self.ttl)
+        await self.store.add(session)
+        return session
+
+    async def rotate(self, payload: dict) -> RefreshSession:
+        """
+        Swap the refresh token of a validated payload for a new session of the same family.  
+        Raise RefreshTokenReused, revoking the family, if the token was rotated already, or
+        RefreshTokenRejected if its session is gone.
+        """
+        if not payload.get("jti") or not payload.get("fam"):
+            raise RefreshTokenRejected("Refresh token has no session, log in again!")
+
+        session = await self._live_session(payload)
+        if session is None:
+            raise RefreshTokenRejected("Refresh session expired or was revoked, log in again!")
+
+        # Same expiry as the login that started the family, rotating doesn't extend it
+        rotated = RefreshSession(uuid4().hex, session.family, session.user_id, session.expires_at)
+        # Lost to a concurrent refresh with the same token, which is a reuse as well
+        if not await self.store.replace(session.jti, rotated):
+            await self._revoke_reused(session.family)
+
+        return rotated
+
+    async def revoke(self, payload: dict) -> bool:
+        """
+        Revoke the session family of a refresh token payload, on logout. Return False if the session is gone.  
+        Only the family's live token can: a rotated one raises RefreshTokenReused, revoking the family, like on `rotate`.
+        """
+        session = await self._live_session(payload)
+        return session is not None and await self.store.revoke(session.family)
+
+    async def sweep(self, batch_size: int = REFRESH_STORE_SWEEP_BATCH) -> int:
+        """Drop expired sessions in batches of batch_size, yielding to the event loop between them."""
+        total = 0
+        while True:
+            dropped = await self.store.sweep(time(), batch_size)
+            total += dropped
+            if dropped < batch_size:
+                return total
+            await asyncio.sleep(0)
+
+    async def run_sweeps(self, interval: float, batch_size: int = REFRESH_STORE_SWEEP_BATCH):
+        """Run `sweep` every interval seconds, until cancelled."""
+        while True:
+            await asyncio.sleep(interval)
+            # A failed sweep is retried on the next round, expired sessions are rejected meanwhile anyway
+            try:
+                await self.sweep(batch_size)
+            except Exception:
+                self.sweep_errors += 1
+
+    async def _live_session(self, payload: dict) -> RefreshSession | None:
+        """Session of a refresh token payload, None if it's gone. A live family that moved on from the token is a reuse."""
+        jti, family = payload.get("jti"), payload.get("fam")
+        if not jti or not family:
+            return None
+
+        session = await self.store.get(jti)
+        if session is None or session.family != family or session.user_id != payload.get("id"):
+            # A live family that moved on from this token: it was used before
+            if await self.store.has_family(family):
+                await self._revoke_reused(family)
+            return None
+
+        return session
+
+    async def _revoke_reused(self, family: str):
+        self.reuses += 1
+        await self.store.revoke(family)
+        raise RefreshTokenReused("Refresh token was already used, its session is revoked!")
+
+
+refresh_sessions = RefreshSessions(build_refresh_session_store())
@@ -0,0 +1,221 @@
+"""
+Access token revocation: a denylist of `jti`s, each dropped once its token expires anyway.
+
+Every access token carries a unique `jti`. Revoking one stores it with the token's `exp` in a
+persistent store, shared by every worker, and in the in-process denylist `validate_token` checks
+with a single dict lookup. Workers pick up each other's revocations with incremental syncs and
+reload the whole denylist on rebuilds, which also drop expired entries.
+"""
+from time import time, monotonic
+from typing import NamedTuple, Protocol
+import asyncio
+import sys
+import threading
+
+from sqlmodel import select, delete
+
+from app.db import async_session_scope
+from app.models.revoked_token import RevokedToken
+from app.env import REVOCATION_BACKEND
+
+# Syncs re-read revocations this many seconds older than the last one, covering clock skew between
+# workers and transactions committed after a sync ran. Entries read twice are added once.
+SYNC_OVERLAP_SECONDS = 5.0
+# Expired rows deleted per statement on rebuilds
+SWEEP_BATCH = 1000
+
+
+class RevokedEntry(NamedTuple):
+    jti: str
+    # Unix times, like the token's exp claim
+    expires_at: float
+    revoked_at: float
+
+
+class RevocationStore(Protocol):
+    """Persistent denylist, shared by every worker. Read in full on rebuilds and by revocation time on syncs."""
+
+    async def add(self, entry: RevokedEntry): ...
+
+    async def entries(self, now: float, since: float | None = None) -> list[tuple[str, float]]:
+        """(jti, expires_at) of the entries unexpired at `now`, only the ones revoked from `since` on if given."""
+        ...
+
+    async def sweep(self, now: float, limit: int) -> int:
+        """Drop up to `limit` expired entries. Return how many were dropped."""
+        ...
+
+    async def clear(self): ...
+
+
+class MemoryRevocationStore:
+    """Per-process denylist: a dict of entries by jti. Only for a single worker, others wouldn't see it."""
+
+    def __init__(self):
+        self._entries: dict[str, RevokedEntry] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def add(self, entry: RevokedEntry):
+        self._entries[entry.jti] = entry
+
+    async def entries(self, now: float, since: float | None = None) -> list[tuple[str, float]]:
+        return [
+            (entry.jti, entry.expires_at)
+            for entry in self._entries.values()
+            if entry.expires_at > now and (since is None or entry.revoked_at >= since)
+        ]
+
+    async def sweep(self, now: float, limit: int) -> int:
+        expired = [jti for jti, entry in self._entries.items() if entry.expires_at <= now][:limit]
+        for jti in expired:
+            del self._entries[jti]
+        return len(expired)
+
+    async def clear(self):
+        self._entries.clear()
+
+
+class SQLRevocationStore:
+    """
+    Denylist in the revoked_token table.  
+    Syncs read through the revoked_at index and sweeps through the expires_at index. Runs on the primary:
+    a replica lagging behind the sync cursor would make workers skip revocations.
+    """
+
+    async def add(self, entry: RevokedEntry):
+        async with async_session_scope() as session:
+            # Revoking a token twice keeps one row
+            await session.merge(RevokedToken(**entry._asdict()))
+            await session.commit()
+
+    async def entries(self, now: float, since: float | None = None) -> list[tuple[str, float]]:
+        statement = select(RevokedToken.jti, RevokedToken.expires_at).where(RevokedToken.expires_at > now)
+        if since is not None:
+            statement = statement.where(RevokedToken.revoked_at >= since)
+
+        async with async_session_scope() as session:
+            return [tuple(row) for row in (await session.exec(statement)).all()]
+
+    async def sweep(self, now: float, limit: int) -> int:
+        async with async_session_scope() as session:
+            expired = select(RevokedToken.jti).where(RevokedToken.expires_at <= now).limit(limit)
+            result = await session.exec(delete(RevokedToken).where(RevokedToken.jti.in_(expired)))
+            await session.commit()
+            return result.rowcount
+
+    async def clear(self):
+        async with async_session_scope() as session:
+            await session.exec(delete(RevokedToken))
+            await session.commit()
+
+
+def build_revocation_store(kind: str = REVOCATION_BACKEND) -> RevocationStore | None:
+    """Store of REVOCATION_BACKEND, None for "off". No "kv": rebuilds list every entry, which plain key-value stores can't do cheaply."""
+    if kind == "sql":
+        return SQLRevocationStore()
+    if kind == "memory":
+        return MemoryRevocationStore()
+    if kind == "off":
+        return None
+
+    raise ValueError(f"Unknown revocation backend {kind}!")
+
+
+class Denylist:
+    """
+    In-process copy of the revocation store: a dict of jti -> expires_at.  
+    `is_revoked` never does I/O. A None store disables revocation, `is_revoked` is then always False.
+    """
+
+    def __init__(self, store: RevocationStore | None):
+        self.store = store
+        self.rebuilds = 0
+        self.sync_errors = 0
+        self._revoked: dict[str, float] = {}
+        self._synced_at: float | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.store is not None
+
+    def __len__(self) -> int:
+        return len(self._revoked)
+
+    def is_revoked(self, jti: str | None) -> bool:
+        """Whether the token with this jti was revoked and hasn't expired yet. Tokens without jti never are."""
+        if not jti:
+            return False
+
+        expires_at = self._revoked.get(jti)
+        return expires_at is not None and expires_at > time()
+
+    async def revoke(self, jti: str, expires_at: float):
+        """Revoke the token with this jti until expires_at, at once in this process and on the next sync elsewhere."""
+        now = time()
+        # Expired tokens are rejected anyway
+        if expires_at <= now:
+            return
+
+        await self.store.add(RevokedEntry(jti, expires_at, now))
+        with self._lock:
+            self._revoked[jti] = expires_at
+
+    async def sync(self):
+        """Add the entries revoked by other workers since the last sync."""
+        started = time()
+        since = None if self._synced_at is None else self._synced_at - SYNC_OVERLAP_SECONDS
+        entries = await self.store.entries(started, since)
+
+        with self._lock:
+            self._revoked.update(entries)
+        self._synced_at = started
+
+    async def rebuild(self):
+        """Reload every unexpired entry from the store. Expired entries are swept from the store and dropped here."""
+        started = time()
+        while await self.store.sweep(started, SWEEP_BATCH) == SWEEP_BATCH:
+            await asyncio.sleep(0)
+
+        revoked = dict(await self.store.entries(started))
+
+        with self._lock:
+            # Revoked in this process meanwhile
+            for jti, expires_at in self._revoked.items():
+                if expires_at > started and jti not in revoked:
+                    revoked[jti] = expires_at
+            self._revoked = revoked
+
+        self._synced_at = started
+        self.rebuilds += 1
+
+    async def run_syncs(self, interval: float, rebuild_interval: float):
+        """Run `sync` every interval seconds and `rebuild` every rebuild_interval seconds instead, until cancelled."""
+        next_rebuild = monotonic() + rebuild_interval
+        while True:
+            await asyncio.sleep(interval)
+            # A failed round is retried on the next one, the denylist stays as it was meanwhile
+            try:
+                if monotonic() >= next_rebuild:
+                    await self.rebuild()
+                    next_rebuild = monotonic() + rebuild_interval
+                else:
+                    await self.sync()
+            except Exception:
+                self.sync_errors += 1
+
+    def footprint(self) -> int:
+        """Bytes held by the entries (dict, keys and values)."""
+        revoked = self._revoked
+        return sys.getsizeof(revoked) + sum(sys.getsizeof(jti) + sys.getsizeof(exp) for jti, exp in revoked.items())
+
+    def clear(self):
+        """Drop the in-process copy, the store is left as it is."""
+        with self._lock:
+            self._revoked = {}
+            self._synced_at = None
+
+
+denylist = Denylist(build_revocation_store())
@@ -0,0 +1,155 @@
+"""
+Shared benchmark helpers.
+"""
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from statistics import quantiles
+from time import perf_counter
+from typing import Callable, Iterator
+import platform
+import subprocess
+import tempfile
+import json
+import os
+
+
+def percentiles(samples: list[float]) -> dict:
+    """p50/p95/p99 of samples (seconds), in milliseconds."""
+    if len(samples) < 2:
+        value = samples[0] * 1000 if samples else 0.0
+        return {"p50_ms": value, "p95_ms": value, "p99_ms": value}
+
+    cuts = quantiles(samples, n=100, method="inclusive")
+    return {"p50_ms": cuts[49] * 1000, "p95_ms": cuts[94] * 1000, "p99_ms": cuts[98] * 1000}
+
+
+def measure(fn: Callable[[], object], iterations: int, warmup: int = 10) -> dict:
+    """Call fn `iterations` times and report ops/s plus latency percentiles."""
+    for _ in range(warmup):
+        fn()
+
+    samples = []
+    started = perf_counter()
+    for _ in range(iterations):
+        call_started = perf_counter()
+        fn()
+        samples.append(perf_counter() - call_started)
+    elapsed = perf_counter() - started
+
+    return {"iterations": iterations, "ops_per_sec": iterations / elapsed, **percentiles(samples)}
+
+
+def print_table(rows: dict[str, dict]):
+    """Print measure() results, one line per benchmark."""
+    width = max(len(name) for name in rows)
+    print(f"{'benchmark':<{width}}  {'ops/s':>10}  {'p50 ms':>8}  {'p95 ms':>8}  {'p99 ms':>8}")
+    for name, row in rows.items():
+        print(
+            f"{name:<{width}}  {row['ops_per_sec']:>10.0f}  "
+            f"{row['p50_ms']:>8.3f}  {row['p95_ms']:>8.3f}  {row['p99_ms']:>8.3f}"
+        )
+
+
+@contextmanager
+def bench_environment() -> Iterator[str]:
+    """
+    Point the app at a temporary SQLite database and freshly generated EC keys, like JWTTestBase does.  
+    Must be entered before anything under `app` or `main` is imported, since app.env reads the environment once.
+    """
+    from cryptography.hazmat.primitives.asymmetric import ec
+    from cryptography.hazmat.primitives import serialization
+
+    with tempfile.TemporaryDirectory(prefix="auth-bench-") as temp_dir:
+        private_key = ec.generate_private_key(ec.SECP256R1())
+        priv_key_path = os.path.join(temp_dir, "bench_private.pem")
+        pub_key_path = os.path.join(temp_dir, "bench_public.pem")
+
+        with open(priv_key_path, "wb") as f:
+            f.write(private_key.private_bytes(
+                encoding=serialization.Encoding.PEM,
+                format=serialization.PrivateFormat.PKCS8,
+                encryption_algorithm=serialization.NoEncryption()
+            ))
+        with open(pub_key_path, "wb") as f:
+            f.write(private_key.public_key().public_bytes(
+                encoding=serialization.Encoding.PEM,
+                format=serialization.PublicFormat.SubjectPublicKeyInfo
+            ))
+
+        os.environ.update({
+            "DB_HOST": f"sqlite:///{os.path.join(temp_dir, 'bench.sqlite3')}", 
+            "JWT_PRIV_KEY_PATH": priv_key_path, 
+            "JWT_PUB_KEY_PATH": pub_key_path, 
+            "DEBUG": "", 
+            "DB_MIGRATE_ON_STARTUP": "True", 
+            # Every virtual user shares one client IP
+            "RATE_LIMIT_BACKEND": "off", 
+        })
+        yield temp_dir
+
+
+def metadata() -> dict:
+    """Where and on which commit results were taken, stored along them."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = "unknown"
+
+    return {
+        "commit": commit, 
+        "taken_at": datetime.now(timezone.utc).isoformat(), 
+        "python": platform.python_version(), 
+        "machine": platform.machine(), 
+        "cpus": os.cpu_count(), 
+    }
+
+
+def save_results(path: str, results: dict[str, dict], **settings):
+    """Write results to a JSON baseline file."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        json.dump({"meta": metadata(), "settings": settings, "results": results}, f, indent=2)
+
+
+def compare_results(baseline_path: str, results: dict[str, dict], tolerance: float = 0.2) -> list[str]:
+    """
+    Compare results against a saved baseline.  
+    Return one message per benchmark whose p95 grew, or whose ops/s dropped, by more than `tolerance`.
+    """
+    with open(baseline_path) as f:
+        baseline = json.load(f)["results"]
+
+    regressions = []
+    for name, row in results.items():
+        old = baseline.get(name)
+        if old is None:
+            continue
+
+        if row["p95_ms"] > old["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {old['p95_ms']:.3f} ms -> {row['p95_ms']:.3f} ms")
+        if row["ops_per_sec"] < old["ops_per_sec"] * (1 - tolerance):
+            regressions.append(f"{name}: ops/s {old['ops_per_sec']:.0f} -> {row['ops_per_sec']:.0f}")
+
+    return regressions
+
+
+def report(results: dict[str, dict], save: str | None = None, baseline: str | None = None, **settings) -> int:
+    """Print results, optionally save them and compare them with a baseline. Return a process exit code."""
+    print_table(results)
+
+    if save:
+        save_results(save, results, **settings)
+        print(f"\nSaved results to {save}")
+
+    if baseline:
+        regressions = compare_results(baseline, results)
+        if regressions:
+            print(f"\nRegressions against {baseline}:")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+        print(f"\nNo regressions against {baseline}")
+
+    return 0
@@ -0,0 +1,52 @@
+"""
+Compare JWT backends and algorithms.
+
+    python -m bench.jwt_backends [--iterations 2000] [--save FILE] [--baseline FILE]
+"""
+from argparse import ArgumentParser
+import sys
+from datetime import datetime, timezone, timedelta
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519
+
+from app.utils.jwt_backends import BACKENDS
+from bench.common import measure, report
+
+
+KEYS = {
+    "ES256": lambda: ec.generate_private_key(ec.SECP256R1()), 
+    "EdDSA": ed25519.Ed25519PrivateKey.generate, 
+}
+
+
+def run(iterations: int) -> dict[str, dict]:
+    claims = {"id": "user-123", "ver": 0, "type": "access", "exp": datetime.now(timezone.utc) + timedelta(minutes=15)}
+    results = {}
+
+    for algorithm, generate_key in KEYS.items():
+        private_key = generate_key()
+        public_key = private_key.public_key()
+
+        for name, backend_class in BACKENDS.items():
+            backend = backend_class()
+            if algorithm not in backend.algorithms:
+                continue
+
+            token = backend.encode(claims, private_key, algorithm)
+            results[f"{name} {algorithm} sign"] = measure(
+                lambda: backend.encode(claims, private_key, algorithm), iterations
+            )
+            results[f"{name} {algorithm} verify"] = measure(
+                lambda: backend.decode(token, public_key, algorithm), iterations
+            )
+
+    return results
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--save", help="Write results to this JSON file")
+    parser.add_argument("--baseline", help="Compare results with this JSON file")
+    args = parser.parse_args()
+
+    sys.exit(report(run(args.iterations), args.save, args.baseline, iterations=args.iterations))
@@ -0,0 +1,101 @@
+"""
+Load test of the /users/auth endpoints.
+
+    python -m bench.load_auth [--users 50] [--rounds 5] [--save bench/results/load.json] [--baseline FILE]
+
+Every virtual user joins, then loops login -> refresh -> logout `rounds` times. By default main:app
+is driven in process against a temporary SQLite database and generated EC keys; pass --url to load
+a running server instead. 503 answers mean the hashing pool is saturated, see PASSWD_HASH_MAX_PENDING.
+"""
+from argparse import ArgumentParser
+from collections import defaultdict
+from contextlib import AsyncExitStack
+from time import perf_counter
+from uuid import uuid4
+import asyncio
+import sys
+
+from bench.common import bench_environment, percentiles, report
+
+
+async def virtual_user(client, rounds: int, samples: dict[str, list[float]], errors: dict[str, int]):
+    credentials = {"username": f"bench-{uuid4().hex[:12]}", "password": "bench-password"}
+
+    async def call(name: str, method: str, path: str, **kwargs):
+        started = perf_counter()
+        response = await client.request(method, path, **kwargs)
+        samples[name].append(perf_counter() - started)
+        if response.status_code >= 400:
+            errors[f"{name} {response.status_code}"] += 1
+        return response
+
+    await call("join", "POST", "/users/auth/join", json=credentials)
+    for _ in range(rounds):
+        await call("login", "POST", "/users/auth/login", json=credentials)
+        await call("refresh", "GET", "/users/auth/refresh")
+        await call("logout", "GET", "/users/auth/logout")
+
+
+async def run(users: int, rounds: int, url: str | None) -> tuple[dict[str, dict], dict[str, int]]:
+    import httpx
+
+    if url:
+        make_client = lambda: httpx.AsyncClient(base_url=url, timeout=60)
+    else:
+        from main import app
+        transport = httpx.ASGITransport(app=app)
+        make_client = lambda: httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60)
+
+    samples: dict[str, list[float]] = defaultdict(list)
+    errors: dict[str, int] = defaultdict(int)
+
+    # One client per virtual user, each keeps its own refresh cookie
+    clients = [make_client() for _ in range(users)]
+    async with AsyncExitStack() as stack:
+        if not url:
+            # ASGITransport doesn't send lifespan events, run startup/shutdown around the load
+            await stack.enter_async_context(app.router.lifespan_context(app))
+
+        started = perf_counter()
+        try:
+            await asyncio.gather(*(virtual_user(client, rounds, samples, errors) for client in clients))
+        finally:
+            await asyncio.gather(*(client.aclose() for client in clients))
+        elapsed = perf_counter() - started
+
+    results = {
+        name: {"iterations": len(values), "ops_per_sec": len(values) / elapsed, **percentiles(values)}
+        for name, values in samples.items()
+    }
+    total = sum(len(values) for values in samples.values())
+    results["total"] = {
+        "iterations": total,
+        "ops_per_sec": total / elapsed,
+        **percentiles([value for values in samples.values() for value in values]),
+    }
+    return results, dict(errors)
+
+
+def main() -> int:
+    parser = ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=50, help="Concurrent virtual users")
+    parser.add_argument("--rounds", type=int, default=5, help="login/refresh/logout rounds per user")
+    parser.add_argument("--url", help="Base URL of a running server, in process app when not given")
+    parser.add_argument("--save", help="Write results to this JSON file")
+    parser.add_argument("--baseline", help="Compare results with this JSON file")
+    args = parser.parse_args()
+
+    if args.url:
+        results, errors = asyncio.run(run(args.users, args.rounds, args.url))
+    else:
+        with bench_environment():
+            results, errors = asyncio.run(run(args.users, args.rounds, None))
+
+    code = report(results, args.save, args.baseline, users=args.users, rounds=args.rounds, url=args.url)
+    if errors:
+        print(f"\nError responses: {errors}")
+    return code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
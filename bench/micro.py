@@ -0,0 +1,63 @@
+"""
+Micro-benchmarks of the auth hot paths: token minting/validation and password hashing.
+
+    python -m bench.micro [--iterations 1000] [--save bench/results/micro.json] [--baseline FILE]
+
+Password hashing runs `--hash-iterations` times, since every call costs tens of milliseconds.
+"""
+from argparse import ArgumentParser
+import sys
+
+from bench.common import bench_environment, measure, report
+
+
+def run(iterations: int, hash_iterations: int) -> dict[str, dict]:
+    from app.utils import jwt
+    from app.utils.pwd_crypt import hashing_pool
+
+    pwd_context = hashing_pool.context
+    data = {"id": "user-123", "ver": 0}
+    tokens = jwt.create_tokens(data)
+    hashed_password = pwd_context.hash("bench-password")
+
+    results = {
+        "create_tokens": measure(lambda: jwt.create_tokens(data), iterations),
+        "validate_token (warm cache)": measure(lambda: jwt.validate_token(tokens["access_token"]), iterations),
+    }
+
+    if jwt.verified_tokens is not None:
+        def validate_cold():
+            jwt.verified_tokens.clear()
+            jwt.validate_token(tokens["access_token"])
+
+        results["validate_token (cold cache)"] = measure(validate_cold, iterations)
+
+    results["pwd_context.hash"] = measure(lambda: pwd_context.hash("bench-password"), hash_iterations, warmup=1)
+    results["pwd_context.verify"] = measure(
+        lambda: pwd_context.verify("bench-password", hashed_password), hash_iterations, warmup=1
+    )
+    return results
+
+
+def main() -> int:
+    parser = ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=1000)
+    parser.add_argument("--hash-iterations", type=int, default=20)
+    parser.add_argument("--save", help="Write results to this JSON file")
+    parser.add_argument("--baseline", help="Compare results with this JSON file")
+    args = parser.parse_args()
+
+    with bench_environment():
+        results = run(args.iterations, args.hash_iterations)
+
+    return report(
+        results,
+        args.save,
+        args.baseline,
+        iterations=args.iterations,
+        hash_iterations=args.hash_iterations,
+    )
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,130 @@
+"""
+Capacity planning of the password hashing settings: verify throughput and peak RSS per worker.
+
+    python -m bench.pwd_sizing [--config argon2:memory_cost=19456,rounds=2] [--config scrypt:rounds=15]
+                               [--threads 4] [--hashes 40] [--memory-limit-mib 512] [--target-rps 50]
+                               [--save bench/results/pwd_sizing.json] [--baseline FILE]
+
+Every --config (SCHEME[:setting=value,...], settings default to the PASSWD_* environment) is measured
+in a fresh process, so its peak RSS isn't mixed up with the others. Each process verifies `--hashes`
+passwords on `--threads` threads, like the app's hashing pool (PASSWD_HASH_POOL_SIZE) does on login.
+Without --config the bcrypt, argon2 (when argon2-cffi is installed) and scrypt defaults are compared.
+"""
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from math import ceil
+from time import perf_counter
+import multiprocessing
+import resource
+import sys
+
+from bench.common import percentiles, report
+
+
+def parse_config(value: str) -> tuple[str, dict]:
+    """Parse SCHEME[:setting=value,...] into a scheme name and passlib settings."""
+    scheme, _, raw_settings = value.partition(":")
+    settings = {}
+
+    for item in filter(None, raw_settings.split(",")):
+        key, _, setting = item.partition("=")
+        settings[key.strip()] = setting.strip() if key.strip() == "type" else int(setting)
+
+    return scheme.strip(), settings
+
+
+def _peak_rss_mib() -> float:
+    # ru_maxrss is in KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def size_worker(scheme: str, settings: dict, threads: int, hashes: int) -> dict:
+    """Runs in a fresh process: verify `hashes` passwords on `threads` threads, report throughput and RSS."""
+    from app.utils.pwd_crypt import get_pwd_context, scheme_settings
+
+    context = get_pwd_context(scheme, legacy_schemes=[], settings={**scheme_settings(scheme), **settings})
+    idle_rss = _peak_rss_mib()
+    hashed_password = context.hash("sizing-password")
+
+    def verify(_) -> float:
+        started = perf_counter()
+        context.verify("sizing-password", hashed_password)
+        return perf_counter() - started
+
+    started = perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        samples = list(executor.map(verify, range(hashes)))
+    elapsed = perf_counter() - started
+
+    peak_rss = _peak_rss_mib()
+    return {
+        "iterations": hashes,
+        "ops_per_sec": hashes / elapsed,
+        **percentiles(samples),
+        "peak_rss_mib": peak_rss,
+        "hashing_rss_mib": peak_rss - idle_rss,
+    }
+
+
+def default_configs() -> list[str]:
+    from passlib.handlers.argon2 import argon2
+
+    configs = ["bcrypt", "scrypt"]
+    if argon2.has_backend():
+        configs.insert(1, "argon2")
+    return configs
+
+
+def print_capacity(results: dict[str, dict], memory_limit_mib: float | None, target_rps: float | None):
+    """How many workers fit the memory limit, and how many the target login rate needs."""
+    width = max(len(name) for name in results)
+    print(f"\n{'config':<{width}}  {'verify/s':>9}  {'peak RSS MiB':>12}  {'hashing MiB':>11}  "
+          f"{'workers/pod':>11}  {'logins/s/pod':>12}  {'workers for target':>18}")
+
+    for name, row in results.items():
+        fitting = per_pod = needed = "-"
+        if memory_limit_mib:
+            workers = int(memory_limit_mib // row["peak_rss_mib"])
+            fitting, per_pod = str(workers), f"{workers * row['ops_per_sec']:.1f}"
+        if target_rps:
+            needed = str(ceil(target_rps / row["ops_per_sec"]))
+
+        print(
+            f"{name:<{width}}  {row['ops_per_sec']:>9.1f}  {row['peak_rss_mib']:>12.1f}  "
+            f"{row['hashing_rss_mib']:>11.1f}  {fitting:>11}  {per_pod:>12}  {needed:>18}"
+        )
+
+    print("\nVerify throughput is CPU bound: workers on the same cores share it, see the cpus in the metadata.")
+
+
+def main() -> int:
+    parser = ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--config", action="append", help="SCHEME[:setting=value,...], repeatable")
+    parser.add_argument("--threads", type=int, help="Hashing threads per worker (default: PASSWD_HASH_POOL_SIZE)")
+    parser.add_argument("--hashes", type=int, default=40, help="Verifications per config")
+    parser.add_argument("--memory-limit-mib", type=float, help="Pod memory limit, to report workers per pod")
+    parser.add_argument("--target-rps", type=float, help="Target logins/s, to report the workers needed")
+    parser.add_argument("--save", help="Write results to this JSON file")
+    parser.add_argument("--baseline", help="Compare results with this JSON file")
+    args = parser.parse_args()
+
+    from app.env import PASSWD_HASH_POOL_SIZE
+
+    threads = args.threads or PASSWD_HASH_POOL_SIZE
+    configs = args.config or default_configs()
+    results = {}
+
+    # Spawned, not forked, so every config starts from a clean RSS high-water mark
+    spawn = multiprocessing.get_context("spawn")
+    for config in configs:
+        scheme, settings = parse_config(config)
+        with ProcessPoolExecutor(max_workers=1, mp_context=spawn) as executor:
+            results[config] = executor.submit(size_worker, scheme, settings, threads, args.hashes).result()
+
+    code = report(results, args.save, args.baseline, threads=threads, hashes=args.hashes, configs=configs)
+    print_capacity(results, args.memory_limit_mib, args.target_rps)
+    return code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,149 @@
+"""
+SQLite concurrency: user lookups and inserts running at once, with and without the production tuning.
+
+    python -m bench.sqlite_concurrency [--readers 16] [--writers 4] [--seconds 5] [--users 10000]
+                                       [--save bench/results/sqlite_concurrency.json] [--baseline FILE]
+
+Each mode runs in a fresh process against its own SQLite file, through the app's async engines:
+"default" is the rollback journal with one shared pool, "wal" adds the pragmas of DB_SQLITE_TUNED,
+"wal + split" also moves lookups to the read-only pool and async writes to a one connection pool.
+Readers look up random usernames, writers insert new Users, both as fast as they can.
+Pools hold a connection per reader and writer in every mode, so no task waits on a checkout and
+"default" vs "wal" only differ by journal mode and pragmas. Only the async engines run here: in the
+app, the sync engine (session_scope, UserCreate.save, migrations) is another pool that can write too.
+"""
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from time import perf_counter
+import asyncio
+import multiprocessing
+import os
+import random
+import sys
+
+from bench.common import bench_environment, percentiles, report
+
+
+MODES = {
+    "default": {"DB_SQLITE_TUNED": "False", "DB_SQLITE_READ_POOL_SIZE": "0"}, 
+    "wal": {"DB_SQLITE_TUNED": "True", "DB_SQLITE_READ_POOL_SIZE": "0"}, 
+    # Sized by mode_environ
+    "wal + split": {"DB_SQLITE_TUNED": "True", "DB_SQLITE_READ_POOL_SIZE": "1"}, 
+}
+
+
+def mode_environ(settings: dict, db_path: str, readers: int, writers: int) -> dict:
+    """Environment of a mode, with pools sized so every reader and writer can hold a connection."""
+    environ = {
+        **settings, 
+        "DB_HOST": f"sqlite:///{db_path}", 
+        "DB_POOL_SIZE": str(readers + writers), 
+        "DB_MAX_OVERFLOW": "0", 
+    }
+    if settings["DB_SQLITE_READ_POOL_SIZE"] != "0":
+        environ["DB_SQLITE_READ_POOL_SIZE"] = str(readers)
+    return environ
+
+
+def run_mode(environ: dict, readers: int, writers: int, seconds: float, users: int) -> dict:
+    """Entry point of the mode's process: app.env reads the environment on import, so set it first."""
+    os.environ.update(environ)
+    return asyncio.run(workload(readers, writers, seconds, users))
+
+
+async def workload(readers: int, writers: int, seconds: float, users: int) -> dict:
+    from sqlalchemy import insert
+    from sqlmodel import select
+
+    from app.db import init_db_async, async_session_scope, async_read_session_scope, async_engine, async_read_engine
+    from app.models.user import User
+
+    await init_db_async()
+    now = datetime.now(timezone.utc)
+    async with async_session_scope() as session:
+        await session.execute(insert(User), [
+            {"id": f"seed-{i}", "username": f"user{i}", "hashed_password": "x", "created_at": now, "updated_at": now}
+            for i in range(users)
+        ])
+        await session.commit()
+
+    samples = {"read": [], "write": []}
+    errors = {"read": 0, "write": 0}
+    deadline = perf_counter() + seconds
+
+    async def read():
+        while perf_counter() < deadline:
+            started = perf_counter()
+            try:
+                async with async_read_session_scope() as session:
+                    statement = select(User).where(User.username == f"user{random.randrange(users)}")
+                    (await session.exec(statement)).first()
+                samples["read"].append(perf_counter() - started)
+            except Exception:
+                errors["read"] += 1
+
+    async def write(writer: int):
+        count = 0
+        while perf_counter() < deadline:
+            started = perf_counter()
+            count += 1
+            try:
+                async with async_session_scope() as session:
+                    session.add(User(username=f"new-{writer}-{count}", hashed_password="x", created_at=now, updated_at=now))
+                    await session.commit()
+                samples["write"].append(perf_counter() - started)
+            except Exception:
+                errors["write"] += 1
+
+    await asyncio.gather(*(read() for _ in range(readers)), *(write(i) for i in range(writers)))
+
+    await async_engine.dispose()
+    if async_read_engine is not None:
+        await async_read_engine.dispose()
+
+    return {
+        kind: {
+            "iterations": len(samples[kind]), 
+            "ops_per_sec": len(samples[kind]) / seconds, 
+            "errors": errors[kind], 
+            **percentiles(samples[kind]), 
+        }
+        for kind in samples
+    }
+
+
+def main() -> int:
+    parser = ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--readers", type=int, default=16)
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--users", type=int, default=10000, help="Users seeded before the run")
+    parser.add_argument("--save", help="Write results to this JSON file")
+    parser.add_argument("--baseline", help="Compare results with this JSON file")
+    args = parser.parse_args()
+
+    results = {}
+    spawn = multiprocessing.get_context("spawn")
+    with bench_environment() as temp_dir:
+        for mode, settings in MODES.items():
+            db_path = os.path.join(temp_dir, mode.replace(" ", "") + ".sqlite3")
+            environ = mode_environ(settings, db_path, args.readers, args.writers)
+            with ProcessPoolExecutor(max_workers=1, mp_context=spawn) as executor:
+                rows = executor.submit(run_mode, environ, args.readers, args.writers, args.seconds, args.users).result()
+
+            for kind, row in rows.items():
+                results[f"{mode}: {kind}"] = row
+
+    code = report(
+        results, args.save, args.baseline, 
+        readers=args.readers, writers=args.writers, seconds=args.seconds, users=args.users, 
+    )
+    print("\nErrors (e.g. database is locked):")
+    for name, row in results.items():
+        print(f"  {name}: {row['errors']}")
+    return code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,119 @@
+"""
+Cold start report: import time per module and time to first request.
+
+    python -m bench.startup [--runs 5] [--top 15] [--save bench/results/startup.json] [--baseline FILE]
+
+Every run starts fresh interpreters against a temporary SQLite database and generated EC keys:
+one times `import main` (with `-X importtime` for the per-module breakdown of the last run), and
+one launches `python -m app.server` with a single worker and polls it until the first request succeeds.
+"""
+from argparse import ArgumentParser
+from collections import defaultdict
+from time import perf_counter, sleep
+from urllib.error import URLError
+from urllib.request import urlopen
+import os
+import signal
+import socket
+import subprocess
+import sys
+
+from bench.common import bench_environment, percentiles, report
+
+
+IMPORT_MAIN = "from time import perf_counter; started = perf_counter(); import main; print(perf_counter() - started)"
+
+
+def time_import() -> tuple[float, str]:
+    """Seconds `import main` takes in a fresh interpreter, plus its -X importtime output."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", IMPORT_MAIN],
+        capture_output=True, text=True, check=True,
+    )
+    return float(result.stdout.strip().splitlines()[-1]), result.stderr
+
+
+def parse_importtime(output: str) -> list[tuple[str, int, int]]:
+    """(module, self µs, cumulative µs) of every `-X importtime` line."""
+    modules = []
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+
+        self_us, cumulative_us, name = line.removeprefix("import time:").split("|")
+        modules.append((name.strip(), int(self_us), int(cumulative_us)))
+    return modules
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def time_first_request(timeout: float = 30) -> float:
+    """Seconds from launching the production server until it answers its first request."""
+    port = _free_port()
+    environ = {**os.environ, "SERVER_WORKERS": "1", "SERVER_HOST": "127.0.0.1", "PORT": str(port)}
+
+    started = perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "app.server"], env=environ,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        while perf_counter() - started < timeout:
+            try:
+                with urlopen(f"http://127.0.0.1:{port}/docs", timeout=1):
+                    return perf_counter() - started
+            except (URLError, ConnectionError):
+                if server.poll() is not None:
+                    raise RuntimeError(f"Server exited with code {server.returncode} before serving a request!")
+                sleep(0.005)
+        raise TimeoutError(f"Server didn't answer within {timeout}s!")
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout)
+
+
+def print_modules(modules: list[tuple[str, int, int]], top: int):
+    """Slowest modules by cumulative time, and self time summed per top-level package."""
+    print(f"\nSlowest imports (cumulative ms):")
+    for name, _, cumulative_us in sorted(modules, key=lambda module: module[2], reverse=True)[:top]:
+        print(f"  {cumulative_us / 1000:>8.1f}  {name}")
+
+    packages = defaultdict(int)
+    for name, self_us, _ in modules:
+        packages[name.split(".")[0]] += self_us
+
+    print(f"\nSelf time per package (ms):")
+    for package, self_us in sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]:
+        print(f"  {self_us / 1000:>8.1f}  {package}")
+
+
+def main() -> int:
+    parser = ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15, help="Modules/packages listed in the breakdown")
+    parser.add_argument("--save", help="Write results to this JSON file")
+    parser.add_argument("--baseline", help="Compare results with this JSON file")
+    args = parser.parse_args()
+
+    imports, first_requests = [], []
+    with bench_environment():
+        for _ in range(args.runs):
+            seconds, importtime = time_import()
+            imports.append(seconds)
+            first_requests.append(time_first_request())
+
+    results = {
+        name: {"iterations": len(samples), "ops_per_sec": len(samples) / sum(samples), **percentiles(samples)}
+        for name, samples in (("import main", imports), ("time to first request", first_requests))
+    }
+    code = report(results, args.save, args.baseline, runs=args.runs)
+    print_modules(parse_importtime(importtime), args.top)
+    return code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
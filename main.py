@@ -1,22 +1,90 @@
 from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from anyio import to_thread
+import asyncio
 
-from app.env import PORT, DEBUG
-from app.db import init_db
+from app.env import (
+    PORT, 
+    DEBUG, 
+    METRICS_ENABLED, 
+    DB_MIGRATE_ON_STARTUP, 
+    DB_REPLICA_CHECK_SECONDS, 
+    REFRESH_STORE_SWEEP_SECONDS, 
+    REVOCATION_SYNC_SECONDS, 
+    REVOCATION_REBUILD_SECONDS, 
+    THREADPOOL_SIZE, 
+)
+from app.db import init_db_async, engine, async_engine, async_read_engine, replicas
 from app.routes import auth
+from app.utils.pwd_crypt import hashing_pool
+from app.utils.refresh_sessions import refresh_sessions
+from app.utils.revocation import denylist
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # The limiter belongs to the running event loop, so it can only be sized here
+    to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_SIZE
+
+    # Opt-in, app.server already ran it once before starting workers
+    if DB_MIGRATE_ON_STARTUP:
+        await init_db_async()
+
+    # Loads passlib and the hash backend, calibrates the cost and precomputes the hash unknown 
+    # usernames are verified against, on the hashing pool. Awaited so a bad hashing config aborts boot.
+    await asyncio.wrap_future(hashing_pool.warm_up())
+
+    # Skip dead read replicas before requests hit them, and take recovered ones back
+    replica_checks = None
+    if replicas.engines and DB_REPLICA_CHECK_SECONDS > 0:
+        replica_checks = asyncio.create_task(replicas.run_checks(DB_REPLICA_CHECK_SECONDS))
+
+    # Expired refresh sessions are deleted in batches, off the request path
+    refresh_sweeps = None
+    if refresh_sessions.enabled and REFRESH_STORE_SWEEP_SECONDS > 0:
+        refresh_sweeps = asyncio.create_task(refresh_sessions.run_sweeps(REFRESH_STORE_SWEEP_SECONDS))
+
+    # Load the revoked access tokens before serving, then follow the revocations of other workers
+    revocation_syncs = None
+    if denylist.enabled:
+        await denylist.rebuild()
+        if REVOCATION_SYNC_SECONDS > 0:
+            revocation_syncs = asyncio.create_task(
+                denylist.run_syncs(REVOCATION_SYNC_SECONDS, REVOCATION_REBUILD_SECONDS)
+            )
+
+    yield
+
+    # The server already drained in-flight requests, release what's left
+    for task in (replica_checks, refresh_sweeps, revocation_syncs):
+        if task is not None:
+            task.cancel()
+    hashing_pool.shutdown()
+    await async_engine.dispose()
+    if async_read_engine is not None:
+        await async_read_engine.dispose()
+    await replicas.dispose()
+    engine.dispose()
 
 
 app = FastAPI(
     title="FastAPI JWT Auth Practice", 
     debug=DEBUG, 
+    lifespan=lifespan, 
 )
 
-# init db
-init_db()
-
 # Include routes
 app.include_router(auth.router)
 
+if METRICS_ENABLED:
+    from app.routes import metrics
+    from app.utils.metrics import MetricsMiddleware
+
+    app.add_middleware(MetricsMiddleware)
+    app.include_router(metrics.router)
+
 if __name__ == "__main__":
     import uvicorn
 
-    uvicorn.run("main:app", host="127.0.0.1" if DEBUG else "0.0.0.0", port=PORT, reload=DEBUG) 
\ No newline at end of file
+    # Development server, run `python -m app.server` in production
+    uvicorn.run("main:app", host="127.0.0.1" if DEBUG else "0.0.0.0", port=PORT, reload=DEBUG)
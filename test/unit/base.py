@@ -1,11 +1,11 @@
 """
     Base Test Classes with common utilities for testing the application.
 """
-from unittest import TestCase
+from unittest import TestCase, IsolatedAsyncioTestCase
 from unittest.mock import patch
 from sqlmodel import SQLModel
 
-from app.db import test_engine, get_session
+from app.db import test_engine, test_async_engine, get_session
 from app.models import *
 
 
@@ -40,7 +40,10 @@ class TestWithInMemoryDB(TestCase):
         cls.engine = None
     
     def setUp(self):
-        """Clear database before each test."""
+        """Clear database and cached users before each test."""
+        from app.models.user import user_cache
+        user_cache.clear()
+
         session = next(get_session())
 
         for table in reversed(SQLModel.metadata.sorted_tables):
@@ -49,3 +52,33 @@ class TestWithInMemoryDB(TestCase):
             except Exception:
                 pass
         session.commit()
+
+
+class TestWithInMemoryAsyncDB(IsolatedAsyncioTestCase):
+    """
+    Base Test Class for tests that need an in-memory SQLite database behind the async engine.  
+    Creates the schema and clears data before each test, since every test runs on its own event loop.
+    """
+
+    async def asyncSetUp(self):
+        """Create the schema on the async test engine and clear its data and cached users."""
+        from app.models import user
+        user.user_cache.clear()
+
+        self.patcher = patch("app.db.async_engine", test_async_engine)
+        self.patcher.start()
+        # Reads share the test engine
+        self.read_patcher = patch("app.db.async_read_engine", None)
+        self.read_patcher.start()
+        self.engine = test_async_engine
+
+        async with test_async_engine.begin() as conn:
+            await conn.run_sync(SQLModel.metadata.create_all)
+            for table in reversed(SQLModel.metadata.sorted_tables):
+                await conn.execute(table.delete())
+
+    async def asyncTearDown(self):
+        """Stop patching and release the connections bound to this test event loop."""
+        self.patcher.stop()
+        self.read_patcher.stop()
+        await test_async_engine.dispose()
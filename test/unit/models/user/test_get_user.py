@@ -2,7 +2,7 @@ from sqlmodel import select
 
 from test.unit.base import TestWithInMemoryDB
 from app.models.user import get_user, User, UserCreate
-from app.db import get_session
+from app.db import get_session, session_scope
 
 
 class TestGetUser(TestWithInMemoryDB):
@@ -47,3 +47,8 @@ class TestGetUser(TestWithInMemoryDB):
         result = get_user(id=self.user1.id)
         self.assertIsNotNone(result)
         self.assertEqual(result.id, self.user1.id)
+
+    def test_uses_given_session(self):
+        with session_scope() as session:
+            result = get_user(username="testuser", session=session)
+            self.assertIn(result, session)
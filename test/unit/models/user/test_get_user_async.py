@@ -0,0 +1,81 @@
+from unittest.mock import patch
+import tempfile
+import os
+from sqlmodel import SQLModel, create_engine
+
+from test.unit.base import TestWithInMemoryAsyncDB
+from app.models.user import get_user_async, UserCreate, UserNotFound, user_cache
+from app.db import async_session_scope, create_replica_engine, ReplicaRouter
+
+
+class TestGetUserAsync(TestWithInMemoryAsyncDB):
+    async def asyncSetUp(self):
+        """Populate the database with a user for testing."""
+        await super().asyncSetUp()
+
+        await UserCreate(username="testuser", password="testpassword").save_async()
+        self.user1 = await get_user_async(username="testuser")
+
+    async def test_returns_user_by_username(self):
+        result = await get_user_async(username="testuser")
+        self.assertIsNotNone(result)
+        self.assertEqual(result.username, "testuser")
+
+    async def test_returns_user_by_id(self):
+        result = await get_user_async(id=self.user1.id)
+        self.assertIsNotNone(result)
+        self.assertEqual(result.id, self.user1.id)
+
+    async def test_uses_given_session(self):
+        async with async_session_scope() as session:
+            result = await get_user_async(username="testuser", session=session)
+
+        self.assertEqual(result.id, self.user1.id)
+
+    async def test_raises_exception_if_no_user_found_by_username(self):
+        with self.assertRaises(Exception) as _:
+            _ = await get_user_async(username="nonexistent")
+
+    async def test_raises_exception_if_no_user_found_by_id(self):
+        with self.assertRaises(Exception) as _:
+            _ = await get_user_async(id="nonexistent-id")
+
+    async def test_raises_exception_without_id_or_username(self):
+        with self.assertRaises(Exception) as _:
+            _ = await get_user_async()
+
+
+class TestGetUserAsyncOnReplica(TestWithInMemoryAsyncDB):
+    """A SQLite file with an empty user table stands in for a replica that hasn't caught up yet."""
+
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        await UserCreate(username="newuser", password="testpassword").save_async()
+
+        self.temp_dir = tempfile.TemporaryDirectory()
+        url = f"sqlite:///{os.path.join(self.temp_dir.name, 'replica.sqlite3')}"
+        sync_engine = create_engine(url)
+        SQLModel.metadata.create_all(sync_engine)
+        sync_engine.dispose()
+
+        self.replica = create_replica_engine(url)
+        self.replicas_patcher = patch("app.db.replicas", ReplicaRouter([self.replica]))
+        self.replicas_patcher.start()
+
+    async def asyncTearDown(self):
+        self.replicas_patcher.stop()
+        await self.replica.dispose()
+        self.temp_dir.cleanup()
+        await super().asyncTearDown()
+
+    async def test_confirms_replica_misses_on_primary(self):
+        user = await get_user_async(username="newuser")
+
+        self.assertEqual(user.username, "newuser")
+        self.assertEqual(user_cache.lookup(username="newuser")[1].id, user.id)
+
+    async def test_caches_misses_confirmed_on_primary(self):
+        with self.assertRaises(UserNotFound):
+            await get_user_async(username="unknown")
+
+        self.assertEqual(user_cache.lookup(username="unknown"), (True, None))
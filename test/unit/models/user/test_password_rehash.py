@@ -0,0 +1,33 @@
+from test.unit.base import TestWithInMemoryAsyncDB
+from app.models.user import UserCreate, get_user_async, update_password_hash_async, user_cache
+from app.utils.pwd_crypt import get_pwd_context
+
+
+class TestUpdatePasswordHash(TestWithInMemoryAsyncDB):
+    async def asyncSetUp(self):
+        """Populate the database with a user hashed at a low cost."""
+        await super().asyncSetUp()
+        user_cache.clear()
+
+        self.old_hash = get_pwd_context(rounds=4).hash("testpassword")
+        await UserCreate(username="testuser", password="testpassword").save_async(hashed_password=self.old_hash)
+        self.user1 = await get_user_async(username="testuser")
+
+    async def test_replaces_hash(self):
+        new_hash = get_pwd_context(rounds=5).hash("testpassword")
+
+        self.assertTrue(await update_password_hash_async(self.user1.id, self.old_hash, new_hash))
+        self.assertEqual((await get_user_async(id=self.user1.id)).hashed_password, new_hash)
+
+    async def test_invalidates_cached_user(self):
+        new_hash = get_pwd_context(rounds=5).hash("testpassword")
+        await update_password_hash_async(self.user1.id, self.old_hash, new_hash)
+
+        self.assertEqual(user_cache.lookup(username="testuser"), (False, None))
+
+    async def test_skips_when_hash_changed_meanwhile(self):
+        """A hash changed since it was read isn't overwritten."""
+        new_hash = get_pwd_context(rounds=5).hash("testpassword")
+
+        self.assertFalse(await update_password_hash_async(self.user1.id, "stale-hash", new_hash))
+        self.assertEqual((await get_user_async(id=self.user1.id)).hashed_password, self.old_hash)
@@ -0,0 +1,45 @@
+from test.unit.base import TestWithInMemoryAsyncDB
+from app.models.user import (
+    UserCreate, 
+    get_user_async, 
+    get_token_version_async, 
+    revoke_user_tokens_async, 
+    token_versions, 
+)
+
+
+class TestTokenVersion(TestWithInMemoryAsyncDB):
+    async def asyncSetUp(self):
+        """Populate the database with a user for testing."""
+        await super().asyncSetUp()
+        token_versions.clear()
+
+        await UserCreate(username="testuser", password="testpassword").save_async()
+        self.user1 = await get_user_async(username="testuser")
+
+    async def test_new_user_starts_at_version_zero(self):
+        self.assertEqual(await get_token_version_async(self.user1.id), 0)
+
+    async def test_returns_none_for_unknown_user(self):
+        self.assertIsNone(await get_token_version_async("nonexistent-id"))
+
+    async def test_version_is_cached(self):
+        await get_token_version_async(self.user1.id)
+
+        self.assertEqual(token_versions.get(self.user1.id), 0)
+
+    async def test_revoke_bumps_version(self):
+        new_version = await revoke_user_tokens_async(self.user1.id)
+
+        self.assertEqual(new_version, 1)
+        self.assertEqual(await get_token_version_async(self.user1.id), 1)
+        self.assertEqual((await get_user_async(id=self.user1.id)).token_version, 1)
+
+    async def test_revoke_refreshes_cached_version(self):
+        await get_token_version_async(self.user1.id)
+        await revoke_user_tokens_async(self.user1.id)
+
+        self.assertEqual(token_versions.get(self.user1.id), 1)
+
+    async def test_revoke_unknown_user_returns_none(self):
+        self.assertIsNone(await revoke_user_tokens_async("nonexistent-id"))
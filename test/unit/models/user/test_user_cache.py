@@ -0,0 +1,140 @@
+from unittest import TestCase
+from datetime import datetime, timezone
+from sqlmodel import delete
+
+from test.unit.base import TestWithInMemoryDB
+from app.models.user import (
+    User, 
+    UserCache, 
+    UserCreate, 
+    UserNotFound, 
+    get_user, 
+    user_cache, 
+    build_user_cache_backend, 
+)
+from app.db import session_scope
+
+
+class TestUserCache(TestCase):
+    def setUp(self):
+        self.cache = UserCache(build_user_cache_backend("memory"))
+        self.user = User(
+            id="user-1", 
+            username="testuser", 
+            hashed_password="hashed-password", 
+            created_at=datetime.now(timezone.utc), 
+            updated_at=datetime.now(timezone.utc), 
+        )
+
+    def test_lookup_misses_empty_cache(self):
+        self.assertEqual(self.cache.lookup(id="user-1"), (False, None))
+
+    def test_stored_user_found_by_id_and_username(self):
+        self.cache.store(self.user)
+
+        found, user = self.cache.lookup(id="user-1")
+        self.assertTrue(found)
+        self.assertEqual(user.username, "testuser")
+
+        found, user = self.cache.lookup(username="testuser")
+        self.assertTrue(found)
+        self.assertEqual(user.id, "user-1")
+
+    def test_hits_return_the_stored_row(self):
+        self.cache.store(self.user)
+
+        _, by_id = self.cache.lookup(id="user-1")
+        _, by_username = self.cache.lookup(username="testuser")
+        self.assertIs(by_id, by_username)
+        self.assertEqual(by_id.hashed_password, "hashed-password")
+
+    def test_caches_unknown_usernames(self):
+        self.cache.store(None, username="unknown")
+
+        self.assertEqual(self.cache.lookup(username="unknown"), (True, None))
+
+    def test_invalidate_by_id_drops_username_entry(self):
+        self.cache.store(self.user)
+        self.cache.invalidate(id="user-1")
+
+        self.assertFalse(self.cache.lookup(id="user-1")[0])
+        self.assertFalse(self.cache.lookup(username="testuser")[0])
+
+    def test_reports_hit_and_miss_counters(self):
+        self.cache.store(self.user)
+        self.cache.lookup(id="user-1")
+        self.cache.lookup(id="user-2")
+
+        stats = self.cache.stats()
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["misses"], 1)
+
+    def test_kv_backend_only_caches_unknown_usernames(self):
+        cache = UserCache(build_user_cache_backend("kv"))
+        cache.store(self.user)
+        cache.store(None, username="unknown")
+
+        # The row, and its password hash, never reach the shared store
+        self.assertEqual(cache.lookup(username="testuser"), (False, None))
+        self.assertEqual(cache.lookup(id="user-1"), (False, None))
+        self.assertEqual(cache.lookup(username="unknown"), (True, None))
+
+    def test_disabled_cache_never_finds(self):
+        cache = UserCache(build_user_cache_backend("off"))
+        cache.store(self.user)
+
+        self.assertEqual(cache.lookup(id="user-1"), (False, None))
+        self.assertEqual(cache.stats(), {})
+
+    def test_unknown_backend_raises_error(self):
+        with self.assertRaises(ValueError):
+            build_user_cache_backend("unknown")
+
+
+class TestGetUserCache(TestWithInMemoryDB):
+    def setUp(self):
+        super().setUp()
+        UserCreate(username="testuser", password="testpassword").save()
+
+    def _delete_users(self):
+        with session_scope() as session:
+            session.exec(delete(User))
+            session.commit()
+
+    def test_serves_user_from_cache(self):
+        user = get_user(username="testuser")
+        self._delete_users()
+
+        self.assertEqual(get_user(username="testuser").id, user.id)
+        self.assertEqual(get_user(id=user.id).username, "testuser")
+
+    def test_cached_user_outlives_the_callers_session(self):
+        with session_scope() as session:
+            user_id = get_user(username="testuser", session=session).id
+            # Committing expires the caller's instance, not the cached one
+            session.commit()
+
+        self.assertEqual(get_user(id=user_id).username, "testuser")
+
+    def test_use_cache_false_reads_the_row(self):
+        get_user(username="testuser")
+        self._delete_users()
+
+        with self.assertRaises(UserNotFound):
+            get_user(username="testuser", use_cache=False)
+
+    def test_caches_unknown_usernames(self):
+        with self.assertRaises(UserNotFound):
+            get_user(username="unknown")
+
+        found, user = user_cache.lookup(username="unknown")
+        self.assertTrue(found)
+        self.assertIsNone(user)
+
+    def test_save_drops_cached_unknown_username(self):
+        with self.assertRaises(UserNotFound):
+            get_user(username="newuser")
+
+        UserCreate(username="newuser", password="testpassword").save()
+
+        self.assertEqual(get_user(username="newuser").username, "newuser")
@@ -2,7 +2,7 @@ from sqlmodel import select
 
 from test.unit.base import TestWithInMemoryDB
 from app.models.user import UserCreate, User
-from app.db import get_session
+from app.db import get_session, session_scope
 
 
 class TestUserCreate_Save(TestWithInMemoryDB):
@@ -25,6 +25,13 @@ class TestUserCreate_Save(TestWithInMemoryDB):
         self.assertIsNotNone(user)
         self.assertEqual(user.username, "testuser")
 
+    def test_saves_user_with_given_session(self):
+        with session_scope() as session:
+            UserCreate(username="testuser", password="testpassword").save(session)
+
+            result = session.exec(select(User).where(User.username == "testuser"))
+            self.assertIsNotNone(result.first())
+
     def test_password_is_hashed(self):
         user_create = UserCreate(username="testuser", password="testpassword")
         user_create.save()
@@ -0,0 +1,48 @@
+from sqlalchemy.exc import IntegrityError
+
+from test.unit.base import TestWithInMemoryAsyncDB
+from app.models.user import UserCreate, get_user_async
+from app.db import async_session_scope
+
+
+class TestUserCreate_SaveAsync(TestWithInMemoryAsyncDB):
+
+    async def test_saves_user_to_db(self):
+        await UserCreate(username="testuser", password="testpassword").save_async()
+
+        user = await get_user_async(username="testuser")
+        self.assertEqual(user.username, "testuser")
+
+    async def test_saves_user_with_given_session(self):
+        async with async_session_scope() as session:
+            await UserCreate(username="testuser", password="testpassword").save_async(session)
+
+        user = await get_user_async(username="testuser")
+        self.assertEqual(user.username, "testuser")
+
+    async def test_password_is_hashed(self):
+        await UserCreate(username="testuser", password="testpassword").save_async()
+
+        user = await get_user_async(username="testuser")
+        self.assertNotEqual(user.hashed_password, "testpassword")
+
+    async def test_uses_given_hashed_password(self):
+        await UserCreate(username="testuser", password="testpassword").save_async(
+            hashed_password="already-hashed"
+        )
+
+        user = await get_user_async(username="testuser")
+        self.assertEqual(user.hashed_password, "already-hashed")
+
+    async def test_username_uniqueness(self):
+        await UserCreate(username="testuser", password="testpassword").save_async()
+
+        with self.assertRaises(Exception):
+            await UserCreate(username="testuser", password="anotherpassword").save_async()
+
+    async def test_duplicate_username_raises_integrity_error(self):
+        async with async_session_scope() as session:
+            await UserCreate(username="testuser", password="testpassword").save_async(session)
+
+            with self.assertRaises(IntegrityError):
+                await UserCreate(username="testuser", password="anotherpassword").save_async(session)
@@ -0,0 +1,302 @@
+from unittest import TestCase
+from unittest.mock import patch
+import tempfile
+import os
+from cryptography.hazmat.primitives.asymmetric import ec
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlmodel import SQLModel, Session, create_engine, select
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+
+from app.models import *
+from app.models.user import User, user_cache, token_versions
+from app.routes import auth
+from app.utils.jwt import key_store
+from app.utils.pwd_crypt import HashingPool, get_pwd_context
+from app.utils.rate_limit import login_rate_limiter, LoginRateLimiter, MemoryRateLimitStore
+from app.utils.refresh_sessions import refresh_sessions
+from app.utils.revocation import denylist
+
+
+class TestWithAuthApp(TestCase):
+    """
+    Base Test Class for requests to the auth routes through a TestClient.  
+    Every test gets its own SQLite file (the client runs requests on another event loop, which an in-memory
+    database bound to this one wouldn't follow), a cheap bcrypt cost and a test signing key.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.private_key = ec.generate_private_key(ec.SECP256R1())
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        path = os.path.join(self.temp_dir.name, "test.sqlite3")
+        self.engine = create_engine(f"sqlite:///{path}")
+        SQLModel.metadata.create_all(self.engine)
+
+        self.hashing_pool = HashingPool(get_pwd_context("bcrypt", rounds=4), max_workers=1)
+        self.patchers = [
+            patch("app.db.engine", self.engine), 
+            patch("app.db.async_engine", create_async_engine(f"sqlite+aiosqlite:///{path}", poolclass=NullPool)), 
+            patch("app.db.async_read_engine", None), 
+            patch("app.routes.auth.hashing_pool", self.hashing_pool), 
+            patch.object(key_store, "private_key", return_value=self.private_key), 
+            patch.object(key_store, "public_key", return_value=self.private_key.public_key()), 
+        ]
+        for patcher in self.patchers:
+            patcher.start()
+
+        user_cache.clear()
+        token_versions.clear()
+        login_rate_limiter.clear()
+        denylist.clear()
+
+        app = FastAPI()
+        app.include_router(auth.router)
+        self.client = TestClient(app)
+
+    def tearDown(self):
+        self.client.close()
+        for patcher in reversed(self.patchers):
+            patcher.stop()
+        self.hashing_pool.shutdown()
+        self.engine.dispose()
+        self.temp_dir.cleanup()
+
+    def join(self, username: str = "testuser", password: str = "testpassword"):
+        return self.client.post("/users/auth/join", json={"username": username, "password": password})
+
+    def login(self, username: str = "testuser", password: str = "testpassword"):
+        return self.client.post("/users/auth/login", json={"username": username, "password": password})
+
+    def refresh(self):
+        return self.client.get("/users/auth/refresh")
+
+    def use_cookie(self, refresh_token: str):
+        """Send this refresh token from now on, like a client holding a copy of it."""
+        self.client.cookies.clear()
+        self.client.cookies.set("refresh_token", refresh_token)
+
+    def users(self) -> list[User]:
+        with Session(self.engine) as session:
+            return list(session.exec(select(User)).all())
+
+
+class TestJoin(TestWithAuthApp):
+    def test_creates_user(self):
+        response = self.join()
+
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(response.json()["success"])
+        self.assertEqual([user.username for user in self.users()], ["testuser"])
+
+    def test_duplicate_username_returns_400(self):
+        self.join()
+
+        response = self.join(password="otherpassword")
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {"detail": "There's already an User with username testuser!", "success": False})
+        # The unique index rejected the INSERT, the first User is untouched
+        users = self.users()
+        self.assertEqual(len(users), 1)
+        self.assertTrue(self.hashing_pool.verify(password="testpassword", hashed_password=users[0].hashed_password))
+
+
+class TestLoginThrottling(TestWithAuthApp):
+    def setUp(self):
+        super().setUp()
+        self.join()
+
+        limiter = LoginRateLimiter(MemoryRateLimitStore(), per_username=2, per_ip=100, window=60)
+        self.limiter_patcher = patch("app.routes.auth.login_rate_limiter", limiter)
+        self.limiter_patcher.start()
+
+    def tearDown(self):
+        self.limiter_patcher.stop()
+        super().tearDown()
+
+    def test_returns_429_before_lookup_or_hash(self):
+        self.login()
+        self.login(password="wrongpassword")
+
+        with (
+            patch("app.routes.auth.get_user_async", wraps=auth.get_user_async) as get_user_async, 
+            patch.object(self.hashing_pool, "verify_and_update_async", wraps=self.hashing_pool.verify_and_update_async) as verify, 
+            patch.object(self.hashing_pool, "dummy_verify_async", wraps=self.hashing_pool.dummy_verify_async) as dummy_verify, 
+        ):
+            response = self.login()
+
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.json(), {"detail": "Too many login attempts, try again later!", "success": False})
+        self.assertGreater(int(response.headers["Retry-After"]), 0)
+        get_user_async.assert_not_called()
+        verify.assert_not_called()
+        dummy_verify.assert_not_called()
+
+    def test_counts_attempts_per_username(self):
+        self.login(password="wrongpassword")
+        self.login(password="wrongpassword")
+
+        self.assertEqual(self.login("otheruser").status_code, 400)
+        self.assertEqual(self.login().status_code, 429)
+
+
+class TestLoginUnknownUser(TestWithAuthApp):
+    def setUp(self):
+        super().setUp()
+        self.join()
+
+    def test_answers_like_a_wrong_password(self):
+        wrong_password = self.login(password="wrongpassword")
+        unknown_user = self.login("unknownuser")
+
+        self.assertEqual(unknown_user.status_code, wrong_password.status_code)
+        self.assertEqual(unknown_user.json(), wrong_password.json())
+        self.assertEqual(unknown_user.json(), {"detail": "Invalid username or password!", "success": False})
+
+    def test_pays_for_a_dummy_verify(self):
+        with (
+            patch.object(self.hashing_pool, "dummy_verify_async", wraps=self.hashing_pool.dummy_verify_async) as dummy_verify, 
+            patch.object(self.hashing_pool, "verify_and_update_async", wraps=self.hashing_pool.verify_and_update_async) as verify, 
+        ):
+            self.login("unknownuser", "somepassword")
+
+        dummy_verify.assert_called_once_with("somepassword")
+        verify.assert_not_called()
+
+
+class TestLoginRehash(TestWithAuthApp):
+    def setUp(self):
+        super().setUp()
+        self.join()
+        # Raise the cost after the join, like a deploy with a higher PASSWD_HASH_ROUNDS would
+        self.upgraded_pool = HashingPool(get_pwd_context("bcrypt", rounds=5), max_workers=1)
+        self.pool_patcher = patch("app.routes.auth.hashing_pool", self.upgraded_pool)
+        self.pool_patcher.start()
+
+    def tearDown(self):
+        self.pool_patcher.stop()
+        self.upgraded_pool.shutdown()
+        super().tearDown()
+
+    def test_rehashes_outdated_hash_after_response(self):
+        old_hash = self.users()[0].hashed_password
+
+        with patch("app.routes.auth.update_password_hash_async", wraps=auth.update_password_hash_async) as update:
+            response = self.login()
+
+        self.assertEqual(response.status_code, 200)
+        new_hash = self.users()[0].hashed_password
+        update.assert_called_once_with(self.users()[0].id, old_hash, new_hash)
+        self.assertTrue(new_hash.startswith("$2b$05$"))
+        self.assertTrue(self.upgraded_pool.verify("testpassword", new_hash))
+
+    def test_current_hash_isnt_rewritten(self):
+        self.login()
+        rehashed = self.users()[0].hashed_password
+
+        with patch("app.routes.auth.update_password_hash_async") as update:
+            self.assertEqual(self.login().status_code, 200)
+
+        update.assert_not_called()
+        self.assertEqual(self.users()[0].hashed_password, rehashed)
+
+
+class TestRefresh(TestWithAuthApp):
+    def setUp(self):
+        super().setUp()
+        self.join()
+        self.login()
+        self.first_cookie = self.client.cookies["refresh_token"]
+
+    def test_rotation_sets_a_new_cookie(self):
+        response = self.refresh()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("access_token", response.json())
+        self.assertNotIn("refresh_token", response.json())
+        self.assertNotEqual(response.cookies["refresh_token"], self.first_cookie)
+
+    def test_replayed_cookie_returns_400_and_revokes_the_family(self):
+        self.refresh()
+        rotated_cookie = self.client.cookies["refresh_token"]
+
+        self.use_cookie(self.first_cookie)
+        replayed = self.refresh()
+
+        self.assertEqual(replayed.status_code, 400)
+        self.assertEqual(replayed.json(), {"detail": "Refresh token was already used, its session is revoked!"})
+
+        # The legitimate holder of the rotated token is logged out too
+        self.use_cookie(rotated_cookie)
+        self.assertEqual(self.refresh().status_code, 400)
+
+
+class TestLogout(TestWithAuthApp):
+    def setUp(self):
+        super().setUp()
+        self.join()
+        self.access_token = self.login().json()["access_token"]
+        self.refresh_cookie = self.client.cookies["refresh_token"]
+
+    def test_revokes_the_refresh_session_and_the_access_token(self):
+        headers = {"Authorization": f"Bearer {self.access_token}"}
+        self.assertEqual(self.client.get("/users/auth/me", headers=headers).status_code, 200)
+
+        response = self.client.get("/users/auth/logout", headers=headers)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"detail": "Logout Successfully!", "success": True})
+        self.assertEqual(self.client.get("/users/auth/me", headers=headers).status_code, 401)
+
+        # A copy of the cookie taken before logout doesn't work either
+        self.use_cookie(self.refresh_cookie)
+        refresh = self.refresh()
+        self.assertEqual(refresh.status_code, 400)
+        self.assertEqual(refresh.json(), {"detail": "Refresh session expired or was revoked, log in again!"})
+
+
+    def test_rotated_cookie_is_a_reuse(self):
+        self.refresh()
+        rotated_cookie = self.client.cookies["refresh_token"]
+        reuses = refresh_sessions.reuses
+
+        # A stale copy of the cookie can't end the session quietly, it's caught like on /refresh
+        self.use_cookie(self.refresh_cookie)
+        self.assertEqual(self.client.get("/users/auth/logout").status_code, 200)
+        self.assertEqual(refresh_sessions.reuses, reuses + 1)
+
+        self.use_cookie(rotated_cookie)
+        self.assertEqual(self.refresh().status_code, 400)
+
+class TestNonASCIIToken(TestWithAuthApp):
+    """A forged token with non-ASCII segments is rejected like any other invalid token."""
+
+    def setUp(self):
+        super().setUp()
+        self.join()
+        access_token = self.login().json()["access_token"]
+        header, payload, signature = access_token.split(".")
+        # Sent as raw bytes, a str header would have to be ASCII already
+        self.token = f"{header}.{payload}é.{signature}"
+        self.headers = {"Authorization": f"Bearer {self.token}".encode()}
+
+    def test_me_returns_401(self):
+        self.assertEqual(self.client.get("/users/auth/me", headers=self.headers).status_code, 401)
+
+    def test_refresh_returns_400(self):
+        response = self.client.get("/users/auth/refresh", headers={"Cookie": f"refresh_token={self.token}".encode()})
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_logout_succeeds(self):
+        self.client.cookies.clear()
+        response = self.client.get(
+            "/users/auth/logout", 
+            headers={**self.headers, "Cookie": f"refresh_token={self.token}".encode()}, 
+        )
+
+        self.assertEqual(response.status_code, 200)
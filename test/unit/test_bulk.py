@@ -0,0 +1,161 @@
+from unittest import TestCase
+from sqlalchemy import create_engine, select, func
+from io import StringIO
+import json
+
+from app.models.user import User
+from app.migrations import upgrade
+from app.utils.pwd_crypt import get_pwd_context
+from app.bulk import (
+    InvalidRecord, 
+    detect_format, 
+    read_records, 
+    to_row, 
+    import_users, 
+    export_users, 
+)
+
+
+context = get_pwd_context(rounds=4)
+
+
+def ndjson(*records) -> StringIO:
+    return StringIO("".join(json.dumps(record) + "\n" for record in records))
+
+
+class TestReadRecords(TestCase):
+    def test_reads_csv_with_line_numbers(self):
+        source = StringIO("username,password\nsomeone,password1\nanother,password2\n")
+
+        records = list(read_records(source, "csv"))
+
+        self.assertEqual(records[0], (2, {"username": "someone", "password": "password1"}))
+        self.assertEqual(records[1][0], 3)
+
+    def test_yields_invalid_ndjson_lines_as_invalid_records(self):
+        records = list(read_records(StringIO('{"username": "someone"}\n\nnot json\n'), "ndjson"))
+
+        self.assertEqual(records[0], (1, {"username": "someone"}))
+        self.assertEqual(records[1][0], 3)
+        self.assertIsInstance(records[1][1], InvalidRecord)
+
+    def test_detects_format_from_extension(self):
+        self.assertEqual(detect_format("users.csv"), "csv")
+        self.assertEqual(detect_format("users.jsonl"), "ndjson")
+        self.assertEqual(detect_format("users.txt", "csv"), "csv")
+        self.assertEqual(detect_format("-"), "ndjson")
+        with self.assertRaises(ValueError):
+            detect_format("users.txt")
+
+
+class TestToRow(TestCase):
+    def test_keeps_plain_password_for_hashing(self):
+        row = to_row({"username": "someone", "password": "password"}, context)
+
+        self.assertEqual(row["password"], "password")
+        self.assertIsNone(row["hashed_password"])
+        self.assertEqual(row["token_version"], 0)
+
+    def test_passes_hashes_through(self):
+        hashed = context.hash("password")
+
+        row = to_row({"username": "someone", "hashed_password": hashed}, context)
+
+        self.assertEqual(row["hashed_password"], hashed)
+        self.assertNotIn("password", row)
+
+    def test_rejects_invalid_records(self):
+        invalid = [
+            {"username": "x", "password": "password"}, 
+            {"username": "someone"}, 
+            {"username": "someone", "password": "password", "hashed_password": context.hash("password")}, 
+            {"username": "someone", "password": "short"}, 
+            {"username": "someone", "hashed_password": "plain text"}, 
+            {"username": "someone", "password": "password", "created_at": "yesterday"}, 
+            ["someone", "password"], 
+        ]
+
+        for record in invalid:
+            with self.subTest(record=record), self.assertRaises(InvalidRecord):
+                to_row(record, context)
+
+
+class TestImportExport(TestCase):
+    def setUp(self):
+        self.engine = create_engine("sqlite://")
+        with self.engine.connect() as connection:
+            upgrade(connection)
+
+    def tearDown(self):
+        self.engine.dispose()
+
+    def import_users(self, source: StringIO, **kwargs):
+        return import_users(read_records(source, "ndjson"), self.engine, workers=0, rounds=4, **kwargs)
+
+    def users(self) -> list[User]:
+        with self.engine.connect() as connection:
+            return connection.execute(select(User.__table__).order_by(User.__table__.c.username)).all()
+
+    def test_imports_in_batches(self):
+        progress = []
+        source = ndjson(*({"username": f"user{i}", "password": f"password{i}"} for i in range(5)))
+
+        stats = self.import_users(source, batch_size=2, on_progress=lambda stats: progress.append(stats.written))
+
+        self.assertEqual(stats.written, 5)
+        self.assertEqual(stats.hashed, 5)
+        self.assertEqual(progress, [2, 4, 5])
+
+        users = self.users()
+        self.assertEqual(len(users), 5)
+        self.assertTrue(context.verify("password3", users[3].hashed_password))
+
+    def test_skips_existing_usernames_and_reports_rejects(self):
+        rejects = []
+        self.import_users(ndjson({"username": "someone", "password": "password"}))
+
+        stats = self.import_users(
+            ndjson({"username": "someone", "password": "other-password"}, {"username": "x"}), 
+            on_reject=lambda line, reason: rejects.append(line), 
+        )
+
+        self.assertEqual((stats.read, stats.written, stats.skipped, stats.rejected), (2, 0, 1, 1))
+        self.assertEqual(rejects, [2])
+        self.assertTrue(context.verify("password", self.users()[0].hashed_password))
+
+    def test_skips_existing_ids(self):
+        self.import_users(ndjson({"id": "user-1", "username": "someone", "password": "password"}))
+
+        stats = self.import_users(ndjson(
+            {"id": "user-1", "username": "another", "password": "password"}, 
+            {"id": "user-2", "username": "third", "password": "password"}, 
+        ))
+
+        self.assertEqual((stats.written, stats.skipped), (1, 1))
+        self.assertEqual([user.username for user in self.users()], ["someone", "third"])
+
+    def test_export_can_be_imported_back(self):
+        self.import_users(ndjson(*({"username": f"user{i}", "password": "password"} for i in range(3))))
+        exported = StringIO()
+
+        stats = export_users(exported, "csv", self.engine, batch_size=2)
+        self.assertEqual(stats.written, 3)
+
+        self.engine.dispose()
+        self.setUp()
+        exported.seek(0)
+        import_users(read_records(exported, "csv"), self.engine, workers=0, rounds=4)
+
+        with self.engine.connect() as connection:
+            self.assertEqual(connection.execute(select(func.count()).select_from(User.__table__)).scalar_one(), 3)
+
+    def test_hashes_on_worker_processes(self):
+        stats = import_users(
+            read_records(ndjson({"username": "someone", "password": "password"}), "ndjson"), 
+            self.engine, 
+            workers=1, 
+            rounds=4, 
+        )
+
+        self.assertEqual(stats.written, 1)
+        self.assertTrue(context.verify("password", self.users()[0].hashed_password))
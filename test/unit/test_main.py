@@ -0,0 +1,20 @@
+from unittest import IsolatedAsyncioTestCase
+from unittest.mock import patch
+
+from app.utils.pwd_crypt import HashingPool
+import main
+
+
+def broken_context():
+    raise ValueError("Can't calibrate the cost of argon2, set PASSWD_HASH_ROUNDS instead!")
+
+
+class TestLifespan(IsolatedAsyncioTestCase):
+    async def test_bad_hashing_config_aborts_startup(self):
+        pool = HashingPool(context_factory=broken_context)
+
+        with patch("main.hashing_pool", pool), self.assertRaises(ValueError):
+            async with main.lifespan(main.app):
+                pass
+
+        pool.shutdown()
@@ -0,0 +1,101 @@
+from unittest import TestCase
+from sqlmodel import SQLModel
+from sqlalchemy import create_engine, inspect, text
+
+from app.models.user import User
+from app.models.refresh_token import RefreshToken
+from app.models.revoked_token import RevokedToken
+from app.migrations import MIGRATIONS, upgrade, pending, applied_versions
+
+
+class TestUpgrade(TestCase):
+    def setUp(self):
+        self.engine = create_engine("sqlite:///:memory:")
+        self.connection = self.engine.connect()
+
+    def tearDown(self):
+        self.connection.close()
+        self.engine.dispose()
+
+    def index_names(self) -> set[str]:
+        # Read sqlite_master, SQLAlchemy doesn't reflect expression indexes on SQLite
+        with self.connection.begin():
+            rows = self.connection.execute(text(
+                "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'user' AND sql IS NOT NULL"
+            ))
+            return set(rows.scalars())
+
+    def table_names(self) -> list[str]:
+        with self.connection.begin():
+            return inspect(self.connection).get_table_names()
+
+    def column_names(self) -> set[str]:
+        with self.connection.begin():
+            return {column["name"] for column in inspect(self.connection).get_columns("user")}
+
+    def test_creates_schema_on_empty_database(self):
+        applied = upgrade(self.connection)
+
+        self.assertEqual([migration.version for migration in applied], [m.version for m in MIGRATIONS])
+        self.assertIn("user", self.table_names())
+        self.assertEqual(pending(self.connection), [])
+
+    def test_is_idempotent(self):
+        upgrade(self.connection)
+
+        self.assertEqual(upgrade(self.connection), [])
+
+    def test_stops_at_target(self):
+        upgrade(self.connection, target=2)
+
+        self.assertEqual(applied_versions(self.connection), {1, 2})
+        self.assertIn("ix_user_id", self.index_names())
+
+    def test_tunes_user_indexes(self):
+        upgrade(self.connection)
+
+        indexes = self.index_names()
+        self.assertNotIn("ix_user_id", indexes)
+        self.assertIn("ix_user_username", indexes)
+        self.assertIn("ix_user_username_lower", indexes)
+
+    def test_adds_token_version_to_existing_rows(self):
+        upgrade(self.connection, target=1)
+        with self.connection.begin():
+            self.connection.execute(text(
+                "INSERT INTO user (id, username, hashed_password, created_at, updated_at) "
+                "VALUES ('1', 'someone', 'hash', '2024-01-01', '2024-01-01')"
+            ))
+
+        upgrade(self.connection)
+
+        with self.connection.begin():
+            token_version = self.connection.execute(text("SELECT token_version FROM user")).scalar_one()
+        self.assertEqual(token_version, 0)
+
+    def test_adopts_schema_created_by_create_all(self):
+        with self.connection.begin():
+            SQLModel.metadata.create_all(self.connection, tables=[User.__table__])
+
+        upgrade(self.connection)
+
+        self.assertEqual(pending(self.connection), [])
+        self.assertNotIn("ix_user_id", self.index_names())
+
+    def test_matches_model(self):
+        upgrade(self.connection)
+
+        self.assertEqual(self.column_names(), set(User.__table__.columns.keys()))
+        self.assertEqual(self.index_names(), {index.name for index in User.__table__.indexes})
+
+    def test_matches_token_models(self):
+        upgrade(self.connection)
+
+        for model in (RefreshToken, RevokedToken):
+            table = model.__table__
+            with self.subTest(table=table.name), self.connection.begin():
+                columns = {column["name"] for column in inspect(self.connection).get_columns(table.name)}
+                indexes = {index["name"] for index in inspect(self.connection).get_indexes(table.name)}
+
+                self.assertEqual(columns, set(table.columns.keys()))
+                self.assertEqual(indexes, {index.name for index in table.indexes})
@@ -0,0 +1,71 @@
+from unittest import TestCase
+from unittest.mock import patch
+import os
+
+from app import env
+from app.server import server_options, prepare_workers
+
+
+class TestServerOptions(TestCase):
+    def test_uses_env_settings(self):
+        options = server_options(workers=3)
+
+        self.assertEqual(options["workers"], 3)
+        self.assertEqual(options["backlog"], env.SERVER_BACKLOG)
+        self.assertEqual(options["timeout_keep_alive"], env.SERVER_KEEP_ALIVE_SECONDS)
+        self.assertEqual(options["timeout_graceful_shutdown"], env.SERVER_GRACEFUL_SHUTDOWN_SECONDS)
+
+    def test_falls_back_to_auto_when_not_installed(self):
+        with patch("app.server.find_spec", return_value=None), patch("sys.stderr"):
+            options = server_options()
+
+        self.assertEqual(options["loop"], "auto")
+        self.assertEqual(options["http"], "auto")
+
+
+class TestPrepareWorkers(TestCase):
+    def setUp(self):
+        self.db_migrate_on_startup = env.DB_MIGRATE_ON_STARTUP
+
+    def tearDown(self):
+        env.DB_MIGRATE_ON_STARTUP = self.db_migrate_on_startup
+
+    def test_workers_skip_db_init(self):
+        with patch.dict(os.environ, {}, clear=False):
+            prepare_workers(1)
+
+            self.assertEqual(os.environ["DB_MIGRATE_ON_STARTUP"], "False")
+        self.assertFalse(env.DB_MIGRATE_ON_STARTUP)
+
+    def test_splits_hashing_threads_between_workers(self):
+        with patch.dict(os.environ, {}, clear=False), patch("os.cpu_count", return_value=8):
+            os.environ.pop("PASSWD_HASH_POOL_SIZE", None)
+            prepare_workers(4)
+
+            self.assertEqual(os.environ["PASSWD_HASH_POOL_SIZE"], "2")
+
+    def test_keeps_explicit_hashing_pool_size(self):
+        with patch.dict(os.environ, {"PASSWD_HASH_POOL_SIZE": "3"}), patch("os.cpu_count", return_value=8):
+            prepare_workers(4)
+
+            self.assertEqual(os.environ["PASSWD_HASH_POOL_SIZE"], "3")
+
+    def test_calibrates_hash_cost_once_for_all_workers(self):
+        with patch.dict(os.environ, {}, clear=False), \
+                patch.object(env, "PASSWD_HASH_ROUNDS", 0), \
+                patch.object(env, "PASSWD_HASH_TARGET_MS", 250), \
+                patch("app.utils.pwd_crypt.calibrate_rounds", return_value=12) as calibrate_rounds:
+            prepare_workers(4)
+
+            self.assertEqual(os.environ["PASSWD_HASH_ROUNDS"], "12")
+        calibrate_rounds.assert_called_once_with(env.PASSWD_HASH_ALGO, 250)
+
+    def test_keeps_explicit_hash_cost(self):
+        with patch.dict(os.environ, {"PASSWD_HASH_ROUNDS": "11"}), \
+                patch.object(env, "PASSWD_HASH_ROUNDS", 11), \
+                patch.object(env, "PASSWD_HASH_TARGET_MS", 250), \
+                patch("app.utils.pwd_crypt.calibrate_rounds") as calibrate_rounds:
+            prepare_workers(4)
+
+            self.assertEqual(os.environ["PASSWD_HASH_ROUNDS"], "11")
+        calibrate_rounds.assert_not_called()
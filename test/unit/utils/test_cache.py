@@ -0,0 +1,154 @@
+import unittest
+from unittest.mock import patch
+
+from app.utils.cache import TTLCache, KVCache, LocalKVStore, DELETE_BATCH, delete_prefix
+
+
+class TestTTLCache(unittest.TestCase):
+    """Tests for TTLCache."""
+
+    def test_returns_stored_value(self):
+        cache = TTLCache()
+        cache.set("key", "value")
+
+        self.assertEqual(cache.get("key"), "value")
+        self.assertIn("key", cache)
+
+    def test_returns_default_for_missing_key(self):
+        cache = TTLCache()
+
+        self.assertIsNone(cache.get("missing"))
+        self.assertEqual(cache.get("missing", "default"), "default")
+
+    def test_entries_expire_after_ttl(self):
+        cache = TTLCache(ttl=10)
+
+        with patch("app.utils.cache.monotonic", return_value=100.0):
+            cache.set("key", "value")
+        with patch("app.utils.cache.monotonic", return_value=111.0):
+            self.assertIsNone(cache.get("key"))
+
+        self.assertEqual(cache.stats.expirations, 1)
+        self.assertEqual(len(cache), 0)
+
+    def test_per_entry_ttl_overrides_default(self):
+        cache = TTLCache(ttl=10)
+
+        with patch("app.utils.cache.monotonic", return_value=100.0):
+            cache.set("key", "value", ttl=60)
+        with patch("app.utils.cache.monotonic", return_value=150.0):
+            self.assertEqual(cache.get("key"), "value")
+
+    def test_evicts_least_recently_used_entry(self):
+        cache = TTLCache(max_size=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+
+        self.assertIn("a", cache)
+        self.assertNotIn("b", cache)
+        self.assertIn("c", cache)
+        self.assertEqual(cache.stats.evictions, 1)
+
+    def test_counts_hits_and_misses(self):
+        cache = TTLCache()
+        cache.set("key", "value")
+        cache.get("key")
+        cache.get("missing")
+
+        self.assertEqual(cache.stats.snapshot()["hits"], 1)
+        self.assertEqual(cache.stats.snapshot()["misses"], 1)
+
+    def test_delete_and_clear(self):
+        cache = TTLCache()
+        cache.set("a", 1)
+        cache.set("b", 2)
+
+        cache.delete("a")
+        self.assertNotIn("a", cache)
+
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+
+
+class TestKVCache(unittest.TestCase):
+    """Tests for KVCache on the LocalKVStore stand-in."""
+
+    def setUp(self):
+        self.store = LocalKVStore()
+        self.cache = KVCache(self.store, prefix="test:", ttl=10)
+
+    def test_round_trips_json_values(self):
+        self.cache.set("key", {"id": "user-1", "active": True})
+
+        self.assertEqual(self.cache.get("key"), {"id": "user-1", "active": True})
+        self.assertIsNotNone(self.store.get("test:key"))
+
+    def test_entries_expire_in_store(self):
+        with patch("app.utils.cache.monotonic", return_value=100.0):
+            self.cache.set("key", "value")
+        with patch("app.utils.cache.monotonic", return_value=111.0):
+            self.assertIsNone(self.cache.get("key"))
+
+    def test_delete_and_clear(self):
+        self.cache.set("a", 1)
+        self.cache.set("b", 2)
+
+        self.cache.delete("a")
+        self.assertIsNone(self.cache.get("a"))
+
+        self.store.set("other:key", "value")
+        self.cache.clear()
+        self.assertIsNone(self.cache.get("b"))
+        # Keys outside the prefix aren't the cache's to drop
+        self.assertEqual(self.store.get("other:key"), "value")
+
+    def test_counts_hits_and_misses(self):
+        self.cache.set("key", "value")
+        self.cache.get("key")
+        self.cache.get("missing")
+
+        self.assertEqual(self.cache.stats.hits, 1)
+        self.assertEqual(self.cache.stats.misses, 1)
+
+
+class TestLocalKVStore(unittest.TestCase):
+    """Tests for the counter calls of LocalKVStore."""
+
+    def setUp(self):
+        self.store = LocalKVStore()
+
+    def test_incr_counts_from_zero(self):
+        self.assertEqual(self.store.incr("key"), 1)
+        self.assertEqual(self.store.incr("key", 2), 3)
+        self.assertEqual(self.store.get("key"), "3")
+
+    def test_expire_applies_to_counters(self):
+        with patch("app.utils.cache.monotonic", return_value=100.0):
+            self.store.incr("key")
+            self.store.expire("key", 10)
+            self.store.incr("key")
+        with patch("app.utils.cache.monotonic", return_value=111.0):
+            self.assertIsNone(self.store.get("key"))
+            self.assertEqual(self.store.incr("key"), 1)
+
+    def test_scan_iter_skips_expired_keys(self):
+        with patch("app.utils.cache.monotonic", return_value=100.0):
+            self.store.set("a:1", "1")
+            self.store.set("a:2", "2", ex=10)
+            self.store.set("b:1", "3")
+        with patch("app.utils.cache.monotonic", return_value=111.0):
+            self.assertEqual(list(self.store.scan_iter(match="a:*")), ["a:1"])
+
+    def test_delete_prefix_leaves_other_keys(self):
+        for i in range(DELETE_BATCH + 1):
+            self.store.set(f"a:{i}", "1")
+        self.store.set("b:1", "1")
+
+        self.assertEqual(delete_prefix(self.store, "a:"), DELETE_BATCH + 1)
+
+        self.assertEqual(list(self.store.scan_iter(match="*")), ["b:1"])
+
+if __name__ == "__main__":
+    unittest.main()
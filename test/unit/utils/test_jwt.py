@@ -1,12 +1,31 @@
 import unittest
 import tempfile
+import asyncio
 import os
 from datetime import datetime, timezone, timedelta
 from cryptography.hazmat.primitives.asymmetric import ec
 from cryptography.hazmat.primitives import serialization
 from cryptography.hazmat.backends import default_backend
 
-from app.utils.jwt import create_token, create_tokens, validate_token, validate_refresh_token
+from unittest.mock import patch
+from jose import JWTError
+
+from app.utils.jwt import (
+    create_token, 
+    create_tokens, 
+    mint_tokens, 
+    validate_token, 
+    validate_refresh_token, 
+    KeyStore, 
+    VerifiedTokenCache, 
+    key_store, 
+    jwt_backend, 
+    validate_access_token, 
+    get_current_user, 
+    current_user_seconds, 
+)
+from app.utils.revocation import Denylist, MemoryRevocationStore
+from app.utils import metrics
 
 
 class JWTTestBase(unittest.TestCase):
@@ -207,6 +226,96 @@ class TestCreateTokens(JWTTestBase):
         # Tokens should be different
         self.assertNotEqual(tokens["access_token"], tokens["refresh_token"])
 
+    def test_create_tokens_share_issue_time(self):
+        """Test that access and refresh tokens are issued at the same time."""
+        tokens = create_tokens(
+            {"id": "user-123"},
+            priv_key_path=self.priv_key_path,
+            algorithm="ES256"
+        )
+        
+        access = validate_token(tokens["access_token"], self.pub_key_path, "ES256")
+        refresh = validate_token(tokens["refresh_token"], self.pub_key_path, "ES256")
+        
+        self.assertEqual(access["iat"], refresh["iat"])
+        self.assertEqual(access["type"], "access")
+        self.assertEqual(refresh["type"], "refresh")
+
+
+class TestMintTokens(JWTTestBase):
+    """Tests for mint_tokens function."""
+
+    def test_mints_tokens_for_every_subject(self):
+        """Test that one tokens pair is returned per subject, in order."""
+        subjects = [{"id": f"user-{i}"} for i in range(5)]
+        
+        tokens = mint_tokens(subjects, priv_key_path=self.priv_key_path, algorithm="ES256")
+        
+        self.assertEqual(len(tokens), 5)
+        for subject, pair in zip(subjects, tokens):
+            payload = validate_token(pair["access_token"], self.pub_key_path, "ES256")
+            self.assertEqual(payload["id"], subject["id"])
+
+    def test_session_claims_only_go_in_refresh_tokens(self):
+        """Test that session claims are added to the refresh token of their subject only."""
+        tokens = mint_tokens(
+            [{"id": "user-1"}, {"id": "user-2"}], 
+            priv_key_path=self.priv_key_path, 
+            algorithm="ES256", 
+            session_claims=[{"jti": "a", "fam": "f"}, None], 
+        )
+
+        refresh = validate_token(tokens[0]["refresh_token"], self.pub_key_path, "ES256")
+        self.assertEqual((refresh["jti"], refresh["fam"]), ("a", "f"))
+        self.assertNotIn("fam", validate_token(tokens[0]["access_token"], self.pub_key_path, "ES256"))
+        self.assertNotIn("jti", validate_token(tokens[1]["refresh_token"], self.pub_key_path, "ES256"))
+
+    def test_access_tokens_get_unique_jti(self):
+        """Test that every access token carries its own jti, so it can be revoked."""
+        tokens = mint_tokens(
+            [{"id": "user-1"}, {"id": "user-1"}], 
+            priv_key_path=self.priv_key_path, 
+            algorithm="ES256", 
+        )
+
+        jtis = {validate_token(pair["access_token"], self.pub_key_path, "ES256")["jti"] for pair in tokens}
+        self.assertEqual(len(jtis), 2)
+
+    def test_batch_shares_claims(self):
+        """Test that every token of a batch has the same issue and expiry times."""
+        tokens = mint_tokens(
+            [{"id": "user-1"}, {"id": "user-2"}], 
+            priv_key_path=self.priv_key_path, 
+            algorithm="ES256"
+        )
+        
+        self.assertEqual(tokens[0]["access_expires_at"], tokens[1]["access_expires_at"])
+        self.assertEqual(
+            validate_token(tokens[0]["refresh_token"], self.pub_key_path, "ES256")["iat"], 
+            validate_token(tokens[1]["refresh_token"], self.pub_key_path, "ES256")["iat"], 
+        )
+
+    def test_doesnt_change_subjects(self):
+        """Test that subject dicts aren't modified."""
+        subject = {"id": "user-123"}
+        
+        mint_tokens([subject], priv_key_path=self.priv_key_path, algorithm="ES256")
+        
+        self.assertEqual(subject, {"id": "user-123"})
+
+    def test_empty_batch_returns_empty_list(self):
+        self.assertEqual(mint_tokens([], priv_key_path=self.priv_key_path, algorithm="ES256"), [])
+
+    def test_session_claims_must_match_subjects(self):
+        """Test that a session_claims list of another length raises instead of dropping tokens."""
+        with self.assertRaises(ValueError):
+            mint_tokens(
+                [{"id": "user-1"}, {"id": "user-2"}], 
+                priv_key_path=self.priv_key_path, 
+                algorithm="ES256", 
+                session_claims=[{"jti": "jti-1", "fam": "family-1"}], 
+            )
+
 
 class TestValidateToken(JWTTestBase):
     """Tests for validate_token function."""
@@ -253,6 +362,24 @@ class TestValidateToken(JWTTestBase):
         
         self.assertIn("exp", payload)
 
+    def test_validate_token_includes_type(self):
+        """Test that payload includes the token type."""
+        token = create_token(
+            {"id": "user-123"},
+            15,
+            "access",
+            priv_key_path=self.priv_key_path,
+            algorithm="ES256"
+        )
+        
+        payload = validate_token(
+            token["token"],
+            pub_key_path=self.pub_key_path,
+            algorithm="ES256"
+        )
+        
+        self.assertEqual(payload["type"], "access")
+
     def test_validate_invalid_token_raises_error(self):
         """Test that invalid token raises JWTError."""
         from jose import JWTError
@@ -371,6 +498,293 @@ class TestValidateRefreshToken(JWTTestBase):
         self.assertIsInstance(payload, dict)
         self.assertEqual(payload["id"], original_data["id"])
 
+    def test_validate_refresh_token_rejects_access_token(self):
+        """Test that an access token can't be used as refresh token."""
+        from fastapi import Request, Response, HTTPException
+        from unittest.mock import MagicMock
+        
+        token = create_token(
+            {"id": "user-123"},
+            15,
+            "access",
+            priv_key_path=self.priv_key_path,
+            algorithm="ES256"
+        )
+        
+        mock_request = MagicMock(spec=Request)
+        mock_request.cookies.get.return_value = token["token"]
+        mock_response = MagicMock(spec=Response)
+        
+        with self.assertRaises(HTTPException) as context:
+            validate_refresh_token(
+                mock_request,
+                mock_response,
+                pub_key_path=self.pub_key_path,
+                algorithm="ES256"
+            )
+        
+        self.assertEqual(context.exception.status_code, 400)
+
+
+    def test_validate_refresh_token_rejects_untyped_token(self):
+        """Test that a signed token without type claim can't be used as refresh token."""
+        from fastapi import Request, Response, HTTPException
+        from unittest.mock import MagicMock
+
+        expires = datetime.now(timezone.utc) + timedelta(minutes=15)
+        token = jwt_backend.encode({"id": "user-123", "exp": expires}, key_store.private_key(self.priv_key_path), "ES256")
+
+        mock_request = MagicMock(spec=Request)
+        mock_request.cookies.get.return_value = token
+        mock_response = MagicMock(spec=Response)
+
+        with self.assertRaises(HTTPException) as context:
+            validate_refresh_token(
+                mock_request,
+                mock_response,
+                pub_key_path=self.pub_key_path,
+                algorithm="ES256"
+            )
+
+        self.assertEqual(context.exception.status_code, 400)
+        self.assertEqual(context.exception.detail, "Given token isn't a refresh token!")
+
+class TestValidateAccessToken(JWTTestBase):
+    """Tests for validate_access_token and the get_current_user dependency."""
+
+    def _request(self, authorization: str | None = None):
+        from fastapi import Request
+
+        headers = [(b"authorization", authorization.encode())] if authorization else []
+        return Request({"type": "http", "headers": headers})
+
+    def _token(self, token_type: str = "access") -> str:
+        return create_token(
+            {"id": "user-123", "ver": 2},
+            15,
+            token_type,
+            priv_key_path=self.priv_key_path,
+            algorithm="ES256"
+        )["token"]
+
+    def _validate(self, authorization: str | None):
+        return validate_access_token(
+            self._request(authorization), 
+            pub_key_path=self.pub_key_path, 
+            algorithm="ES256"
+        )
+
+    def test_returns_principal_for_access_token(self):
+        principal = self._validate(f"Bearer {self._token()}")
+
+        self.assertEqual(principal["id"], "user-123")
+        self.assertEqual(principal["token_version"], 2)
+        self.assertGreater(principal["expires_at"], datetime.now(timezone.utc))
+
+    def test_bearer_scheme_is_case_insensitive(self):
+        principal = self._validate(f"bearer {self._token()}")
+
+        self.assertEqual(principal["id"], "user-123")
+
+    def test_missing_header_raises_401(self):
+        from fastapi import HTTPException
+
+        with self.assertRaises(HTTPException) as context:
+            self._validate(None)
+
+        self.assertEqual(context.exception.status_code, 401)
+        self.assertEqual(context.exception.headers["WWW-Authenticate"], "Bearer")
+
+    def test_other_scheme_raises_401(self):
+        from fastapi import HTTPException
+
+        with self.assertRaises(HTTPException) as context:
+            self._validate(f"Basic {self._token()}")
+
+        self.assertEqual(context.exception.status_code, 401)
+
+    def test_invalid_token_raises_401(self):
+        from fastapi import HTTPException
+
+        with self.assertRaises(HTTPException) as context:
+            self._validate("Bearer invalid.token.here")
+
+        self.assertEqual(context.exception.status_code, 401)
+
+    def test_refresh_token_raises_401(self):
+        from fastapi import HTTPException
+
+        with self.assertRaises(HTTPException) as context:
+            self._validate(f"Bearer {self._token('refresh')}")
+
+        self.assertEqual(context.exception.status_code, 401)
+
+    def test_get_current_user_records_its_time(self):
+        from fastapi import HTTPException
+
+        count = current_user_seconds.count
+        with patch.object(metrics, "metrics_enabled", True), self.assertRaises(HTTPException):
+            asyncio.run(get_current_user(self._request()))
+
+        self.assertEqual(current_user_seconds.count, count + 1)
+
+    def test_get_current_user_skips_timing_when_metrics_are_disabled(self):
+        from fastapi import HTTPException
+
+        count = current_user_seconds.count
+        with patch.object(metrics, "metrics_enabled", False), self.assertRaises(HTTPException):
+            asyncio.run(get_current_user(self._request()))
+
+        self.assertEqual(current_user_seconds.count, count)
+
+
+class TestKeyStore(JWTTestBase):
+    """Tests for KeyStore key cache."""
+
+    def _write_pub_key(self, path):
+        private_key = ec.generate_private_key(ec.SECP256R1(), default_backend())
+        with open(path, "wb") as f:
+            f.write(private_key.public_key().public_bytes(
+                encoding=serialization.Encoding.PEM,
+                format=serialization.PublicFormat.SubjectPublicKeyInfo
+            ))
+
+    def test_returns_same_key_object_on_repeated_calls(self):
+        """Test that the key file is parsed once and reused."""
+        store = KeyStore(check_interval=60)
+
+        key1 = store.private_key(self.priv_key_path)
+        key2 = store.private_key(self.priv_key_path)
+
+        self.assertIs(key1, key2)
+
+    def test_loads_private_and_public_keys(self):
+        """Test that private and public keys are parsed into key objects."""
+        store = KeyStore()
+
+        self.assertTrue(hasattr(store.private_key(self.priv_key_path), "private_bytes"))
+        self.assertTrue(hasattr(store.public_key(self.pub_key_path), "public_bytes"))
+
+    def test_reloads_key_when_file_changes(self):
+        """Test that a rotated key file is picked up without restart."""
+        store = KeyStore(check_interval=0)
+        rotated_path = os.path.join(self.temp_dir, "rotated_pub.pem")
+
+        try:
+            self._write_pub_key(rotated_path)
+            old_key = store.public_key(rotated_path)
+
+            self._write_pub_key(rotated_path)
+            # Make sure the mtime changes even on coarse-grained filesystems
+            stat = os.stat(rotated_path)
+            os.utime(rotated_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+            new_key = store.public_key(rotated_path)
+
+            self.assertNotEqual(
+                old_key.public_numbers(), 
+                new_key.public_numbers()
+            )
+        finally:
+            if os.path.exists(rotated_path):
+                os.remove(rotated_path)
+
+    def test_keeps_old_key_if_rotated_file_is_invalid(self):
+        """Test that a half written key file doesn't break the cached key."""
+        store = KeyStore(check_interval=0)
+        rotated_path = os.path.join(self.temp_dir, "broken_pub.pem")
+
+        try:
+            self._write_pub_key(rotated_path)
+            old_key = store.public_key(rotated_path)
+
+            with open(rotated_path, "w") as f:
+                f.write("-----BEGIN PUBLIC KEY-----")
+
+            self.assertIs(store.public_key(rotated_path), old_key)
+        finally:
+            if os.path.exists(rotated_path):
+                os.remove(rotated_path)
+
+    def test_missing_key_file_raises_error(self):
+        """Test that a missing key file raises an error."""
+        store = KeyStore()
+
+        with self.assertRaises(FileNotFoundError):
+            store.public_key(os.path.join(self.temp_dir, "missing.pem"))
+
+
+class TestVerifiedTokenCache(JWTTestBase):
+    """Tests for VerifiedTokenCache and its use by validate_token."""
+
+    def setUp(self):
+        self.cache = VerifiedTokenCache(max_size=10)
+        self.public_key = object()
+        self.payload = {"id": "user-123", "exp": datetime.now(timezone.utc).timestamp() + 60}
+
+    def test_returns_cached_payload(self):
+        self.cache.set("token", self.public_key, "ES256", self.payload)
+
+        self.assertEqual(self.cache.get("token", self.public_key, "ES256"), self.payload)
+
+    def test_returns_copy_of_payload(self):
+        self.cache.set("token", self.public_key, "ES256", self.payload)
+        self.cache.get("token", self.public_key, "ES256")["id"] = "changed"
+
+        self.assertEqual(self.cache.get("token", self.public_key, "ES256")["id"], "user-123")
+
+    def test_misses_for_other_key_or_algorithm(self):
+        self.cache.set("token", self.public_key, "ES256", self.payload)
+
+        self.assertIsNone(self.cache.get("token", object(), "ES256"))
+        self.assertIsNone(self.cache.get("token", self.public_key, "ES384"))
+
+    def test_doesnt_cache_expired_or_exp_less_tokens(self):
+        self.cache.set("expired", self.public_key, "ES256", {"exp": 1})
+        self.cache.set("no-exp", self.public_key, "ES256", {"id": "user-123"})
+
+        self.assertEqual(len(self.cache), 0)
+
+    def test_evicts_when_full(self):
+        for i in range(11):
+            self.cache.set(f"token-{i}", self.public_key, "ES256", self.payload)
+
+        self.assertEqual(len(self.cache), 10)
+        self.assertEqual(self.cache.stats.evictions, 1)
+
+    def test_validate_token_skips_verification_on_repeat(self):
+        """Test that a token validated twice is only verified once."""
+        from app.utils import jwt as jwt_module
+
+        token = create_token(
+            {"id": "user-123"}, 
+            15, 
+            "access", 
+            priv_key_path=self.priv_key_path, 
+            algorithm="ES256"
+        )
+
+        with patch.object(jwt_module, "verified_tokens", self.cache), \
+             patch.object(jwt_module.jwt_backend, "decode", wraps=jwt_module.jwt_backend.decode) as decode:
+            first = validate_token(token["token"], self.pub_key_path, "ES256")
+            second = validate_token(token["token"], self.pub_key_path, "ES256")
+
+        self.assertEqual(first, second)
+        self.assertEqual(decode.call_count, 1)
+
+    def test_validate_token_rejects_revoked_cached_token(self):
+        """Test that a token revoked after it was cached is rejected."""
+        from app.utils import jwt as jwt_module
+
+        denylist = Denylist(MemoryRevocationStore())
+        token = create_tokens({"id": "user-123"}, self.priv_key_path, algorithm="ES256")["access_token"]
+
+        with patch.object(jwt_module, "verified_tokens", self.cache), patch.object(jwt_module, "denylist", denylist):
+            payload = validate_token(token, self.pub_key_path, "ES256")
+            asyncio.run(denylist.revoke(payload["jti"], payload["exp"]))
+
+            with self.assertRaises(JWTError):
+                validate_token(token, self.pub_key_path, "ES256")
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,115 @@
+import unittest
+from datetime import datetime, timezone, timedelta
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519
+from jose.exceptions import JWTError, ExpiredSignatureError
+
+from app.utils.jwt_backends import JoseBackend, CryptographyBackend, get_backend
+
+
+class JWTBackendTestBase(unittest.TestCase):
+    """Base class generating EC and Ed25519 key objects."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.ec_private_key = ec.generate_private_key(ec.SECP256R1())
+        cls.ec_public_key = cls.ec_private_key.public_key()
+        cls.ed_private_key = ed25519.Ed25519PrivateKey.generate()
+        cls.ed_public_key = cls.ed_private_key.public_key()
+
+    def claims(self, minutes: int = 15) -> dict:
+        return {"id": "user-123", "exp": datetime.now(timezone.utc) + timedelta(minutes=minutes)}
+
+
+class TestCryptographyBackend(JWTBackendTestBase):
+    """Tests for CryptographyBackend."""
+
+    def setUp(self):
+        self.backend = CryptographyBackend()
+
+    def test_es256_round_trip(self):
+        token = self.backend.encode(self.claims(), self.ec_private_key, "ES256")
+        payload = self.backend.decode(token, self.ec_public_key, "ES256")
+
+        self.assertEqual(payload["id"], "user-123")
+        self.assertIsInstance(payload["exp"], int)
+
+    def test_eddsa_round_trip(self):
+        token = self.backend.encode(self.claims(), self.ed_private_key, "EdDSA")
+        payload = self.backend.decode(token, self.ed_public_key, "EdDSA")
+
+        self.assertEqual(payload["id"], "user-123")
+
+    def test_expired_token_raises_error(self):
+        token = self.backend.encode(self.claims(minutes=-5), self.ec_private_key, "ES256")
+
+        with self.assertRaises(ExpiredSignatureError):
+            self.backend.decode(token, self.ec_public_key, "ES256")
+
+    def test_tampered_payload_raises_error(self):
+        header, _, signature = self.backend.encode(self.claims(), self.ec_private_key, "ES256").split(".")
+        other_payload = self.backend.encode(
+            {"id": "admin", "exp": self.claims()["exp"]}, self.ec_private_key, "ES256"
+        ).split(".")[1]
+
+        with self.assertRaises(JWTError):
+            self.backend.decode(f"{header}.{other_payload}.{signature}", self.ec_public_key, "ES256")
+
+    def test_algorithm_mismatch_raises_error(self):
+        token = self.backend.encode(self.claims(), self.ed_private_key, "EdDSA")
+
+        with self.assertRaises(JWTError):
+            self.backend.decode(token, self.ec_public_key, "ES256")
+
+    def test_key_of_wrong_type_raises_error(self):
+        with self.assertRaises(JWTError):
+            self.backend.encode(self.claims(), self.ed_private_key, "ES256")
+
+        with self.assertRaises(JWTError):
+            self.backend.encode(self.claims(), ec.generate_private_key(ec.SECP384R1()), "ES256")
+
+    def test_malformed_token_raises_error(self):
+        with self.assertRaises(JWTError):
+            self.backend.decode("invalid.token.here", self.ec_public_key, "ES256")
+
+        with self.assertRaises(JWTError):
+            self.backend.decode("not-a-jwt", self.ec_public_key, "ES256")
+
+    def test_unsupported_algorithm_raises_error(self):
+        with self.assertRaises(JWTError):
+            self.backend.encode(self.claims(), self.ec_private_key, "HS256")
+
+
+class TestBackendInterop(JWTBackendTestBase):
+    """Tokens of one backend must be accepted by the other."""
+
+    def test_jose_accepts_cryptography_tokens(self):
+        token = CryptographyBackend().encode(self.claims(), self.ec_private_key, "ES256")
+
+        self.assertEqual(JoseBackend().decode(token, self.ec_public_key, "ES256")["id"], "user-123")
+
+    def test_cryptography_accepts_jose_tokens(self):
+        token = JoseBackend().encode(self.claims(), self.ec_private_key, "ES256")
+
+        self.assertEqual(CryptographyBackend().decode(token, self.ec_public_key, "ES256")["id"], "user-123")
+
+
+class TestJoseBackend(JWTBackendTestBase):
+    """Tests for JoseBackend."""
+
+    def test_eddsa_isnt_supported(self):
+        with self.assertRaises(JWTError):
+            JoseBackend().encode(self.claims(), self.ed_private_key, "EdDSA")
+
+
+class TestGetBackend(unittest.TestCase):
+    def test_returns_backend_by_name(self):
+        self.assertIsInstance(get_backend("jose"), JoseBackend)
+        self.assertIsInstance(get_backend("cryptography"), CryptographyBackend)
+
+    def test_unknown_backend_raises_error(self):
+        with self.assertRaises(ValueError):
+            get_backend("unknown")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,130 @@
+import unittest
+from unittest.mock import patch
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.utils import metrics
+from app.utils.metrics import Histogram, MetricsRegistry, MetricsMiddleware, stage
+
+
+class TestHistogram(unittest.TestCase):
+    """Tests for Histogram."""
+
+    def setUp(self):
+        self.histogram = Histogram("test_seconds", "Test histogram.", buckets=(0.1, 1.0))
+
+    def test_counts_and_sums_observations(self):
+        self.histogram.observe(0.05)
+        self.histogram.observe(0.5)
+
+        self.assertEqual(self.histogram.count, 2)
+        self.assertAlmostEqual(self.histogram.sum, 0.55)
+
+    def test_buckets_are_cumulative(self):
+        self.histogram.observe(0.05)
+        self.histogram.observe(0.5)
+        self.histogram.observe(5)
+
+        buckets = self.histogram.snapshot()["buckets"]
+        self.assertEqual(buckets, {0.1: 1, 1.0: 2, "+Inf": 3})
+
+    def test_value_on_bound_falls_in_that_bucket(self):
+        self.histogram.observe(0.1)
+
+        self.assertEqual(self.histogram.snapshot()["buckets"][0.1], 1)
+
+
+class TestMetricsRegistry(unittest.TestCase):
+    """Tests for MetricsRegistry and its Prometheus rendering."""
+
+    def setUp(self):
+        self.registry = MetricsRegistry()
+
+    def test_renders_histogram(self):
+        histogram = self.registry.histogram("test_seconds", "Test histogram.", buckets=(0.1,))
+        histogram.observe(0.05)
+
+        text = self.registry.render()
+        self.assertIn("# HELP test_seconds Test histogram.", text)
+        self.assertIn("# TYPE test_seconds histogram", text)
+        self.assertIn('test_seconds_bucket{le="0.1"} 1', text)
+        self.assertIn('test_seconds_bucket{le="+Inf"} 1', text)
+        self.assertIn("test_seconds_count 1", text)
+
+    def test_renders_labelled_histograms(self):
+        family = self.registry.histogram("test_seconds", "Test histogram.", ("route",), buckets=(0.1,))
+        family.labels("/a").observe(0.05)
+        family.labels("/b").observe(0.5)
+
+        text = self.registry.render()
+        self.assertIn('test_seconds_bucket{route="/a",le="0.1"} 1', text)
+        self.assertIn('test_seconds_bucket{route="/b",le="0.1"} 0', text)
+        self.assertIs(family.labels("/a"), family.labels("/a"))
+
+    def test_renders_gauges(self):
+        self.registry.gauge("test_value", "Test gauge.", lambda: 3)
+        self.registry.gauge("test_labelled", "Test gauge.", lambda: {("x",): 1}, ("name",))
+
+        text = self.registry.render()
+        self.assertIn("# TYPE test_value gauge", text)
+        self.assertIn("test_value 3", text)
+        self.assertIn('test_labelled{name="x"} 1', text)
+
+    def test_renders_counters(self):
+        self.registry.counter("test_events", "Test counter.", lambda: 5)
+        self.registry.counter("test_labelled_events", "Test counter.", lambda: {("x",): 1}, ("name",))
+
+        text = self.registry.render()
+        self.assertIn("# HELP test_events_total Test counter.", text)
+        self.assertIn("# TYPE test_events_total counter", text)
+        self.assertIn("test_events_total 5", text)
+        self.assertIn('test_labelled_events_total{name="x"} 1', text)
+
+    def test_escapes_label_values(self):
+        family = self.registry.histogram("test_seconds", "Test histogram.", ("route",), buckets=(0.1,))
+        family.labels('a"b').observe(0.05)
+
+        self.assertIn('route="a\\"b"', self.registry.render())
+
+
+class TestStage(unittest.TestCase):
+    """Tests for the stage timer."""
+
+    def test_records_nothing_when_disabled(self):
+        with patch.object(metrics, "metrics_enabled", False):
+            count = metrics.stage_seconds.labels("test.disabled").count
+            with stage("test.disabled"):
+                pass
+
+        self.assertEqual(metrics.stage_seconds.labels("test.disabled").count, count)
+
+    def test_records_stage_time_when_enabled(self):
+        with patch.object(metrics, "metrics_enabled", True):
+            with stage("test.enabled"):
+                pass
+
+        self.assertEqual(metrics.stage_seconds.labels("test.enabled").count, 1)
+
+
+class TestMetricsMiddleware(unittest.TestCase):
+    """Tests for MetricsMiddleware."""
+
+    def test_records_latency_by_route_template(self):
+        app = FastAPI()
+        app.add_middleware(MetricsMiddleware)
+
+        @app.get("/items/{item_id}")
+        async def item(item_id: str):
+            return {"id": item_id}
+
+        with TestClient(app) as client:
+            client.get("/items/1")
+            client.get("/items/2")
+            client.get("/missing")
+
+        self.assertEqual(metrics.request_seconds.labels("GET", "/items/{item_id}", "200").count, 2)
+        self.assertEqual(metrics.request_seconds.labels("GET", "unmatched", "404").count, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
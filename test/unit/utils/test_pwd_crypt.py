@@ -0,0 +1,228 @@
+import asyncio
+import threading
+import unittest
+from unittest.mock import MagicMock, patch
+
+from passlib.handlers.argon2 import argon2
+
+from app.utils.pwd_crypt import (
+    HashingPool, 
+    HashingPoolSaturated, 
+    get_pwd_context, 
+    calibrate_rounds, 
+    resolve_rounds, 
+    scheme_settings, 
+)
+
+FAST_ARGON2 = {"type": "ID", "rounds": 1, "memory_cost": 1024, "parallelism": 1}
+FAST_SCRYPT = {"rounds": 8, "block_size": 8, "parallelism": 1}
+
+
+class TestHashingPool(unittest.TestCase):
+    """Tests for HashingPool executor."""
+
+    def setUp(self):
+        self.pool = HashingPool(get_pwd_context(), max_workers=2, max_pending=4)
+
+    def tearDown(self):
+        self.pool.shutdown()
+
+    def test_hash_returns_verifiable_hash(self):
+        """Test that hashes made on the pool can be verified."""
+        hashed = self.pool.hash("testpassword")
+
+        self.assertNotEqual(hashed, "testpassword")
+        self.assertTrue(self.pool.verify("testpassword", hashed))
+        self.assertFalse(self.pool.verify("wrongpassword", hashed))
+
+    def test_async_hash_and_verify(self):
+        """Test hash_async and verify_async from an event loop."""
+        async def run():
+            hashed = await self.pool.hash_async("testpassword")
+            return await self.pool.verify_async("testpassword", hashed)
+
+        self.assertTrue(asyncio.run(run()))
+
+    def test_pending_is_released_after_jobs_finish(self):
+        """Test that finished jobs don't count as pending."""
+        self.pool.hash("testpassword")
+
+        self.assertEqual(self.pool.pending, 0)
+
+    def test_dummy_verify_is_always_false(self):
+        """Test that the dummy verify rejects any password, reusing one precomputed hash."""
+        self.pool.warm_up().result()
+        dummy_hash = self.pool._dummy_hash
+
+        self.assertFalse(self.pool.dummy_verify("testpassword"))
+        self.assertFalse(asyncio.run(self.pool.dummy_verify_async("")))
+        self.assertEqual(self.pool._dummy_hash, dummy_hash)
+        self.assertEqual(self.pool.context.identify(dummy_hash), "bcrypt")
+
+    def test_dummy_verify_runs_a_real_verify(self):
+        """Test that the dummy verify costs one verify of the pool's scheme."""
+        context = MagicMock()
+        context.hash.return_value = "dummy-hash"
+        pool = HashingPool(context, max_workers=1)
+
+        try:
+            self.assertFalse(pool.dummy_verify("testpassword"))
+        finally:
+            pool.shutdown()
+
+        context.verify.assert_called_once_with("testpassword", "dummy-hash")
+
+    def test_context_factory_runs_once_on_first_use(self):
+        """Test that a lazy pool builds its context once, when first needed."""
+        factory = MagicMock(return_value=get_pwd_context(rounds=4))
+        pool = HashingPool(context_factory=factory, max_workers=1)
+
+        try:
+            factory.assert_not_called()
+            hashed = pool.hash("testpassword")
+            self.assertTrue(pool.verify("testpassword", hashed))
+        finally:
+            pool.shutdown()
+
+        factory.assert_called_once_with()
+
+    def test_needs_context_or_factory(self):
+        with self.assertRaises(ValueError):
+            HashingPool()
+
+    def test_raises_when_saturated(self):
+        """Test that jobs over max_pending are rejected right away."""
+        release = threading.Event()
+        context = MagicMock()
+        context.hash.side_effect = lambda _: release.wait(5)
+        pool = HashingPool(context, max_workers=1, max_pending=2)
+
+        try:
+            pool._submit(context.hash, "a")
+            pool._submit(context.hash, "b")
+
+            with self.assertRaises(HashingPoolSaturated):
+                pool.hash("c")
+        finally:
+            release.set()
+            pool.shutdown()
+
+        self.assertEqual(pool.pending, 0)
+
+    def test_verify_and_update_rehashes_outdated_cost(self):
+        """Test that hashes at another cost are verified and re-hashed at the pool cost."""
+        pool = HashingPool(get_pwd_context(rounds=5), max_workers=1)
+        old_hash = get_pwd_context(rounds=4).hash("testpassword")
+
+        try:
+            equal, new_hash = pool.verify_and_update("testpassword", old_hash)
+            self.assertTrue(equal)
+            self.assertTrue(new_hash.startswith("$2b$05$"))
+            self.assertEqual(pool.verify_and_update("testpassword", new_hash), (True, None))
+            self.assertEqual(pool.verify_and_update("wrongpassword", old_hash), (False, None))
+        finally:
+            pool.shutdown()
+
+    def test_verify_and_update_async(self):
+        """Test verify_and_update_async from an event loop."""
+        pool = HashingPool(get_pwd_context(rounds=5), max_workers=1)
+        old_hash = get_pwd_context(rounds=6).hash("testpassword")
+
+        try:
+            equal, new_hash = asyncio.run(pool.verify_and_update_async("testpassword", old_hash))
+        finally:
+            pool.shutdown()
+
+        self.assertTrue(equal)
+        self.assertTrue(new_hash.startswith("$2b$05$"))
+
+
+class TestCalibration(unittest.TestCase):
+    """Tests for the hash cost calibration."""
+
+    def test_context_without_rounds_never_rehashes(self):
+        """Test that the default context keeps hashes of any cost."""
+        hashed = get_pwd_context(rounds=4).hash("testpassword")
+
+        self.assertFalse(get_pwd_context().needs_update(hashed))
+
+    def test_picks_highest_cost_within_target(self):
+        """Test that each extra round is assumed to double the probe timing."""
+        with patch("app.utils.pwd_crypt._time_hash", return_value=10.0):
+            self.assertEqual(calibrate_rounds("bcrypt", target_ms=80), 11)
+            self.assertEqual(calibrate_rounds("bcrypt", target_ms=79), 10)
+
+    def test_clamps_to_bounds(self):
+        """Test that the calibrated cost stays within CALIBRATION_BOUNDS."""
+        with patch("app.utils.pwd_crypt._time_hash", return_value=10.0):
+            self.assertEqual(calibrate_rounds("bcrypt", target_ms=1), 10)
+            self.assertEqual(calibrate_rounds("bcrypt", target_ms=10**9), 16)
+
+    def test_rejects_uncalibrated_scheme(self):
+        with self.assertRaises(ValueError):
+            calibrate_rounds("sha256_crypt", target_ms=100)
+
+    def test_resolve_rounds(self):
+        """Test that a fixed cost wins over calibration, and neither keeps the library default."""
+        with patch("app.utils.pwd_crypt._time_hash", return_value=10.0):
+            self.assertEqual(resolve_rounds("bcrypt", rounds=12, target_ms=80), 12)
+            self.assertEqual(resolve_rounds("bcrypt", rounds=0, target_ms=80), 11)
+        self.assertIsNone(resolve_rounds("bcrypt", rounds=0, target_ms=0))
+
+
+class TestSchemes(unittest.TestCase):
+    """Tests for argon2id/scrypt contexts and mixed-scheme verification."""
+
+    def setUp(self):
+        self.bcrypt_hash = get_pwd_context("bcrypt", rounds=4).hash("testpassword")
+
+    def test_scheme_settings_from_environment(self):
+        self.assertEqual(scheme_settings("argon2")["type"], "ID")
+        self.assertIn("memory_cost", scheme_settings("argon2"))
+        self.assertEqual(set(scheme_settings("scrypt")), {"rounds", "block_size", "parallelism"})
+        self.assertEqual(scheme_settings("bcrypt"), {})
+
+    def test_scrypt_hash_uses_settings(self):
+        context = get_pwd_context("scrypt", settings=FAST_SCRYPT)
+        hashed = context.hash("testpassword")
+
+        self.assertTrue(hashed.startswith("$scrypt$ln=8,r=8,p=1$"))
+        self.assertTrue(context.verify("testpassword", hashed))
+        self.assertFalse(context.needs_update(hashed))
+
+    def test_legacy_bcrypt_hash_verifies_and_upgrades(self):
+        """Test that bcrypt hashes still verify and get re-hashed with the new scheme."""
+        context = get_pwd_context("scrypt", legacy_schemes=["bcrypt"], settings=FAST_SCRYPT)
+
+        equal, new_hash = context.verify_and_update("testpassword", self.bcrypt_hash)
+
+        self.assertTrue(equal)
+        self.assertTrue(new_hash.startswith("$scrypt$"))
+        self.assertEqual(context.verify_and_update("wrongpassword", self.bcrypt_hash), (False, None))
+
+    def test_changed_parameters_are_flagged(self):
+        """Test that hashes made with other memory/parallelism settings get re-hashed."""
+        hashed = get_pwd_context("scrypt", settings=FAST_SCRYPT).hash("testpassword")
+        context = get_pwd_context("scrypt", settings={**FAST_SCRYPT, "block_size": 4})
+
+        self.assertTrue(context.verify("testpassword", hashed))
+        self.assertTrue(context.needs_update(hashed))
+
+    def test_unlisted_scheme_is_rejected(self):
+        context = get_pwd_context("scrypt", legacy_schemes=[], settings=FAST_SCRYPT)
+
+        with self.assertRaises(ValueError):
+            context.verify("testpassword", self.bcrypt_hash)
+
+    @unittest.skipUnless(argon2.has_backend(), "argon2-cffi isn't installed")
+    def test_argon2id_hash_and_legacy_upgrade(self):
+        context = get_pwd_context("argon2", legacy_schemes=["bcrypt"], settings=FAST_ARGON2)
+        hashed = context.hash("testpassword")
+
+        self.assertTrue(hashed.startswith("$argon2id$v=19$m=1024,t=1,p=1$"))
+        self.assertTrue(context.verify("testpassword", hashed))
+        self.assertTrue(context.verify_and_update("testpassword", self.bcrypt_hash)[1].startswith("$argon2id$"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,184 @@
+import unittest
+
+from app.utils.cache import LocalKVStore
+from app.utils.rate_limit import (
+    RateLimiter, 
+    RateLimitExceeded, 
+    MemoryRateLimitStore, 
+    KVRateLimitStore, 
+    LoginRateLimiter, 
+)
+
+
+class TestRateLimiter(unittest.TestCase):
+    """Tests for the sliding window of RateLimiter, on a MemoryRateLimitStore."""
+
+    def setUp(self):
+        self.store = MemoryRateLimitStore(max_keys=100)
+        self.limiter = RateLimiter(self.store, limit=3, window=60)
+
+    def test_allows_up_to_limit(self):
+        for _ in range(3):
+            self.limiter.hit("key", now=600)
+
+        with self.assertRaises(RateLimitExceeded) as cm:
+            self.limiter.hit("key", now=601)
+
+        self.assertGreaterEqual(cm.exception.retry_after, 1)
+        self.assertEqual(self.limiter.rejected, 1)
+
+    def test_keys_are_independent(self):
+        for _ in range(3):
+            self.limiter.hit("a", now=600)
+
+        self.limiter.hit("b", now=600)
+
+    def test_rejected_hits_are_not_counted(self):
+        for _ in range(3):
+            self.limiter.hit("key", now=600)
+        for _ in range(10):
+            with self.assertRaises(RateLimitExceeded):
+                self.limiter.hit("key", now=610)
+
+        self.assertEqual(self.store.counts("key", 10), (0, 3))
+
+    def test_previous_window_is_weighted(self):
+        """Hits of the previous window count by how much of it still overlaps the sliding window."""
+        for _ in range(3):
+            self.limiter.hit("key", now=659)
+
+        # 3 * (1 - 10/60) = 2.5 still counted, so one more hit fits
+        self.limiter.hit("key", now=670)
+        with self.assertRaises(RateLimitExceeded):
+            self.limiter.hit("key", now=670)
+
+        # 3 * (1 - 30/60) + 1 = 2.5
+        self.limiter.hit("key", now=690)
+        with self.assertRaises(RateLimitExceeded):
+            self.limiter.hit("key", now=690)
+
+    def test_retry_after_lets_the_next_hit_through(self):
+        for _ in range(3):
+            self.limiter.hit("key", now=630)
+
+        with self.assertRaises(RateLimitExceeded) as cm:
+            self.limiter.hit("key", now=630)
+
+        self.limiter.hit("key", now=630 + cm.exception.retry_after)
+
+    def test_old_windows_are_forgotten(self):
+        for _ in range(3):
+            self.limiter.hit("key", now=600)
+
+        self.limiter.hit("key", now=720)
+
+
+class TestMemoryRateLimitStore(unittest.TestCase):
+    def test_counts_current_and_previous_window(self):
+        store = MemoryRateLimitStore(max_keys=100)
+        store.increment("key", 10, ttl=120)
+        store.increment("key", 11, ttl=120)
+        store.increment("key", 11, ttl=120)
+
+        self.assertEqual(store.counts("key", 11), (1, 2))
+        self.assertEqual(store.counts("key", 12), (2, 0))
+
+    def test_evicts_least_recently_hit_keys(self):
+        store = MemoryRateLimitStore(max_keys=2)
+        limiter = RateLimiter(store, limit=1, window=60)
+        limiter.hit("a", now=600)
+        limiter.hit("b", now=600)
+        limiter.hit("c", now=600)
+
+        self.assertEqual(len(store), 2)
+        self.assertEqual(store.evictions, 1)
+        # "a" was evicted, so it starts over
+        limiter.hit("a", now=600)
+
+    def test_clear(self):
+        store = MemoryRateLimitStore(max_keys=100)
+        store.increment("key", 10, ttl=120)
+
+        store.clear()
+
+        self.assertEqual(store.counts("key", 10), (0, 0))
+
+
+class TestKVRateLimitStore(unittest.TestCase):
+    def setUp(self):
+        self.client = LocalKVStore()
+        self.store = KVRateLimitStore(self.client, prefix="rl:")
+
+    def test_counts_current_and_previous_window(self):
+        self.store.increment("key", 10, ttl=120)
+        self.store.increment("key", 11, ttl=120)
+        self.store.increment("key", 11, ttl=120)
+
+        self.assertEqual(self.store.counts("key", 11), (1, 2))
+        self.assertEqual(self.store.counts("key", 12), (2, 0))
+
+    def test_limits_hits(self):
+        limiter = RateLimiter(self.store, limit=3, window=60)
+        for _ in range(3):
+            limiter.hit("key", now=600)
+
+        with self.assertRaises(RateLimitExceeded):
+            limiter.hit("key", now=601)
+
+    def test_counters_expire_in_store(self):
+        RateLimiter(self.store, limit=3, window=60).hit("key", now=600)
+
+        self.assertEqual(self.client.get("rl:key:10"), "1")
+        self.assertIsNotNone(self.client._data["rl:key:10"][1])
+
+    def test_clear(self):
+        self.store.increment("key", 10, ttl=120)
+
+        self.store.clear()
+
+        self.assertEqual(self.store.counts("key", 10), (0, 0))
+
+
+class TestLoginRateLimiter(unittest.TestCase):
+    def test_limits_per_username(self):
+        limiter = LoginRateLimiter(MemoryRateLimitStore(), per_username=2, per_ip=100, window=60)
+        limiter.hit("alice", "10.0.0.1")
+        limiter.hit("alice", "10.0.0.2")
+
+        with self.assertRaises(RateLimitExceeded):
+            limiter.hit("alice", "10.0.0.3")
+        limiter.hit("bob", "10.0.0.3")
+
+        self.assertEqual(limiter.rejected(), {"ip": 0, "username": 1})
+
+    def test_limits_per_ip(self):
+        limiter = LoginRateLimiter(MemoryRateLimitStore(), per_username=100, per_ip=2, window=60)
+        limiter.hit("alice", "10.0.0.1")
+        limiter.hit("bob", "10.0.0.1")
+
+        with self.assertRaises(RateLimitExceeded):
+            limiter.hit("carol", "10.0.0.1")
+        limiter.hit("carol", "10.0.0.2")
+
+    def test_throttled_ip_does_not_use_username_budget(self):
+        limiter = LoginRateLimiter(MemoryRateLimitStore(), per_username=2, per_ip=1, window=60)
+        limiter.hit("alice", "10.0.0.1")
+
+        for _ in range(5):
+            with self.assertRaises(RateLimitExceeded):
+                limiter.hit("alice", "10.0.0.1")
+
+        limiter.hit("alice", "10.0.0.2")
+        with self.assertRaises(RateLimitExceeded):
+            limiter.hit("alice", "10.0.0.3")
+
+    def test_disabled(self):
+        limiter = LoginRateLimiter(None, per_username=1, per_ip=1, window=60)
+
+        for _ in range(5):
+            limiter.hit("alice", "10.0.0.1")
+        self.assertEqual(limiter.rejected(), {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,234 @@
+import unittest
+import asyncio
+from time import time
+
+from test.unit.base import TestWithInMemoryAsyncDB
+from app.utils.cache import LocalKVStore
+from app.utils.refresh_sessions import (
+    RefreshSessions, 
+    RefreshSession, 
+    RefreshTokenRejected, 
+    RefreshTokenReused, 
+    MemoryRefreshSessionStore, 
+    SQLRefreshSessionStore, 
+    KVRefreshSessionStore, 
+)
+
+
+def payload(session: RefreshSession) -> dict:
+    """Refresh token payload of a session, as validate_refresh_token returns it."""
+    return {"id": session.user_id, **session.claims()}
+
+
+class TestRefreshSessions(unittest.IsolatedAsyncioTestCase):
+    """Tests for rotation, reuse detection and revocation, on a MemoryRefreshSessionStore."""
+
+    async def asyncSetUp(self):
+        self.store = MemoryRefreshSessionStore()
+        self.sessions = RefreshSessions(self.store, ttl=60)
+
+    async def test_rotates_within_family(self):
+        session = await self.sessions.start("user-1")
+
+        rotated = await self.sessions.rotate(payload(session))
+
+        self.assertEqual(rotated.family, session.family)
+        self.assertNotEqual(rotated.jti, session.jti)
+        self.assertEqual(await self.store.get(rotated.jti), rotated)
+        self.assertIsNone(await self.store.get(session.jti))
+
+    async def test_rotation_keeps_family_expiry(self):
+        session = await self.sessions.start("user-1")
+
+        rotated = await self.sessions.rotate(payload(session))
+
+        self.assertEqual(rotated.expires_at, session.expires_at)
+
+    async def test_reuse_revokes_family(self):
+        session = await self.sessions.start("user-1")
+        rotated = await self.sessions.rotate(payload(session))
+
+        with self.assertRaises(RefreshTokenReused):
+            await self.sessions.rotate(payload(session))
+        self.assertEqual(self.sessions.reuses, 1)
+
+        # The token rotated before the reuse is gone too
+        with self.assertRaises(RefreshTokenRejected) as raised:
+            await self.sessions.rotate(payload(rotated))
+        self.assertNotIsInstance(raised.exception, RefreshTokenReused)
+
+    async def test_revoked_session_is_rejected(self):
+        session = await self.sessions.start("user-1")
+
+        self.assertTrue(await self.sessions.revoke(payload(session)))
+
+        with self.assertRaises(RefreshTokenRejected):
+            await self.sessions.rotate(payload(session))
+        self.assertFalse(await self.sessions.revoke(payload(session)))
+
+    async def test_revoking_with_a_rotated_token_is_a_reuse(self):
+        session = await self.sessions.start("user-1")
+        rotated = await self.sessions.rotate(payload(session))
+
+        with self.assertRaises(RefreshTokenReused):
+            await self.sessions.revoke(payload(session))
+        self.assertEqual(self.sessions.reuses, 1)
+        self.assertIsNone(await self.store.get(rotated.jti))
+
+    async def test_families_are_independent(self):
+        first = await self.sessions.start("user-1")
+        second = await self.sessions.start("user-1")
+
+        await self.sessions.revoke(payload(first))
+
+        self.assertEqual((await self.sessions.rotate(payload(second))).family, second.family)
+
+    async def test_rejects_tokens_without_session(self):
+        with self.assertRaises(RefreshTokenRejected):
+            await self.sessions.rotate({"id": "user-1"})
+
+    async def test_rejects_token_of_another_user(self):
+        session = await self.sessions.start("user-1")
+
+        with self.assertRaises(RefreshTokenRejected):
+            await self.sessions.rotate({**payload(session), "id": "user-2"})
+
+    async def test_expired_sessions_are_rejected(self):
+        sessions = RefreshSessions(self.store, ttl=-1)
+        session = await sessions.start("user-1")
+
+        with self.assertRaises(RefreshTokenRejected):
+            await sessions.rotate(payload(session))
+
+
+class TestMemoryRefreshSessionStore(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.store = MemoryRefreshSessionStore()
+
+    async def test_replace_needs_live_token(self):
+        await self.store.add(RefreshSession("live", "family", "user-1", time() + 60))
+
+        self.assertTrue(await self.store.replace("live", RefreshSession("first", "family", "user-1", time() + 60)))
+        self.assertFalse(await self.store.replace("live", RefreshSession("second", "family", "user-1", time() + 60)))
+
+    async def test_sweeps_expired_sessions_in_batches(self):
+        for i in range(5):
+            await self.store.add(RefreshSession(f"expired-{i}", f"family-{i}", "user-1", time() - 1))
+        live = RefreshSession("live", "family", "user-1", time() + 60)
+        await self.store.add(live)
+
+        self.assertEqual(await self.store.sweep(time(), limit=2), 2)
+        self.assertEqual(await self.store.sweep(time(), limit=10), 3)
+        self.assertEqual(await self.store.get("live"), live)
+        self.assertEqual(len(self.store), 1)
+
+    async def test_rotated_tokens_are_swept_from_the_index(self):
+        expires_at = time() - 1
+        await self.store.add(RefreshSession("first", "family", "user-1", expires_at))
+        await self.store.replace("first", RefreshSession("next", "family", "user-1", expires_at))
+
+        # Both heap entries are due, only the live one still had a session
+        self.assertEqual(await self.store.sweep(now=expires_at + 1, limit=10), 2)
+        self.assertEqual(len(self.store), 0)
+
+
+class TestSQLRefreshSessionStore(TestWithInMemoryAsyncDB):
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        self.store = SQLRefreshSessionStore()
+
+    async def test_reads_back_live_sessions(self):
+        session = RefreshSession("live", "family", "user-1", time() + 60)
+        await self.store.add(session)
+        await self.store.add(RefreshSession("expired", "other", "user-1", time() - 1))
+
+        self.assertEqual(await self.store.get("live"), session)
+        self.assertTrue(await self.store.has_family("family"))
+        self.assertIsNone(await self.store.get("expired"))
+        self.assertFalse(await self.store.has_family("other"))
+
+    async def test_replace_needs_live_token(self):
+        await self.store.add(RefreshSession("live", "family", "user-1", time() + 60))
+
+        self.assertTrue(await self.store.replace("live", RefreshSession("first", "family", "user-1", time() + 60)))
+        self.assertFalse(await self.store.replace("live", RefreshSession("second", "family", "user-1", time() + 60)))
+        self.assertIsNone(await self.store.get("second"))
+
+    async def test_revoke_drops_the_family(self):
+        await self.store.add(RefreshSession("live", "family", "user-1", time() + 60))
+
+        self.assertTrue(await self.store.revoke("family"))
+        self.assertFalse(await self.store.revoke("family"))
+        self.assertIsNone(await self.store.get("live"))
+
+    async def test_sweeps_expired_sessions_in_batches(self):
+        for i in range(5):
+            await self.store.add(RefreshSession(f"expired-{i}", f"family-{i}", "user-1", time() - 1))
+        await self.store.add(RefreshSession("live", "family", "user-1", time() + 60))
+
+        self.assertEqual(await self.store.sweep(time(), limit=2), 2)
+        self.assertEqual(await self.store.sweep(time(), limit=10), 3)
+        self.assertIsNotNone(await self.store.get("live"))
+
+    async def test_detects_reuse(self):
+        sessions = RefreshSessions(self.store, ttl=60)
+        session = await sessions.start("user-1")
+        await sessions.rotate(payload(session))
+
+        with self.assertRaises(RefreshTokenReused):
+            await sessions.rotate(payload(session))
+        self.assertFalse(await self.store.has_family(session.family))
+
+
+class TestKVRefreshSessionStore(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.client = LocalKVStore()
+        self.store = KVRefreshSessionStore(self.client, prefix="rt:")
+
+    async def test_keys_expire_with_the_session(self):
+        session = RefreshSession("live", "family", "user-1", time() + 60)
+        await self.store.add(session)
+
+        self.assertEqual(await self.store.get("live"), session)
+        self.assertEqual(self.client.get("rt:fam:family"), "live")
+        self.assertIsNotNone(self.client._data["rt:jti:live"][1])
+        # Nothing left for sweeps to do
+        self.assertEqual(await self.store.sweep(time() + 120, limit=10), 0)
+
+    async def test_replace_needs_live_token(self):
+        await self.store.add(RefreshSession("live", "family", "user-1", time() + 60))
+
+        self.assertTrue(await self.store.replace("live", RefreshSession("first", "family", "user-1", time() + 60)))
+        self.assertFalse(await self.store.replace("live", RefreshSession("second", "family", "user-1", time() + 60)))
+        self.assertIsNone(await self.store.get("live"))
+
+    async def test_revoke_drops_the_family(self):
+        await self.store.add(RefreshSession("live", "family", "user-1", time() + 60))
+
+        self.assertTrue(await self.store.revoke("family"))
+        self.assertFalse(await self.store.has_family("family"))
+        self.assertIsNone(await self.store.get("live"))
+
+
+class TestRunSweeps(unittest.IsolatedAsyncioTestCase):
+    async def test_keeps_sweeping_after_errors(self):
+        sessions = RefreshSessions(MemoryRefreshSessionStore())
+        sweeps = []
+
+        async def sweep(batch_size):
+            sweeps.append(batch_size)
+            raise RuntimeError("database is down")
+
+        sessions.sweep = sweep
+        task = asyncio.create_task(sessions.run_sweeps(0, batch_size=10))
+        while len(sweeps) < 3:
+            await asyncio.sleep(0)
+        task.cancel()
+
+        # The loop survived the first failures and swept again
+        self.assertGreaterEqual(sessions.sweep_errors, 2)
+
+
+class TestDisabled(unittest.TestCase):
+    def test_none_store_disables_sessions(self):
+        self.assertFalse(RefreshSessions(None).enabled)
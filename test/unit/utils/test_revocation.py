@@ -0,0 +1,119 @@
+import unittest
+from time import time
+
+from test.unit.base import TestWithInMemoryAsyncDB
+from app.utils.revocation import (
+    Denylist, 
+    MemoryRevocationStore, 
+    RevokedEntry, 
+    SQLRevocationStore, 
+    build_revocation_store, 
+)
+
+
+class TestDenylist(unittest.IsolatedAsyncioTestCase):
+    """Tests for Denylist revocations, syncs and rebuilds, on a MemoryRevocationStore."""
+
+    async def asyncSetUp(self):
+        self.store = MemoryRevocationStore()
+        self.denylist = Denylist(self.store)
+
+    async def test_revokes_until_expiry(self):
+        await self.denylist.revoke("revoked", time() + 60)
+
+        self.assertTrue(self.denylist.is_revoked("revoked"))
+        self.assertFalse(self.denylist.is_revoked("valid"))
+        self.assertFalse(self.denylist.is_revoked(None))
+
+    async def test_ignores_expired_tokens(self):
+        await self.denylist.revoke("expired", time() - 1)
+
+        self.assertFalse(self.denylist.is_revoked("expired"))
+        self.assertEqual(len(self.store), 0)
+
+    async def test_sync_picks_up_other_workers_revocations(self):
+        other = Denylist(self.store)
+        await self.denylist.sync()
+
+        await other.revoke("revoked", time() + 60)
+        self.assertFalse(self.denylist.is_revoked("revoked"))
+
+        await self.denylist.sync()
+        self.assertTrue(self.denylist.is_revoked("revoked"))
+
+        # Entries read again by the sync overlap are counted once
+        await self.denylist.sync()
+        self.assertEqual(len(self.denylist), 1)
+
+    async def test_rebuild_drops_expired_entries(self):
+        await self.denylist.revoke("expiring", time() + 60)
+        await self.denylist.revoke("revoked", time() + 600)
+        self.denylist._revoked["expiring"] = time() - 1
+        await self.store.add(RevokedEntry("expiring", time() - 1, time()))
+
+        await self.denylist.rebuild()
+
+        self.assertEqual(len(self.denylist), 1)
+        self.assertTrue(self.denylist.is_revoked("revoked"))
+        self.assertEqual(len(self.store), 1)
+
+    async def test_reports_footprint(self):
+        empty = self.denylist.footprint()
+
+        await self.denylist.revoke("revoked", time() + 60)
+        footprint = self.denylist.footprint()
+
+        self.assertGreater(footprint, empty)
+
+
+class TestSQLRevocationStore(TestWithInMemoryAsyncDB):
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        self.store = SQLRevocationStore()
+
+    async def test_lists_unexpired_entries(self):
+        await self.store.add(RevokedEntry("old", time() + 60, 100.0))
+        await self.store.add(RevokedEntry("new", time() + 60, 200.0))
+        await self.store.add(RevokedEntry("expired", time() - 1, 200.0))
+
+        self.assertEqual({jti for jti, _ in await self.store.entries(time())}, {"old", "new"})
+        self.assertEqual([jti for jti, _ in await self.store.entries(time(), since=150.0)], ["new"])
+
+    async def test_adding_twice_keeps_one_row(self):
+        await self.store.add(RevokedEntry("revoked", time() + 60, time()))
+        await self.store.add(RevokedEntry("revoked", time() + 60, time()))
+
+        self.assertEqual(len(await self.store.entries(time())), 1)
+
+    async def test_sweeps_expired_entries_in_batches(self):
+        for i in range(5):
+            await self.store.add(RevokedEntry(f"expired-{i}", time() - 1, time()))
+        await self.store.add(RevokedEntry("revoked", time() + 60, time()))
+
+        self.assertEqual(await self.store.sweep(time(), limit=2), 2)
+        self.assertEqual(await self.store.sweep(time(), limit=10), 3)
+        self.assertEqual([jti for jti, _ in await self.store.entries(0)], ["revoked"])
+
+    async def test_rebuilds_a_denylist(self):
+        await Denylist(self.store).revoke("revoked", time() + 60)
+        denylist = Denylist(self.store)
+
+        await denylist.rebuild()
+
+        self.assertTrue(denylist.is_revoked("revoked"))
+
+
+class TestDisabled(unittest.TestCase):
+    def test_off_disables_revocation(self):
+        denylist = Denylist(build_revocation_store("off"))
+
+        self.assertFalse(denylist.enabled)
+        self.assertFalse(denylist.is_revoked("any"))
+
+    def test_rejects_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            build_revocation_store("kv")
+
+
+if __name__ == "__main__":
+    unittest.main()